@@ -0,0 +1,251 @@
+"""
+Determines how many requests per second Rally's driver can issue before Rally itself becomes the bottleneck.
+
+Each built-in operation type is run with the real ``schedule_for`` / ``execute_schedule`` / runner path against a mock Elasticsearch that
+answers immediately. The mock runs in a separate process so the measured CPU time is spent by Rally only.
+
+Usage::
+
+    python3 -m benchmarks.driver_saturation --clients=1,2,4 --operations=index,search
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import tabulate
+
+from esrally import client, metrics, track
+from esrally.driver import driver
+from esrally.mechanic import mockserver
+from esrally.track import corpus
+
+INDEX_NAME = "saturation"
+TYPE_NAME = "docs"
+DOCUMENT = '{"@timestamp": 893964617, "clientip": "40.135.0.0", "request": "GET /images/hm_bg.jpg HTTP/1.0", "status": 200, ' \
+           '"size": 24736}'
+
+
+class Result:
+    def __init__(self, operation, clients, requests, wall_time, cpu_time, sample_overhead):
+        """
+        :param operation: The name of the operation.
+        :param clients: The number of clients.
+        :param requests: The number of requests that all clients have issued in total.
+        :param wall_time: The elapsed time in seconds.
+        :param cpu_time: The CPU time in seconds that this process has spent.
+        :param sample_overhead: The CPU time in seconds that is needed to record the sample of a single request.
+        """
+        self.operation = operation
+        self.clients = clients
+        self.requests = requests
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.sample_overhead = sample_overhead
+
+    @property
+    def throughput(self):
+        return self.requests / self.wall_time if self.wall_time > 0 else 0
+
+    @property
+    def cpu_per_request(self):
+        return self.cpu_time / self.requests if self.requests > 0 else 0
+
+    @property
+    def sample_overhead_share(self):
+        return self.sample_overhead / self.cpu_per_request if self.cpu_per_request > 0 else 0
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "clients": self.clients,
+            "requests": self.requests,
+            "throughput": self.throughput,
+            "cpu_per_request_us": self.cpu_per_request * 1000 * 1000,
+            "sample_overhead_us": self.sample_overhead * 1000 * 1000,
+            "sample_overhead_share": self.sample_overhead_share
+        }
+
+
+def write_corpus(path, number_of_documents):
+    with open(path, mode="wt") as f:
+        for _ in range(number_of_documents):
+            print(DOCUMENT, file=f)
+
+
+def indices(corpus_path=None, number_of_documents=0):
+    return [track.Index(name=INDEX_NAME, auto_managed=True, types=[
+        track.Type(name=TYPE_NAME, mapping_file=None, document_file=corpus_path, number_of_documents=number_of_documents)
+    ])]
+
+
+def operations(bulk_size, serialize_body):
+    """
+    :return: A dict of all benchmarked operations. Key is the operation name, value is a pair of the ``track.Operation`` and whether the
+    operation consumes a data file (and thus runs until it is exhausted).
+    """
+    query = {"query": {"match_all": {}}}
+    return {
+        "index": (track.Operation("index", track.OperationType.Index.name, params={
+            "bulk-size": bulk_size,
+            "serialize-body": serialize_body
+        }), True),
+        "search": (track.Operation("search", track.OperationType.Search.name, params={"body": query}), False),
+        "scroll": (track.Operation("scroll", track.OperationType.Search.name, params={
+            "body": query,
+            "pages": 10,
+            "results-per-page": 100
+        }), False),
+        "index-stats": (track.Operation("index-stats", track.OperationType.IndicesStats.name), False),
+        "node-stats": (track.Operation("node-stats", track.OperationType.NodesStats.name), False),
+        "force-merge": (track.Operation("force-merge", track.OperationType.ForceMerge.name), False)
+    }
+
+
+def run(current_track, operation, data_based, num_clients, requests_per_client, hosts, prefetch_depth=0):
+    """
+    Runs one operation with the given number of clients, each one in its own thread, as fast as possible. Operations that are based on a
+    data file run until it is exhausted, all others issue ``requests_per_client`` requests per client.
+
+    :return: A triple of the number of requests, the elapsed wall clock time and the CPU time of this process (both in seconds).
+    """
+    if data_based:
+        # run until the data file is exhausted
+        task = track.Task(operation, warmup_time_period=0, clients=num_clients)
+    else:
+        task = track.Task(operation, iterations=requests_per_client * num_clients, clients=num_clients)
+
+    samplers = []
+    schedules = []
+    clients = []
+    for client_index in range(num_clients):
+        samplers.append(driver.Sampler(client_index, operation, time.perf_counter()))
+        schedules.append(driver.schedule_for(current_track, task, client_index, prefetch_depth=prefetch_depth))
+        clients.append(client.EsClientFactory(hosts, {}).create())
+
+    errors = []
+
+    def execute(client_index):
+        try:
+            driver.execute_schedule(schedules[client_index], clients[client_index], samplers[client_index])
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=execute, args=(i,)) for i in range(num_clients)]
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    if errors:
+        raise errors[0]
+    requests = sum(len(s.samples) for s in samplers)
+    return requests, wall_time, cpu_time
+
+
+def sample_overhead(operation, iterations=100000):
+    """
+    :return: The CPU time in seconds that ``driver.record_sample`` needs to record the sample of a single request.
+    """
+    sampler = driver.Sampler(0, operation, time.perf_counter())
+    result = (1, "ops", None)
+    start = time.process_time()
+    for i in range(iterations):
+        now = time.perf_counter()
+        driver.record_sample(sampler, metrics.SampleType.Normal, i / iterations, result, now, now, False, now, now, {})
+        # avoid measuring the growth of the sample buffer
+        if i % driver.Sampler.DEFAULT_BUFFER_SIZE == 0:
+            sampler.packed_samples
+    return (time.process_time() - start) / iterations
+
+
+def _serve(conn, stop):
+    server = mockserver.MockElasticsearch().start()
+    conn.send(server.port)
+    stop.wait()
+    server.stop()
+
+
+def start_mock():
+    """
+    Starts a mock Elasticsearch in a separate process.
+
+    :return: A pair of the port and an event that stops the mock when set.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(child_conn, stop), daemon=True)
+    process.start()
+    return parent_conn.recv(), stop
+
+
+def csv_to_list(csv):
+    return [v.strip() for v in csv.split(",") if v.strip()]
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="driver_saturation", description="Measures the maximum throughput of Rally's driver.")
+    parser.add_argument("--operations", default="index,search,scroll,index-stats,node-stats",
+                        help="Comma-separated list of operations to benchmark (default: %(default)s).")
+    parser.add_argument("--clients", default="1,2,4,8", help="Comma-separated list of client counts (default: %(default)s).")
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="Number of requests that each client issues per operation (default: %(default)s).")
+    parser.add_argument("--bulk-requests", type=int, default=100,
+                        help="Number of bulk requests that each client issues (default: %(default)s).")
+    parser.add_argument("--bulk-size", type=int, default=500, help="Number of documents per bulk request (default: %(default)s).")
+    parser.add_argument("--serialize-body", action="store_true", default=False,
+                        help="Send pre-serialized bulk bodies (default: %(default)s).")
+    parser.add_argument("--params-prefetch", type=int, default=0,
+                        help="Number of request parameters that each client prepares ahead of time (default: %(default)s).")
+    parser.add_argument("--report-file", help="Also write the results as JSON to this file.")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    # Rally logs at info level in the hot path (e.g. when a schedule is created). We are only interested in the driver itself.
+    logging.basicConfig(level=logging.WARNING)
+    client_counts = [int(c) for c in csv_to_list(args.clients)]
+    max_documents = max(client_counts) * args.bulk_requests * args.bulk_size
+
+    port, stop = start_mock()
+    hosts = [{"host": "127.0.0.1", "port": port}]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = os.path.join(tmp, "documents.json")
+        all_operations = operations(args.bulk_size, args.serialize_body)
+        try:
+            for name in csv_to_list(args.operations):
+                operation, data_based = all_operations[name]
+                if data_based and not os.path.exists(corpus_path):
+                    write_corpus(corpus_path, max_documents)
+                    corpus.prepare(corpus_path)
+                overhead = sample_overhead(operation)
+                for num_clients in client_counts:
+                    number_of_documents = num_clients * args.bulk_requests * args.bulk_size if data_based else 0
+                    current_track = track.Track(name="saturation", short_description="", description="", source_root_url=None,
+                                                challenges=[], indices=indices(corpus_path, number_of_documents))
+                    requests, wall_time, cpu_time = run(current_track, operation, data_based, num_clients, args.requests, hosts,
+                                                        args.params_prefetch)
+                    results.append(Result(name, num_clients, requests, wall_time, cpu_time, overhead))
+        finally:
+            stop.set()
+
+    print(tabulate.tabulate([[r.operation, r.clients, r.requests, "%.2f" % r.throughput, "%.2f" % (r.cpu_per_request * 1000 * 1000),
+                              "%.2f" % (r.sample_overhead * 1000 * 1000), "%.2f%%" % (r.sample_overhead_share * 100)] for r in results],
+                            headers=["Operation", "Clients", "Requests", "Throughput [ops/s]", "CPU per request [us]",
+                                     "Sample recording [us]", "Sample recording [% CPU]"], numalign="right", stralign="right"))
+    if args.report_file:
+        with open(args.report_file, mode="wt") as f:
+            json.dump([r.as_dict() for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import gc
+import json
+import os
+import time
+
+DEFAULT_THRESHOLD = 0.25
+
+
+class Benchmark:
+    def __init__(self, name, setup, repetitions=5):
+        """
+        :param name: A unique name of this benchmark.
+        :param setup: A function without parameters that prepares a single run. It returns a pair of a function without parameters that
+        runs the workload once (only this function is timed) and the number of operations that this function performs.
+        :param repetitions: How often the workload is run. The fastest run is reported.
+        """
+        self.name = name
+        self.setup = setup
+        self.repetitions = repetitions
+
+    def __repr__(self, *args, **kwargs):
+        return self.name
+
+
+class Measurement:
+    def __init__(self, name, time_per_op, ops):
+        """
+        :param name: The name of the benchmark.
+        :param time_per_op: The time in seconds that is needed per operation in the fastest run.
+        :param ops: The number of operations per run.
+        """
+        self.name = name
+        self.time_per_op = time_per_op
+        self.ops = ops
+
+
+class Regression:
+    def __init__(self, name, baseline, current, threshold):
+        self.name = name
+        self.baseline = baseline
+        self.current = current
+        self.threshold = threshold
+
+    @property
+    def change(self):
+        return self.current / self.baseline - 1
+
+    def __str__(self, *args, **kwargs):
+        return "[%s] got slower by %.1f%% (allowed: %.1f%%)." % (self.name, self.change * 100, self.threshold * 100)
+
+
+def measure(benchmark, timer=time.perf_counter):
+    """
+    Runs a benchmark ``benchmark.repetitions`` times. Like ``timeit``, the garbage collector is disabled while the workload runs.
+
+    :param benchmark: The benchmark to run.
+    :param timer: A function that returns the current time in seconds. Intended for testing.
+    :return: A ``Measurement`` based on the fastest run.
+    """
+    best = None
+    ops = 0
+    for _ in range(benchmark.repetitions):
+        run, ops = benchmark.setup()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = timer()
+            run()
+            duration = timer() - start
+        finally:
+            if gc_enabled:
+                gc.enable()
+        best = duration if best is None else min(best, duration)
+    return Measurement(benchmark.name, best / ops if ops > 0 else 0, ops)
+
+
+def load_baseline(path):
+    """
+    :param path: Path to a baseline file.
+    :return: A dict of all baseline entries (key: benchmark name). It is empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, mode="rt") as f:
+        return json.load(f)["benchmarks"]
+
+
+def save_baseline(path, measurements, previous=None):
+    """
+    Writes the given measurements as new baseline. Benchmark specific thresholds of the previous baseline are retained.
+
+    :param path: Path to the baseline file.
+    :param measurements: A list of ``Measurement``.
+    :param previous: A dict of previous baseline entries as returned by ``load_baseline``. Optional.
+    """
+    entries = dict(previous) if previous else {}
+    for m in measurements:
+        entry = dict(entries.get(m.name, {}))
+        entry["time_per_op"] = m.time_per_op
+        entries[m.name] = entry
+    with open(path, mode="wt") as f:
+        json.dump({"benchmarks": entries}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def regressions(measurements, baseline, default_threshold=DEFAULT_THRESHOLD):
+    """
+    :param measurements: A list of ``Measurement``.
+    :param baseline: A dict of baseline entries as returned by ``load_baseline``. An entry may define its own ``threshold``.
+    :param default_threshold: The relative slowdown that is tolerated if an entry does not define its own threshold (e.g. 0.25 for 25%).
+    :return: A list of ``Regression`` for all measurements that are slower than their baseline by more than the threshold. Benchmarks
+    without baseline are ignored.
+    """
+    result = []
+    for m in measurements:
+        entry = baseline.get(m.name)
+        if entry is None or entry.get("time_per_op", 0) <= 0:
+            continue
+        threshold = entry.get("threshold", default_threshold)
+        if m.time_per_op > entry["time_per_op"] * (1 + threshold):
+            result.append(Regression(m.name, entry["time_per_op"], m.time_per_op, threshold))
+    return result
@@ -0,0 +1,259 @@
+"""
+Times functions in Rally's hot paths on synthetic data of realistic size and compares the results to a stored baseline.
+
+Usage::
+
+    # record a baseline (e.g. on the main branch)
+    python3 -m benchmarks.microbenchmarks --save-baseline
+    # check a change against it; exits with a non-zero status if a benchmark got slower than allowed
+    python3 -m benchmarks.microbenchmarks
+
+Baselines depend on the machine so record them on the same machine that runs the check.
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import tabulate
+
+from benchmarks import harness
+from esrally import config, metrics, track
+from esrally.driver import driver
+from esrally.track import corpus, params
+from esrally.utils import console, io
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+DOCUMENT = '{"@timestamp": 893964617, "clientip": "40.135.0.0", "request": "GET /images/hm_bg.jpg HTTP/1.0", "status": 200, ' \
+           '"size": 24736}'
+
+# number of documents in the synthetic corpus
+CORPUS_DOCS = 200000
+# number of documents per bulk request
+BULK_SIZE = 5000
+# number of samples that a client records or that the master aggregates
+SAMPLES = 100000
+# number of metrics records in the in-memory metrics store
+METRICS_DOCS = 100000
+# number of lines in the data file for line skipping
+SKIP_FILE_LINES = 1000000
+# number of random positions to which lines are skipped
+SKIPS = 50
+
+
+class Corpus:
+    """
+    Creates synthetic data files lazily in a working directory so only the selected benchmarks pay for them.
+    """
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self._files = {}
+
+    def documents(self, number_of_documents, with_offset_table=False):
+        key = (number_of_documents, with_offset_table)
+        if key not in self._files:
+            path = os.path.join(self.workdir, "documents-%d.json" % number_of_documents)
+            if not os.path.exists(path):
+                with open(path, mode="wt") as f:
+                    for _ in range(number_of_documents):
+                        print(DOCUMENT, file=f)
+            if with_offset_table:
+                corpus.prepare(path)
+            self._files[key] = path
+        return self._files[key]
+
+
+def bulk_data_based(corpus, serialize_body, create_reader=params.create_default_reader):
+    def setup():
+        index = track.Index(name="logs", auto_managed=True, types=[
+            track.Type(name="type", mapping_file=None, document_file=corpus.documents(CORPUS_DOCS), number_of_documents=CORPUS_DOCS)
+        ])
+        bulks = params.bulk_data_based(num_clients=1, client_index=0, indices=[index], action_metadata=params.ActionMetaData.Generate,
+                                       batch_size=BULK_SIZE, bulk_size=BULK_SIZE, id_conflicts=params.IndexIdConflict.NoConflicts,
+                                       pipeline=None, serialize_body=serialize_body, create_reader=create_reader)
+
+        def run():
+            for _ in bulks:
+                pass
+
+        return run, CORPUS_DOCS
+    return setup
+
+
+def generate_action_meta_data(conflicts):
+    def setup():
+        conflicting_ids = params.build_conflicting_ids(conflicts, SAMPLES, 0)
+        generator = params.GenerateActionMetaData("logs", "type", conflicting_ids, rand=random.Random(17).randint)
+
+        def run():
+            for _ in range(SAMPLES):
+                next(generator)
+
+        return run, SAMPLES
+    return setup
+
+
+def sampler_add():
+    operation = track.Operation("index", track.OperationType.Index.name)
+    sampler = driver.Sampler(0, operation, time.perf_counter())
+
+    def setup():
+        # start each run with an empty sample buffer and empty histograms
+        sampler.packed_samples
+        sampler.histograms
+
+        def run():
+            for i in range(SAMPLES):
+                sampler.add(metrics.SampleType.Normal, None, 12.5, 10.5, 5000, "docs", i / 1000, i / SAMPLES)
+
+        return run, SAMPLES
+    return setup
+
+
+def throughput_calculator():
+    def setup():
+        # the samples of 8 clients that took 10 ms each
+        start = time.time()
+        samples = [(start + i / 800, i / 800, metrics.SampleType.Normal, 5000, "docs", i / 800) for i in range(SAMPLES)]
+
+        def run():
+            calculator = driver.ThroughputCalculator()
+            for sample in samples:
+                calculator.add(*sample)
+            calculator.windowed_throughput()
+            calculator.cumulative_throughput()
+
+        return run, SAMPLES
+    return setup
+
+
+def in_memory_metrics_store():
+    cfg = config.Config()
+    cfg.add(config.Scope.application, "system", "env.name", "benchmark")
+    store = metrics.InMemoryMetricsStore(cfg)
+    store.open(datetime.datetime(2016, 1, 1), "logs", "append-no-conflicts", "defaults", create=True)
+    store.lap = 1
+    rand = random.Random(17)
+    for i in range(METRICS_DOCS):
+        store.put_value_cluster_level("service_time", rand.uniform(1, 100), "ms", operation="op-%d" % (i % 10),
+                                      operation_type=track.OperationType.Search)
+    return store
+
+
+def metrics_store_get(store_holder):
+    def setup():
+        store = store_holder()
+
+        def run():
+            store._get("service_time", "op-0", track.OperationType.Search, None, None, lambda doc: doc["value"])
+
+        return run, METRICS_DOCS
+    return setup
+
+
+def metrics_store_get_percentiles(store_holder):
+    def setup():
+        store = store_holder()
+
+        def run():
+            store.get_percentiles("service_time", operation="op-0", operation_type=track.OperationType.Search,
+                                  percentiles=[50, 90, 99, 99.9, 100])
+
+        return run, METRICS_DOCS
+    return setup
+
+
+def skip_lines(corpus):
+    def setup():
+        path = corpus.documents(SKIP_FILE_LINES, with_offset_table=True)
+        rand = random.Random(17)
+        positions = [rand.randint(0, SKIP_FILE_LINES - 1) for _ in range(SKIPS)]
+
+        def run():
+            with io.FileSource(path, "rt") as f:
+                for position in positions:
+                    f.seek(0)
+                    io.skip_lines(path, f, position)
+
+        return run, SKIPS
+    return setup
+
+
+def all_benchmarks(workdir):
+    corpus = Corpus(workdir)
+    store = []
+
+    def store_holder():
+        # building the store takes a while so we only do it once and only if needed
+        if not store:
+            store.append(in_memory_metrics_store())
+        return store[0]
+
+    return [
+        harness.Benchmark("params.bulk_data_based", bulk_data_based(corpus, serialize_body=False)),
+        harness.Benchmark("params.bulk_data_based.serialized", bulk_data_based(corpus, serialize_body=True)),
+        harness.Benchmark("params.bulk_data_based.mmap", bulk_data_based(corpus, serialize_body=False,
+                                                                         create_reader=params.create_mmap_reader)),
+        harness.Benchmark("params.GenerateActionMetaData", generate_action_meta_data(params.IndexIdConflict.NoConflicts)),
+        harness.Benchmark("params.GenerateActionMetaData.conflicts", generate_action_meta_data(params.IndexIdConflict.RandomConflicts)),
+        harness.Benchmark("driver.Sampler.add", sampler_add()),
+        harness.Benchmark("driver.ThroughputCalculator", throughput_calculator()),
+        harness.Benchmark("metrics.InMemoryMetricsStore._get", metrics_store_get(store_holder)),
+        harness.Benchmark("metrics.InMemoryMetricsStore.get_percentiles", metrics_store_get_percentiles(store_holder)),
+        harness.Benchmark("io.skip_lines", skip_lines(corpus), repetitions=3)
+    ]
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="microbenchmarks", description="Times Rally's hot-path functions and checks for regressions.")
+    parser.add_argument("--filter", help="Only run benchmarks whose name matches this regular expression.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Path to the baseline file (default: %(default)s).")
+    parser.add_argument("--save-baseline", action="store_true", default=False,
+                        help="Store the results as new baseline instead of comparing against it.")
+    parser.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD,
+                        help="Tolerated relative slowdown if the baseline does not define one for a benchmark (default: %(default)s).")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    console.init(quiet=True)
+    baseline = harness.load_baseline(args.baseline)
+    measurements = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for benchmark in all_benchmarks(workdir):
+            if args.filter and not re.search(args.filter, benchmark.name):
+                continue
+            print("Running [%s] ..." % benchmark.name, file=sys.stderr, flush=True)
+            measurements.append(harness.measure(benchmark))
+
+    rows = []
+    for m in measurements:
+        base = baseline.get(m.name, {}).get("time_per_op")
+        change = "%+.1f%%" % ((m.time_per_op / base - 1) * 100) if base else "-"
+        rows.append([m.name, m.ops, "%.3f" % (m.time_per_op * 1000 * 1000 * 1000), "%.3f" % (base * 1000 * 1000 * 1000) if base else "-",
+                     change])
+    print(tabulate.tabulate(rows, headers=["Benchmark", "Ops per run", "Time per op [ns]", "Baseline [ns]", "Change"],
+                            numalign="right", stralign="right"))
+
+    if args.save_baseline:
+        harness.save_baseline(args.baseline, measurements, baseline)
+        print("Stored baseline in [%s]." % args.baseline)
+        return 0
+    if not baseline:
+        print("No baseline found at [%s]. Record one with --save-baseline." % args.baseline)
+        return 0
+    failed = harness.regressions(measurements, baseline, args.threshold)
+    for regression in failed:
+        print(regression)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,8 @@
+import collections
+import collections.abc
 import gzip
+import threading
+import time
 import urllib3
 import logging
 import elasticsearch
@@ -7,14 +11,158 @@ import certifi
 logger = logging.getLogger("rally.client")
 
 
+def _thread_cpu_time():
+    # time.thread_time() is only available from Python 3.7 on
+    return time.clock_gettime(time.CLOCK_THREAD_CPUTIME_ID)
+
+
+if hasattr(time, "thread_time"):
+    cpu_time = time.thread_time
+elif hasattr(time, "CLOCK_THREAD_CPUTIME_ID"):
+    cpu_time = _thread_cpu_time
+else:
+    # also includes the CPU time of all other threads of this process
+    cpu_time = time.process_time
+
+
+class CompressedBody(bytes):
+    """
+    A gzip-compressed request body. The transport sends it as is.
+    """
+
+    def __new__(cls, data, uncompressed_size, compression_time):
+        body = super().__new__(cls, data)
+        # the size of the original body in bytes
+        body.uncompressed_size = uncompressed_size
+        # the CPU time in seconds that was needed to compress the body
+        body.compression_time = compression_time
+        return body
+
+    @property
+    def compression_ratio(self):
+        return len(self) / self.uncompressed_size if self.uncompressed_size > 0 else 1.0
+
+
+class BodyCompressor:
+    """
+    Compresses request bodies with gzip. The compressed bodies of recently seen small request bodies (e.g. of static queries) are cached so
+    they are compressed only once.
+    """
+
+    DEFAULT_COMPRESSION_LEVEL = 9
+    DEFAULT_CACHE_SIZE = 128
+    # larger bodies (e.g. bulk requests) are rarely repeated and would occupy too much memory
+    MAX_CACHED_BODY_SIZE = 64 * 1024
+
+    def __init__(self, level=DEFAULT_COMPRESSION_LEVEL, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param level: The gzip compression level in the range [0, 9]. Optional. Defaults to the level of ``gzip.compress``.
+        :param cache_size: The number of compressed bodies that are cached. Optional. Zero disables caching.
+        """
+        self.level = level
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, body):
+        """
+        :param body: A request body as ``bytes``.
+        :return: A ``CompressedBody``.
+        """
+        if isinstance(body, CompressedBody):
+            return body
+        cacheable = self.cache_size > 0 and len(body) <= BodyCompressor.MAX_CACHED_BODY_SIZE
+        if cacheable:
+            with self._lock:
+                compressed = self._cache.get(body)
+                if compressed is not None:
+                    self._cache.move_to_end(body)
+                    return compressed
+        # measure CPU time as wall clock time would include time that this thread has been waiting for the GIL or has been preempted
+        start = cpu_time()
+        data = gzip.compress(body, compresslevel=self.level)
+        compressed = CompressedBody(data, len(body), cpu_time() - start)
+        if cacheable:
+            with self._lock:
+                self._cache[body] = compressed
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return compressed
+
+
+def body_compressor(client_options):
+    """
+    :param client_options: A dict of client options.
+    :return: A ``BodyCompressor`` according to the client options ``compression_level`` and ``compression_cache_size`` or ``None`` if
+    request compression is disabled (client option ``compressed``).
+    """
+    if not client_options.get("compressed", False):
+        return None
+    return BodyCompressor(level=int(client_options.get("compression_level", BodyCompressor.DEFAULT_COMPRESSION_LEVEL)),
+                          cache_size=int(client_options.get("compression_cache_size", BodyCompressor.DEFAULT_CACHE_SIZE)))
+
+
+class LazyJSONResponse(collections.abc.Mapping):
+    """
+    A JSON response that is only decoded when it is accessed for the first time. Runners that only need to know whether a request has
+    succeeded can inspect ``raw`` instead and avoid decoding the response at all.
+    """
+
+    def __init__(self, raw, loads):
+        """
+        :param raw: The response body as string.
+        :param loads: A function that decodes the response body.
+        """
+        self.raw = raw
+        self._loads = loads
+        self._value = None
+
+    @property
+    def decoded(self):
+        """
+        :return: ``True`` iff the response has already been decoded.
+        """
+        return self._value is not None
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = self._loads(self.raw)
+        return self._value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __repr__(self, *args, **kwargs):
+        return repr(self.value)
+
+
+class LazyJSONSerializer(elasticsearch.serializer.JSONSerializer):
+    """
+    Defers decoding of JSON responses until they are accessed (see ``LazyJSONResponse``).
+    """
+
+    def loads(self, s):
+        return LazyJSONResponse(s, super().loads)
+
+
 class PoolWrap(object):
-    def __init__(self, pool, compressed=False, **kwargs):
+    def __init__(self, pool, compressed=False, compression_level=BodyCompressor.DEFAULT_COMPRESSION_LEVEL,
+                 compression_cache_size=BodyCompressor.DEFAULT_CACHE_SIZE, **kwargs):
         self.pool = pool
         self.compressed = compressed
+        self.compressor = BodyCompressor(int(compression_level), int(compression_cache_size)) if compressed else None
 
     def urlopen(self, method, url, body, retries, headers, **kw):
+        # bodies may already have been compressed ahead of time (see ``driver.prefetch``)
         if body is not None and self.compressed:
-            body = gzip.compress(body)
+            body = self.compressor.compress(body)
         return self.pool.urlopen(method, url, body=body, retries=retries, headers=headers, **kw)
 
     def __getattr__(self, attr_name):
@@ -27,7 +175,7 @@ class ConfigurableHttpConnection(elasticsearch.Urllib3HttpConnection):
         if compressed:
             self.headers.update(urllib3.make_headers(accept_encoding=True))
             self.headers.update({"Content-Encoding": "gzip"})
-        self.pool = PoolWrap(self.pool, **kwargs)
+        self.pool = PoolWrap(self.pool, compressed=compressed, **kwargs)
 
 
 class EsClientFactory:
@@ -35,14 +183,25 @@ class EsClientFactory:
     Abstracts how the Elasticsearch client is created. Intended for testing.
     """
 
-    def __init__(self, hosts, client_options):
+    def __init__(self, hosts, client_options, load_generator=False):
+        """
+        :param hosts: A list of hosts to connect to.
+        :param client_options: A dict of client options.
+        :param load_generator: ``True`` iff the client is used to generate load. Only then responses are decoded lazily (see client option
+        ``lazy_responses``) as administrative code and telemetry devices expect ordinary dicts. Optional. Defaults to ``False``.
+        """
         logger.info("Creating ES client connected to %s with options [%s]" % (hosts, client_options))
         if self._is_set(client_options, "use_ssl") and self._is_set(client_options, "verify_certs") and "ca_certs" not in client_options:
             client_options["ca_certs"] = certifi.where()
         if self._is_set(client_options, "basic_auth_user") and self._is_set(client_options, "basic_auth_password"):
             # Maybe we should remove these keys from the dict?
             client_options["http_auth"] = (client_options["basic_auth_user"], client_options["basic_auth_password"])
-        self.client = elasticsearch.Elasticsearch(hosts=hosts, connection_class=ConfigurableHttpConnection, **client_options)
+        if load_generator and self._is_set(client_options, "lazy_responses"):
+            serializer = LazyJSONSerializer()
+        else:
+            serializer = elasticsearch.serializer.JSONSerializer()
+        self.client = elasticsearch.Elasticsearch(hosts=hosts, connection_class=ConfigurableHttpConnection, serializer=serializer,
+                                                  **client_options)
 
     def _is_set(self, client_opts, k):
         try:
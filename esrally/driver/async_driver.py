@@ -0,0 +1,253 @@
+import asyncio
+import concurrent.futures
+import datetime
+import logging
+import threading
+import time
+
+import thespian.actors
+from esrally import track, client
+from esrally.driver import driver, runner
+
+logger = logging.getLogger("rally.driver")
+
+
+class StartWorker:
+    """
+    Starts a worker that runs several clients concurrently.
+    """
+
+    def __init__(self, worker_id, config, track, client_allocations):
+        """
+        :param worker_id: Id of this worker.
+        :param config: Rally internal configuration object.
+        :param track: The track to use.
+        :param client_allocations: A dict with the client id as key and the client's row in the allocation matrix (i.e. its tasks) as
+        value.
+        """
+        self.worker_id = worker_id
+        self.config = config
+        self.track = track
+        self.client_allocations = client_allocations
+
+
+class ClientState:
+    """
+    Bookkeeping for a single client that is run by an ``AsyncLoadGenerator``.
+    """
+
+    def __init__(self, client_id, tasks, es):
+        self.client_id = client_id
+        self.tasks = tasks
+        self.es = es
+        self.current_task = 0
+        self.sampler = None
+        self.future = None
+
+
+class AsyncLoadGenerator(thespian.actors.Actor):
+    """
+    A load generator that runs multiple clients within one process.
+
+    Each client is a coroutine on an event loop which runs in a dedicated thread. The event loop takes care of scheduling (i.e. waiting
+    for the next scheduled invocation and throttling) whereas the actual (blocking) requests are issued on a thread pool. The pool is
+    only as large as the number of clients of this worker that run a task at the same time (see ``concurrent_clients``). The actor
+    itself only coordinates with the master and periodically sends samples. It is notified as soon as a client has finished its task
+    (see ``driver.TaskCompletionNotifier``).
+    """
+
+    WAKEUP_INTERVAL_SECONDS = 5
+
+    @staticmethod
+    def actorSystemCapabilityCheck(capabilities, requirements):
+        return driver.capabilities_match(capabilities, requirements)
+
+    def __init__(self):
+        super().__init__()
+        self.master = None
+        self.worker_id = None
+        self.config = None
+        self.track = None
+        self.clients = {}
+        self.start_timestamp = None
+        self.loop = None
+        self.pool = None
+        self.completion_notifier = None
+
+    def receiveMessage(self, msg, sender):
+        received_timestamp = time.perf_counter()
+        try:
+            if isinstance(msg, StartWorker):
+                logger.debug("worker [%d] is about to start." % msg.worker_id)
+                self.master = sender
+                self.worker_id = msg.worker_id
+                self.config = msg.config
+                self.track = msg.track
+                self.start_timestamp = time.perf_counter()
+                self.completion_notifier = driver.TaskCompletionNotifier()
+                track.load_track_plugins(self.config, runner.register_runner)
+                self.start_event_loop(concurrent_clients(msg.client_allocations))
+                for client_id, tasks in msg.client_allocations.items():
+                    es = client.EsClientFactory(self.config.opts("client", "hosts"), self.config.opts("client", "options"),
+                                                load_generator=True).create()
+                    self.clients[client_id] = ClientState(client_id, tasks, es)
+                for c in self.clients.values():
+                    self.drive(c)
+                self.wakeupAfter(datetime.timedelta(seconds=AsyncLoadGenerator.WAKEUP_INTERVAL_SECONDS))
+            elif isinstance(msg, driver.Drive):
+                c = self.clients[msg.client_id]
+                logger.debug("Client [%d] is continuing its work at task index [%d] on [%f]." %
+                             (c.client_id, c.current_task, msg.client_start_timestamp))
+                self.master = sender
+                self.drive(c, msg.client_start_timestamp)
+            elif isinstance(msg, driver.SynchronizeClock):
+                self.send(sender, driver.ClockReading(msg.worker_id, msg.master_timestamp, received_timestamp))
+            elif isinstance(msg, thespian.actors.WatchMessage):
+                self.completion_notifier.clear()
+                self.check_task_completion()
+            elif isinstance(msg, thespian.actors.WakeupMessage):
+                logger.debug("worker [%d] woke up." % self.worker_id)
+                for c in self.clients.values():
+                    self.send_samples(c)
+                # in case the actor system does not support watching file descriptors
+                self.check_task_completion()
+                self.wakeupAfter(datetime.timedelta(seconds=AsyncLoadGenerator.WAKEUP_INTERVAL_SECONDS))
+            elif isinstance(msg, thespian.actors.ActorExitRequest):
+                self.stop_event_loop()
+                if self.completion_notifier:
+                    self.completion_notifier.close()
+                    self.completion_notifier = None
+            else:
+                logger.debug("worker [%s] received unknown message [%s] (ignoring)." % (str(self.worker_id), str(msg)))
+        except Exception as e:
+            self.send(self.master, driver.BenchmarkFailure("Fatal error in worker [%s]" % str(self.worker_id), e))
+        if self.completion_notifier is not None and any(c.future is not None for c in self.clients.values()):
+            return self.completion_notifier.watch()
+
+    def check_task_completion(self):
+        for c in self.clients.values():
+            if c.future is not None and c.future.done():
+                e = c.future.exception(timeout=0)
+                # we report a failure only once
+                c.future = None
+                if e:
+                    self.send(self.master, driver.BenchmarkFailure("Error in load generator [%d]" % c.client_id, e))
+                else:
+                    self.drive(c)
+
+    def start_event_loop(self, max_concurrent_clients):
+        self.loop = asyncio.new_event_loop()
+        # one thread per concurrently active client so a slow request of one client never blocks another one
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent_clients)
+        t = threading.Thread(target=self.loop.run_forever, name="rally-worker-%d-event-loop" % self.worker_id, daemon=True)
+        t.start()
+
+    def stop_event_loop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop = None
+        if self.pool:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def drive(self, c, client_start_timestamp=None):
+        task, c.current_task = driver.next_task(c.tasks, c.current_task)
+        if isinstance(task, driver.JoinPoint):
+            logger.info("client [%d] reached join point [%s]." % (c.client_id, task))
+            # clients that don't execute tasks don't need to care about waiting
+            if c.future is not None:
+                c.future.result()
+            self.send_samples(c)
+            c.future = None
+            self.send(self.master, driver.JoinPointReached(c.client_id, task, driver.sample_buffer_high_water_marks(c.sampler)))
+            c.sampler = None
+        else:
+            logger.info("Client [%d] is executing [%s]." % (c.client_id, task))
+            c.sampler = driver.create_sampler(self.config, c.client_id, task.operation, self.start_timestamp)
+            schedule = driver.schedule_for(self.track, task, c.client_id, driver.params_prefetch_depth(self.config),
+                                           client.body_compressor(self.config.opts("client", "options")))
+            c.future = asyncio.run_coroutine_threadsafe(
+                execute_schedule_async(schedule, c.es, c.sampler, self.pool, client_start_timestamp), self.loop)
+            self.completion_notifier.notify_when_done(c.future)
+
+    def send_samples(self, c):
+        if c.sampler:
+            samples = c.sampler.packed_samples
+            histograms = c.sampler.histograms
+            if len(samples) > 0 or len(histograms) > 0:
+                self.send(self.master, driver.UpdateSamples(c.client_id, samples, histograms))
+
+
+def concurrent_clients(client_allocations):
+    """
+    Determines how many clients of a worker execute a task at the same time. As clients issue blocking requests, this is the number of
+    threads that a worker needs at most.
+
+    :param client_allocations: A dict with the client id as key and the client's row in the allocation matrix as value.
+    :return: The maximum number of clients that run a task between two join points (at least one).
+    """
+    rows = list(client_allocations.values())
+    max_concurrent = 0
+    if rows:
+        # the allocation matrix is rectangular so each column corresponds to the same step for all clients
+        for step in range(len(rows[0])):
+            max_concurrent = max(max_concurrent, sum(1 for row in rows if isinstance(row[step], track.Task)))
+    return max(max_concurrent, 1)
+
+
+def timed_execute_single(runner, es, params, deadline=None):
+    """
+    Invokes ``driver.execute_single`` and measures the time it takes. The measurement happens in the thread that issues the request so
+    it is not influenced by the hand-off between the event loop and the thread pool.
+
+    :param deadline: The timestamp at which the request should be issued. Optional. If ``None``, the request is issued immediately.
+    :return: a triple of: start timestamp, stop timestamp and the return value of ``driver.execute_single``.
+    """
+    if deadline is not None:
+        # the event loop only sleeps coarsely; busy-waiting for the rest of the time must not block it
+        driver.wait_until(deadline)
+    start = time.perf_counter()
+    result = driver.execute_single(runner, es, params)
+    stop = time.perf_counter()
+    return start, stop, result
+
+
+async def execute_schedule_async(schedule, es, sampler, executor, client_start_timestamp=None):
+    """
+    Executes tasks according to the schedule for a given operation. This is the coroutine equivalent of ``driver.execute_schedule``.
+
+    :param schedule: The schedule for this operation.
+    :param es: Elasticsearch client that will be used to execute the operation.
+    :param sampler: A container to store raw samples.
+    :param executor: The executor on which (blocking) requests are issued. The schedule is advanced on it as well because determining the
+    next request parameters may block (e.g. reading the next bulk from a data file) and must not stall the other clients on the event loop.
+    :param client_start_timestamp: The (client-local) timestamp when this client should start. Optional. Starts immediately if ``None``.
+    """
+    loop = asyncio.get_event_loop()
+    if client_start_timestamp is not None:
+        rest = client_start_timestamp - time.perf_counter()
+        if rest > 0:
+            await asyncio.sleep(rest)
+    total_start = time.perf_counter()
+    schedule = iter(schedule)
+    # noinspection PyBroadException
+    try:
+        while True:
+            next_request = await loop.run_in_executor(executor, next, schedule, None)
+            if next_request is None:
+                break
+            expected_scheduled_time, throughput_throttled, sample_type, percent_completed, runner, params = next_request
+            absolute_expected_schedule_time = total_start + expected_scheduled_time
+            if throughput_throttled:
+                rest = absolute_expected_schedule_time - time.perf_counter() - driver.SPIN_THRESHOLD_SECONDS
+                if rest > 0:
+                    await asyncio.sleep(rest)
+                deadline = absolute_expected_schedule_time
+            else:
+                deadline = None
+            start, stop, result = await loop.run_in_executor(executor, timed_execute_single, runner, es, params, deadline)
+            driver.record_sample(sampler, sample_type, percent_completed, result, total_start, absolute_expected_schedule_time,
+                                 throughput_throttled, start, stop, params)
+    except BaseException:
+        logger.exception("Could not execute schedule")
+        raise
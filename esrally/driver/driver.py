@@ -1,16 +1,20 @@
+import array
 import concurrent.futures
 import datetime
 import json
 import logging
-import queue
+import math
+import os
 import socket
+import threading
 import time
 
 import elasticsearch
 import thespian.actors
+
 from esrally import exceptions, metrics, track, client, PROGRAM_NAME
-from esrally.driver import runner
-from esrally.utils import convert, console, versions, io
+from esrally.driver import runner, samplelog, scheduler, prefetch
+from esrally.utils import convert, console, versions, io, histogram
 
 logger = logging.getLogger("rally.driver")
 
@@ -56,23 +60,85 @@ class StartLoadGenerator:
         self.tasks = tasks
 
 
+class PrepareTrack:
+    """
+    Prepares the track data on a load driver host.
+    """
+
+    def __init__(self, config, track):
+        """
+        :param config: Rally internal configuration object.
+        :param track: The track to use.
+        """
+        self.config = config
+        self.track = track
+
+
+class TrackPrepared:
+    """
+    Tells the master that the track data are available on a load driver host.
+    """
+
+    def __init__(self, host):
+        self.host = host
+
+
 class Drive:
     """
     Tells a load generator to drive (either after a join point or initially).
     """
 
-    def __init__(self, client_start_timestamp):
+    def __init__(self, client_id, client_start_timestamp):
+        self.client_id = client_id
         self.client_start_timestamp = client_start_timestamp
 
 
+class SynchronizeClock:
+    """
+    Asks a load generator for its current timestamp so the master can estimate the offset between their clocks.
+    """
+
+    def __init__(self, worker_id, master_timestamp):
+        """
+        :param worker_id: The index of the receiving load generator in the master's list of workers.
+        :param master_timestamp: The master's timestamp when this message has been sent.
+        """
+        self.worker_id = worker_id
+        self.master_timestamp = master_timestamp
+
+
+class ClockReading:
+    """
+    The reply of a load generator to ``SynchronizeClock``.
+    """
+
+    def __init__(self, worker_id, master_timestamp, received_timestamp):
+        """
+        :param worker_id: The worker id of the corresponding ``SynchronizeClock`` message.
+        :param master_timestamp: The master timestamp of the corresponding ``SynchronizeClock`` message.
+        :param received_timestamp: The load generator's timestamp when it has received ``SynchronizeClock``.
+        """
+        self.worker_id = worker_id
+        self.master_timestamp = master_timestamp
+        self.received_timestamp = received_timestamp
+        self.sent_timestamp = time.perf_counter()
+
+
 class UpdateSamples:
     """
     Used to send samples from a load generator node to the master.
     """
 
-    def __init__(self, client_id, samples):
+    def __init__(self, client_id, samples, histograms=None):
+        """
+        :param client_id: The id of the client that has gathered the samples.
+        :param samples: Either ``PackedSamples`` or a list of raw samples (or sample summaries).
+        :param histograms: A dict of latency and service time histograms that have been recorded since the last update. Key is a tuple of
+        operation name, metric name and sample type. Optional.
+        """
         self.client_id = client_id
         self.samples = samples
+        self.histograms = histograms
 
 
 class JoinPointReached:
@@ -80,10 +146,16 @@ class JoinPointReached:
     Tells the master that a load generator has reached a join point. Used for coordination across multiple load generators.
     """
 
-    def __init__(self, client_id, task):
+    def __init__(self, client_id, task, sample_buffer_high_water_marks=None):
+        """
+        :param client_id: The id of the client that has reached the join point.
+        :param task: The join point.
+        :param sample_buffer_high_water_marks: A dict with the maximum number of samples that the client has buffered between two sample
+        updates. Key is the operation name. Optional.
+        """
         self.client_id = client_id
-        self.client_local_timestamp = time.perf_counter()
         self.task = task
+        self.sample_buffer_high_water_marks = sample_buffer_high_water_marks
 
 
 class BenchmarkComplete:
@@ -91,8 +163,13 @@ class BenchmarkComplete:
     Indicates that the benchmark is complete.
     """
 
-    def __init__(self, metrics):
+    def __init__(self, metrics, sample_log=None):
+        """
+        :param metrics: The externalized metrics store.
+        :param sample_log: A closed ``SampleLog`` containing all raw samples. Optional.
+        """
         self.metrics = metrics
+        self.sample_log = sample_log
 
 
 # Workaround for https://github.com/godaddy/Thespian/issues/22
@@ -106,31 +183,61 @@ class BenchmarkFailure:
 
 
 class Driver(thespian.actors.Actor):
-    WAKEUP_INTERVAL_SECONDS = 1
     """
     Coordinates all worker drivers.
     """
+    WAKEUP_INTERVAL_SECONDS = 1
+    # number of seconds between reaching a join point and starting the next task
+    DEFAULT_TASK_PAUSE_SECONDS = 5
+    # number of round trips per load generator to estimate its clock offset
+    CLOCK_SYNC_ROUND_TRIPS = 5
 
     def __init__(self):
         super().__init__()
         self.config = None
+        self.track = None
         # Elasticsearch client
         self.es = None
         self.metrics_store = None
-        self.raw_samples = []
+        # raw samples are spilled to disk to keep memory usage constant regardless of the duration of a race
+        self.sample_log = None
+        # key = operation name, value = number of failed requests (only for aggregated samples)
+        self.error_counts = {}
+        # key = operation name, value = ThroughputCalculator
+        self.throughput_calculators = {}
+        self.histograms = {}
+        # key = operation name, value = maximum number of samples that any client has buffered
+        self.sample_buffer_high_water_marks = {}
         self.currently_completed = 0
-        self.clients_completed_current_step = {}
         self.current_step = -1
         self.number_of_steps = 0
         self.start_sender = None
         self.allocations = None
         self.join_points = None
         self.ops_per_join_point = None
+        # key = operation name, value = operation
+        self.operations = {}
+        self.number_of_clients = 0
+        # actor requirements for each load driver host (None means that load generators run on the coordinator)
+        self.load_driver_requirements = [None]
+        self.pending_track_preparations = 0
+        # the actor responsible for each client (indexed by client id)
         self.drivers = []
+        # all load generator actors (there may be fewer actors than clients if clients are packed onto workers)
+        self.workers = []
+        # the index in ``workers`` for each client (indexed by client id)
+        self.client_workers = []
+        # key = worker index, value = ClockOffsetEstimator of the most recent completed clock synchronization
+        self.clock_offsets = {}
+        # key = worker index, value = ClockOffsetEstimator of a clock synchronization in progress
+        self.pending_clock_syncs = {}
+        # whether the next step starts as soon as all clocks are synchronized
+        self.next_step_pending = False
         self.progress_reporter = console.progress()
         self.progress_counter = 0
         self.quiet = False
-        self.most_recent_sample_per_client = {}
+        self.task_pause = Driver.DEFAULT_TASK_PAUSE_SECONDS
+        self.most_recent_progress_per_client = {}
 
     def receiveMessage(self, msg, sender):
         try:
@@ -140,6 +247,14 @@ class Driver(thespian.actors.Actor):
                 self.joinpoint_reached(msg)
             elif isinstance(msg, UpdateSamples):
                 self.update_samples(msg)
+            elif isinstance(msg, ClockReading):
+                self.clock_reading(msg, sender)
+            elif isinstance(msg, TrackPrepared):
+                logger.info("Track data are available on load driver host [%s]." % msg.host)
+                self.send(sender, thespian.actors.ActorExitRequest())
+                self.pending_track_preparations -= 1
+                if self.pending_track_preparations == 0:
+                    self.start_load_generators()
             elif isinstance(msg, thespian.actors.WakeupMessage):
                 if not self.finished():
                     self.update_progress_message()
@@ -147,29 +262,37 @@ class Driver(thespian.actors.Actor):
             elif isinstance(msg, BenchmarkFailure):
                 logger.error("Main driver received a fatal exception from a load generator. Shutting down.")
                 self.metrics_store.close()
-                for driver in self.drivers:
-                    self.send(driver, thespian.actors.ActorExitRequest())
+                if self.sample_log is not None:
+                    self.sample_log.delete()
+                for worker in self.workers:
+                    self.send(worker, thespian.actors.ActorExitRequest())
                 self.send(self.start_sender, msg)
                 self.send(self.myAddress, thespian.actors.ActorExitRequest())
         except Exception as e:
             logger.exception("Main driver encountered a fatal exception. Shutting down.")
             self.metrics_store.close()
-            for driver in self.drivers:
-                self.send(driver, thespian.actors.ActorExitRequest())
+            if self.sample_log is not None:
+                self.sample_log.delete()
+            for worker in self.workers:
+                self.send(worker, thespian.actors.ActorExitRequest())
             self.send(self.start_sender, BenchmarkFailure("Could not execute benchmark", e))
             self.send(self.myAddress, thespian.actors.ActorExitRequest())
 
     def start_benchmark(self, msg, sender):
         self.start_sender = sender
         self.config = msg.config
+        self.track = msg.track
         current_track = msg.track
 
         logger.info("Preparing track")
-        # TODO #71: Reconsider this in case we distribute drivers. *For now* the driver will only be on a single machine, so we're safe.
+        # this prepares the track data for all load generators on this machine; remote load driver hosts prepare their own copy (see
+        # TrackPreparationActor) before any load generator is started. Load generators only use their local clock to schedule requests
+        # and to calculate relative times. Start timestamps are translated with the estimated clock offset (see ClockOffsetEstimator).
         track.prepare_track(current_track, self.config)
 
         logger.info("Benchmark is about to start.")
         self.quiet = self.config.opts("system", "quiet.mode", mandatory=False, default_value=False)
+        self.task_pause = float(self.config.opts("driver", "task.pause", mandatory=False, default_value=Driver.DEFAULT_TASK_PAUSE_SECONDS))
         self.es = client.EsClientFactory(self.config.opts("client", "hosts"), self.config.opts("client", "options")).create()
         self.metrics_store = metrics.InMemoryMetricsStore(config=self.config, meta_info=msg.metrics_meta_info, lap=msg.lap)
         invocation = self.config.opts("meta", "time.start")
@@ -178,6 +301,9 @@ class Driver(thespian.actors.Actor):
         challenge_name = self.config.opts("benchmarks", "challenge")
         selected_car_name = self.config.opts("benchmarks", "car")
         self.metrics_store.open(invocation, track_name, challenge_name, selected_car_name)
+        sample_log_dir = self.config.opts("system", "invocation.root.dir")
+        io.ensure_dir(sample_log_dir)
+        self.sample_log = samplelog.SampleLog("%s/samples-lap-%d.bin" % (sample_log_dir, msg.lap))
 
         challenge = select_challenge(self.config, current_track)
         es_version = self.config.opts("source", "distribution.version")
@@ -188,44 +314,102 @@ class Driver(thespian.actors.Actor):
         self.allocations = allocator.allocations
         self.number_of_steps = len(allocator.join_points) - 1
         self.ops_per_join_point = allocator.operations_per_joinpoint
+        self.operations = {op.name: op for ops in self.ops_per_join_point for op in ops}
+        self.number_of_clients = allocator.clients
 
         logger.info("Benchmark consists of [%d] steps executed by (at most) [%d] clients as specified by the allocation matrix:\n%s" %
                     (self.number_of_steps, len(self.allocations), self.allocations))
 
-        for client_id in range(allocator.clients):
-            self.drivers.append(self.createActor(LoadGenerator))
-        for client_id, driver in enumerate(self.drivers):
-            self.send(driver, StartLoadGenerator(client_id, self.config, current_track, self.allocations[client_id]))
+        hosts = self.config.opts("driver", "load.driver.hosts", mandatory=False, default_value=["localhost"])
+        self.load_driver_requirements = load_driver_requirements(hosts)
+        # the track has already been prepared on the coordinator but remote hosts need the track data too
+        remote_hosts = {}
+        for requirements in self.load_driver_requirements:
+            if requirements is not None and requirements["ip"] not in LOCAL_ADDRESSES:
+                remote_hosts[requirements["ip"]] = {"ip": requirements["ip"]}
+        if remote_hosts:
+            self.pending_track_preparations = len(remote_hosts)
+            for host, requirements in remote_hosts.items():
+                logger.info("Preparing track on load driver host [%s]." % host)
+                preparator = self.createActor(TrackPreparationActor, targetActorRequirements=requirements)
+                self.send(preparator, PrepareTrack(self.config, current_track))
+        else:
+            self.start_load_generators()
+
+    def start_load_generators(self):
+        engine = self.config.opts("driver", "engine", mandatory=False, default_value="actor")
+        if engine == "actor":
+            self.start_actor_load_generators()
+        elif engine == "asyncio":
+            self.start_async_load_generators()
+        else:
+            raise exceptions.SystemSetupError("Unknown driver engine [%s]" % engine)
 
+        self.synchronize_clocks()
         self.update_progress_message()
         self.wakeupAfter(datetime.timedelta(seconds=Driver.WAKEUP_INTERVAL_SECONDS))
 
+    def start_actor_load_generators(self):
+        """
+        Starts one dedicated load generator actor (i.e. one process) per client. Clients are spread round-robin across all load driver
+        hosts.
+        """
+        for client_id in range(self.number_of_clients):
+            requirements = self.load_driver_requirements[client_id % len(self.load_driver_requirements)]
+            self.drivers.append(self.createActor(LoadGenerator, targetActorRequirements=requirements))
+        self.workers = list(self.drivers)
+        self.client_workers = list(range(self.number_of_clients))
+        for client_id, driver in enumerate(self.drivers):
+            self.send(driver, StartLoadGenerator(client_id, self.config, self.track, self.allocations[client_id]))
+
+    def start_async_load_generators(self):
+        """
+        Packs all clients onto a (smaller) number of workers which run their clients as coroutines on an event loop. Workers are spread
+        round-robin across all load driver hosts.
+        """
+        # imported lazily to avoid a circular import
+        from esrally.driver import async_driver
+        num_workers = self.config.opts("driver", "workers", mandatory=False, default_value=None) or os.cpu_count() or 1
+        self.drivers = [None] * self.number_of_clients
+        self.client_workers = [None] * self.number_of_clients
+        for worker_id, client_ids in enumerate(pack_clients(self.number_of_clients, num_workers)):
+            requirements = self.load_driver_requirements[worker_id % len(self.load_driver_requirements)]
+            worker = self.createActor(async_driver.AsyncLoadGenerator, targetActorRequirements=requirements)
+            self.workers.append(worker)
+            allocations = {}
+            for client_id in client_ids:
+                self.drivers[client_id] = worker
+                self.client_workers[client_id] = worker_id
+                allocations[client_id] = self.allocations[client_id]
+            logger.info("Worker [%d] runs clients %s." % (worker_id, client_ids))
+            self.send(worker, async_driver.StartWorker(worker_id, self.config, self.track, allocations))
+
     def joinpoint_reached(self, msg):
         self.currently_completed += 1
-        self.clients_completed_current_step[msg.client_id] = (msg.client_local_timestamp, time.perf_counter())
+        if msg.sample_buffer_high_water_marks:
+            for operation_name, high_water_mark in msg.sample_buffer_high_water_marks.items():
+                self.sample_buffer_high_water_marks[operation_name] = max(high_water_mark,
+                                                                          self.sample_buffer_high_water_marks.get(operation_name, 0))
         logger.debug("[%d/%d] drivers reached join point [%d/%d]." %
-                     (self.currently_completed, len(self.drivers), self.current_step + 1, self.number_of_steps))
-        if self.currently_completed == len(self.drivers):
+                     (self.currently_completed, self.number_of_clients, self.current_step + 1, self.number_of_steps))
+        if self.currently_completed == self.number_of_clients:
             logger.info("All drivers completed their operations until join point [%d/%d]." %
                         (self.current_step + 1, self.number_of_steps))
             # we can go on to the next step
             self.currently_completed = 0
-            # make a copy and reset early to avoid any race conditions from clients that reach a join point already while we are sending...
-            clients_curr_step = self.clients_completed_current_step
-            self.clients_completed_current_step = {}
             self.update_progress_message(task_finished=True)
             # clear per step
-            self.most_recent_sample_per_client = {}
+            self.most_recent_progress_per_client = {}
             self.current_step += 1
             if self.finished():
                 logger.info("All steps completed. Shutting down.")
                 # we're done here
-                for driver in self.drivers:
-                    self.send(driver, thespian.actors.ActorExitRequest())
+                for worker in self.workers:
+                    self.send(worker, thespian.actors.ActorExitRequest())
                 logger.info("Postprocessing samples...")
                 self.post_process_samples()
                 logger.info("Sending benchmark results...")
-                self.send(self.start_sender, BenchmarkComplete(self.metrics_store.to_externalizable()))
+                self.send(self.start_sender, BenchmarkComplete(self.metrics_store.to_externalizable(), self.sample_log))
                 logger.info("Closing metrics store...")
                 self.metrics_store.close()
                 # immediately clear as we don't need it anymore and it can consume a significant amount of memory
@@ -233,49 +417,120 @@ class Driver(thespian.actors.Actor):
                 logger.info("Terminating main driver actor.")
                 self.send(self.myAddress, thespian.actors.ActorExitRequest())
             else:
-                # start the next task in five seconds (relative to master's timestamp)
-                #
-                # Assumption: We don't have a lot of clock skew between reaching the join point and sending the next task
-                #             (it doesn't matter too much if we're a few ms off).
-                start_next_task = time.perf_counter() + 5.0
-                for client_id, driver in enumerate(self.drivers):
-                    client_ended_task_at, master_received_msg_at = clients_curr_step[client_id]
-                    client_start_timestamp = client_ended_task_at + (start_next_task - master_received_msg_at)
-                    logger.info("Scheduling next task for client id [%d] at their timestamp [%f] (master timestamp [%f])" %
-                                (client_id, client_start_timestamp, start_next_task))
-                    self.send(driver, Drive(client_start_timestamp))
+                # clocks drift apart during long tasks so we measure their offset again before we start the next task
+                self.next_step_pending = True
+                self.synchronize_clocks()
+
+    def synchronize_clocks(self):
+        """
+        Starts to estimate the clock offset of all load generators (see ``ClockOffsetEstimator``).
+        """
+        for worker_id, worker in enumerate(self.workers):
+            self.pending_clock_syncs[worker_id] = ClockOffsetEstimator(Driver.CLOCK_SYNC_ROUND_TRIPS)
+            self.send(worker, SynchronizeClock(worker_id, time.perf_counter()))
+
+    def clock_reading(self, msg, sender):
+        received_timestamp = time.perf_counter()
+        estimator = self.pending_clock_syncs.get(msg.worker_id)
+        if estimator is None:
+            logger.debug("Ignoring late clock reading of load generator [%d]." % msg.worker_id)
+            return
+        estimator.add(msg.master_timestamp, msg.received_timestamp, msg.sent_timestamp, received_timestamp)
+        if not estimator.done:
+            self.send(sender, SynchronizeClock(msg.worker_id, time.perf_counter()))
+            return
+        del self.pending_clock_syncs[msg.worker_id]
+        self.clock_offsets[msg.worker_id] = estimator
+        offset_ms = convert.seconds_to_ms(estimator.offset)
+        uncertainty_ms = convert.seconds_to_ms(estimator.uncertainty)
+        logger.info("Clock offset of load generator [%d] is [%.3f] ms (uncertainty [%.3f] ms)." %
+                    (msg.worker_id, offset_ms, uncertainty_ms))
+        meta_data = {"load_generator": msg.worker_id}
+        self.metrics_store.put_value_cluster_level("clock_offset", offset_ms, "ms", meta_data=meta_data)
+        self.metrics_store.put_value_cluster_level("clock_offset_uncertainty", uncertainty_ms, "ms", meta_data=meta_data)
+        if self.next_step_pending and not self.pending_clock_syncs:
+            self.start_next_step()
+
+    def start_next_step(self):
+        self.next_step_pending = False
+        # start the next task after the configured pause (relative to master's timestamp)
+        start_next_task = time.perf_counter() + self.task_pause
+        for client_id, driver in enumerate(self.drivers):
+            client_start_timestamp = start_next_task + self.clock_offsets[self.client_workers[client_id]].offset
+            logger.info("Scheduling next task for client id [%d] at their timestamp [%f] (master timestamp [%f])" %
+                        (client_id, client_start_timestamp, start_next_task))
+            self.send(driver, Drive(client_id, client_start_timestamp))
 
     def finished(self):
         return self.current_step == self.number_of_steps
 
     def update_samples(self, msg):
-        self.raw_samples += msg.samples
-        if len(msg.samples) > 0:
-            most_recent = msg.samples[-1]
-            self.most_recent_sample_per_client[most_recent.client_id] = most_recent
+        samples = msg.samples
+        if isinstance(samples, PackedSamples):
+            if len(samples) > 0:
+                self.sample_log.append_packed(self.operations[samples.operation_name], samples)
+                self.throughput_calculator(samples.operation_name).add_packed(samples)
+                self.most_recent_progress_per_client[samples.client_id] = samples.last_percent_completed
+        else:
+            for sample in samples:
+                if isinstance(sample, SampleSummary):
+                    self.error_counts[sample.operation.name] = self.error_counts.get(sample.operation.name, 0) + sample.error_count
+                else:
+                    self.sample_log.append(sample.operation, sample.sample_type, sample.absolute_time, sample.relative_time,
+                                           sample.latency_ms, sample.service_time_ms, sample.total_ops, sample.total_ops_unit,
+                                           sample.time_period, sample.request_meta_data, sample.schedule_lag_ms)
+                self.throughput_calculator(sample.operation.name).add(sample.absolute_time, sample.relative_time, sample.sample_type,
+                                                                      sample.total_ops, sample.total_ops_unit, sample.time_period)
+            if len(samples) > 0:
+                most_recent = samples[-1]
+                self.most_recent_progress_per_client[most_recent.client_id] = most_recent.percent_completed
+        if msg.histograms:
+            for key, h in msg.histograms.items():
+                if key in self.histograms:
+                    self.histograms[key].merge(h)
+                else:
+                    self.histograms[key] = h
+
+    def throughput_calculator(self, operation_name):
+        calculator = self.throughput_calculators.get(operation_name)
+        if calculator is None:
+            calculator = ThroughputCalculator()
+            self.throughput_calculators[operation_name] = calculator
+        return calculator
 
     def post_process_samples(self):
-        logger.info("Post processing [%d] samples..." % len(self.raw_samples))
-        logger.info("Storing latency and service time... ")
-        for sample in self.raw_samples:
-            self.metrics_store.put_value_cluster_level(name="latency", value=sample.latency_ms, unit="ms", operation=sample.operation.name,
-                                                       operation_type=sample.operation.type, sample_type=sample.sample_type,
-                                                       absolute_time=sample.absolute_time, relative_time=sample.relative_time,
-                                                       meta_data=sample.request_meta_data)
-
-            self.metrics_store.put_value_cluster_level(name="service_time", value=sample.service_time_ms, unit="ms",
-                                                       operation=sample.operation.name, operation_type=sample.operation.type,
-                                                       sample_type=sample.sample_type, absolute_time=sample.absolute_time,
-                                                       relative_time=sample.relative_time, meta_data=sample.request_meta_data)
-
-        logger.info("Calculating throughput... ")
-        aggregates = calculate_global_throughput(self.raw_samples)
-        logger.info("Storing throughput... ")
-        for op, samples in aggregates.items():
-            for absolute_time, relative_time, sample_type, throughput, throughput_unit in samples:
-                self.metrics_store.put_value_cluster_level(name="throughput", value=throughput, unit=throughput_unit,
-                                                           operation=op.name, operation_type=op.type, sample_type=sample_type,
-                                                           absolute_time=absolute_time, relative_time=relative_time)
+        # latency and service time of individual requests are stored by the receiver of the sample log
+        self.sample_log.close()
+        logger.info("Post processing samples...")
+
+        for operation_name, error_count in self.error_counts.items():
+            # individual requests are not available; latency and service time are only stored as histograms
+            logger.info("[%d] requests of operation [%s] have failed." % (error_count, operation_name))
+
+        for operation_name, high_water_mark in self.sample_buffer_high_water_marks.items():
+            op = self.operations[operation_name]
+            logger.info("Clients buffered at most [%d] samples for [%s]." % (high_water_mark, operation_name))
+            self.metrics_store.put_count_cluster_level("sample_buffer_high_water_mark", high_water_mark, "samples", operation=op.name,
+                                                       operation_type=op.type)
+
+        phase_start = time.perf_counter()
+        for (operation, name, sample_type), h in self.histograms.items():
+            self.metrics_store.put_histogram(name, h, operation=operation, sample_type=sample_type)
+        logger.info("Storing latency and service time histograms took [%.3f] seconds." % (time.perf_counter() - phase_start))
+
+        phase_start = time.perf_counter()
+        for operation_name, calculator in self.throughput_calculators.items():
+            op = self.operations[operation_name]
+            for name, samples in [("throughput", calculator.windowed_throughput()),
+                                  ("cumulative_throughput", calculator.cumulative_throughput())]:
+                # units may differ between samples
+                for throughput_unit in set([s[4] for s in samples]):
+                    current = [s for s in samples if s[4] == throughput_unit]
+                    self.metrics_store.bulk_put_value_cluster_level(name, [s[3] for s in current], throughput_unit, operation=op.name,
+                                                                    operation_type=op.type, sample_types=[s[2] for s in current],
+                                                                    absolute_times=[s[0] for s in current],
+                                                                    relative_times=[s[1] for s in current])
+        logger.info("Storing throughput took [%.3f] seconds." % (time.perf_counter() - phase_start))
 
     def update_progress_message(self, task_finished=False):
         if not self.quiet and self.current_step >= 0:
@@ -284,22 +539,45 @@ class Driver(thespian.actors.Actor):
             if task_finished:
                 total_progress = 1.0
             else:
-                num_clients = max(len(self.most_recent_sample_per_client), 1)
-                total_progress = sum([s.percent_completed for s in self.most_recent_sample_per_client.values()]) / num_clients
+                num_clients = max(len(self.most_recent_progress_per_client), 1)
+                total_progress = sum(self.most_recent_progress_per_client.values()) / num_clients
             self.progress_reporter.print("Running %s" % ops, "[%3d%% done]" % (round(total_progress * 100)))
             if task_finished:
                 self.progress_reporter.finish()
 
 
+class TrackPreparationActor(thespian.actors.Actor):
+    """
+    Prepares the track data (i.e. downloads and decompresses the data set) on a load driver host.
+    """
+
+    @staticmethod
+    def actorSystemCapabilityCheck(capabilities, requirements):
+        return capabilities_match(capabilities, requirements)
+
+    def receiveMessage(self, msg, sender):
+        if isinstance(msg, PrepareTrack):
+            try:
+                track.prepare_track(msg.track, msg.config)
+                self.send(sender, TrackPrepared(socket.gethostname()))
+            except Exception as e:
+                self.send(sender, BenchmarkFailure("Could not prepare track on [%s]" % socket.gethostname(), e))
+
+
 class LoadGenerator(thespian.actors.Actor):
     """
     The actual driver that applies load against the cluster.
 
-    It will also regularly send measurements to the master node so it can consolidate them.
+    It will also regularly send measurements to the master node so it can consolidate them. As soon as a task is finished, the load
+    generator is notified (see ``TaskCompletionNotifier``) and continues with the next one.
     """
 
     WAKEUP_INTERVAL_SECONDS = 5
 
+    @staticmethod
+    def actorSystemCapabilityCheck(capabilities, requirements):
+        return capabilities_match(capabilities, requirements)
+
     def __init__(self):
         super().__init__()
         self.master = None
@@ -312,59 +590,67 @@ class LoadGenerator(thespian.actors.Actor):
         self.start_timestamp = None
         self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self.executor_future = None
+        self.completion_notifier = None
         self.sampler = None
-        self.start_driving = False
 
     def receiveMessage(self, msg, sender):
+        received_timestamp = time.perf_counter()
         try:
             if isinstance(msg, StartLoadGenerator):
                 logger.debug("client [%d] is about to start." % msg.client_id)
                 self.master = sender
                 self.client_id = msg.client_id
-                self.es = client.EsClientFactory(msg.config.opts("client", "hosts"), msg.config.opts("client", "options")).create()
+                self.es = client.EsClientFactory(msg.config.opts("client", "hosts"), msg.config.opts("client", "options"),
+                                                 load_generator=True).create()
                 self.config = msg.config
                 self.track = msg.track
                 self.tasks = msg.tasks
                 self.current_task = 0
                 self.start_timestamp = time.perf_counter()
+                self.completion_notifier = TaskCompletionNotifier()
                 track.load_track_plugins(self.config, runner.register_runner)
                 self.drive()
+                # samples are sent periodically
+                self.wakeupAfter(datetime.timedelta(seconds=LoadGenerator.WAKEUP_INTERVAL_SECONDS))
             elif isinstance(msg, Drive):
                 logger.debug("Client [%d] is continuing its work at task index [%d] on [%f]." %
                              (self.client_id, self.current_task, msg.client_start_timestamp))
                 self.master = sender
-                self.start_driving = True
-                self.wakeupAfter(datetime.timedelta(seconds=time.perf_counter() - msg.client_start_timestamp))
+                self.drive(msg.client_start_timestamp)
+            elif isinstance(msg, SynchronizeClock):
+                self.send(sender, ClockReading(msg.worker_id, msg.master_timestamp, received_timestamp))
+            elif isinstance(msg, thespian.actors.WatchMessage):
+                self.completion_notifier.clear()
+                self.check_task_completion()
             elif isinstance(msg, thespian.actors.WakeupMessage):
                 logger.debug("client [%d] woke up." % self.client_id)
-                # it would be better if we could send ourselves a message at a specific time, simulate this with a boolean...
-                if self.start_driving:
-                    self.start_driving = False
-                    self.drive()
-                else:
-                    self.send_samples()
-                    if self.executor_future is not None:
-                        if self.executor_future.done():
-                            e = self.executor_future.exception(timeout=0)
-                            if e:
-                                self.send(self.master, BenchmarkFailure("Error in load generator [%d]" % self.client_id, e))
-                            else:
-                                self.executor_future = None
-                                self.drive()
-                        else:
-                            self.wakeupAfter(datetime.timedelta(seconds=LoadGenerator.WAKEUP_INTERVAL_SECONDS))
+                self.send_samples()
+                # in case the actor system does not support watching file descriptors
+                self.check_task_completion()
+                self.wakeupAfter(datetime.timedelta(seconds=LoadGenerator.WAKEUP_INTERVAL_SECONDS))
+            elif isinstance(msg, thespian.actors.ActorExitRequest):
+                if self.completion_notifier:
+                    self.completion_notifier.close()
+                    self.completion_notifier = None
             else:
                 logger.debug("client [%d] received unknown message [%s] (ignoring)." % (self.client_id, str(msg)))
         except Exception as e:
             self.send(self.master, BenchmarkFailure("Fatal error in load generator [%d]" % self.client_id, e))
+        if self.executor_future is not None and self.completion_notifier is not None:
+            return self.completion_notifier.watch()
 
-    def drive(self):
-        task = None
-        # skip non-tasks in the task list
-        while task is None:
-            task = self.tasks[self.current_task]
-            self.current_task += 1
+    def check_task_completion(self):
+        if self.executor_future is not None and self.executor_future.done():
+            e = self.executor_future.exception(timeout=0)
+            # we report a failure only once
+            self.executor_future = None
+            if e:
+                self.send(self.master, BenchmarkFailure("Error in load generator [%d]" % self.client_id, e))
+            else:
+                self.drive()
 
+    def drive(self, client_start_timestamp=None):
+        task, self.current_task = next_task(self.tasks, self.current_task)
         if isinstance(task, JoinPoint):
             logger.info("client [%d] reached join point [%s]." % (self.client_id, task))
             # clients that don't execute tasks don't need to care about waiting
@@ -372,57 +658,608 @@ class LoadGenerator(thespian.actors.Actor):
                 self.executor_future.result()
             self.send_samples()
             self.executor_future = None
+            self.send(self.master, JoinPointReached(self.client_id, task, sample_buffer_high_water_marks(self.sampler)))
             self.sampler = None
-            self.send(self.master, JoinPointReached(self.client_id, task))
-        elif isinstance(task, track.Task):
-            logger.info("Client [%d] is executing [%s]." % (self.client_id, task))
-            self.sampler = Sampler(self.client_id, task.operation, self.start_timestamp)
-            schedule = schedule_for(self.track, task, self.client_id)
-            self.executor_future = self.pool.submit(execute_schedule, schedule, self.es, self.sampler)
-            self.wakeupAfter(datetime.timedelta(seconds=LoadGenerator.WAKEUP_INTERVAL_SECONDS))
         else:
-            raise exceptions.RallyAssertionError("Unknown task type [%s]" % type(task))
+            logger.info("Client [%d] is executing [%s]." % (self.client_id, task))
+            self.sampler = create_sampler(self.config, self.client_id, task.operation, self.start_timestamp)
+            schedule = schedule_for(self.track, task, self.client_id, params_prefetch_depth(self.config),
+                                    client.body_compressor(self.config.opts("client", "options")))
+            self.executor_future = self.pool.submit(execute_schedule, schedule, self.es, self.sampler, client_start_timestamp)
+            self.completion_notifier.notify_when_done(self.executor_future)
 
     def send_samples(self):
         if self.sampler:
-            samples = self.sampler.samples
-            if len(samples) > 0:
-                self.send(self.master, UpdateSamples(self.client_id, samples))
+            samples = self.sampler.packed_samples
+            histograms = self.sampler.histograms
+            if len(samples) > 0 or len(histograms) > 0:
+                self.send(self.master, UpdateSamples(self.client_id, samples, histograms))
+
+
+class ClockOffsetEstimator:
+    """
+    Estimates the offset between the clock of the master and the clock of a load generator like NTP does.
+
+    The master sends its timestamp t0, the load generator records t1 when it receives the request and t2 when it replies and the master
+    records t3 when it receives the reply. Assuming that network delays are symmetric, the load generator's clock is ahead by
+    ((t1 - t0) + (t2 - t3)) / 2 and the error of this estimate is at most half of the round trip time (t3 - t0) - (t2 - t1). Out of several
+    round trips, the one with the shortest round trip time yields the most accurate estimate.
+    """
+
+    def __init__(self, round_trips):
+        """
+        :param round_trips: The number of round trips that are needed for an estimate.
+        """
+        self.round_trips = round_trips
+        self.count = 0
+        # offset and uncertainty in seconds
+        self.offset = None
+        self.uncertainty = None
+
+    def add(self, master_sent, generator_received, generator_sent, master_received):
+        self.count += 1
+        offset = ((generator_received - master_sent) + (generator_sent - master_received)) / 2
+        uncertainty = ((master_received - master_sent) - (generator_sent - generator_received)) / 2
+        if self.uncertainty is None or uncertainty < self.uncertainty:
+            self.offset = offset
+            self.uncertainty = uncertainty
+
+    @property
+    def done(self):
+        return self.count >= self.round_trips
+
+
+class TaskCompletionNotifier:
+    """
+    Notifies an actor as soon as a task that runs in another thread is done.
+
+    Actors must not be called from other threads. Instead, completed futures write to a pipe which the actor watches by returning
+    ``watch()`` from ``receiveMessage``. The actor system then delivers a ``WatchMessage`` when the pipe becomes readable.
+    """
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+
+    def notify_when_done(self, future):
+        """
+        :param future: A ``concurrent.futures.Future``. The actor is notified when it is done (regardless whether it has failed or not).
+        """
+        future.add_done_callback(self._notify)
+
+    def _notify(self, future):
+        os.write(self._write_fd, b"\0")
+
+    def watch(self):
+        return thespian.actors.ThespianWatch([self._read_fd])
+
+    def clear(self):
+        """
+        Consumes all pending notifications. Must only be called after a ``WatchMessage`` has been received (otherwise it blocks).
+        """
+        os.read(self._read_fd, 4096)
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+# addresses of load driver hosts that denote the coordinator machine itself
+LOCAL_ADDRESSES = ["localhost", "127.0.0.1", "::1"]
+
+
+def load_driver_requirements(hosts):
+    """
+    Determines the actor requirements that place load generators on the given load driver hosts.
+
+    :param hosts: A list of load driver hosts. Each host is either "localhost" (i.e. the coordinator) or the IP address of a remote
+    actor system (optionally followed by a colon and its admin port, which is needed to address multiple actor systems on one machine).
+    :return: A list of actor requirements (one per host). ``None`` means that load generators are created on the coordinator.
+    """
+    requirements = []
+    for host in hosts:
+        if host == "localhost":
+            requirements.append(None)
+        else:
+            ip, _, port = host.partition(":")
+            try:
+                requirements.append({"ip": ip, "Admin Port": int(port)} if port else {"ip": ip})
+            except ValueError:
+                raise exceptions.SystemSetupError("Invalid load driver host [%s] (expected an IP address optionally followed by a port, "
+                                                  "e.g. 192.168.14.3:1900)." % host)
+    if not requirements:
+        raise exceptions.SystemSetupError("At least one load driver host is required.")
+    return requirements
+
+
+def capabilities_match(capabilities, requirements):
+    """
+    Checks whether an actor system is suitable for an actor with the given requirements.
+
+    :param capabilities: The capabilities of an actor system.
+    :param requirements: The requirements of an actor (may be ``None``).
+    :return: True iff the actor system satisfies all requirements.
+    """
+    if not requirements:
+        return True
+    return all(capabilities.get(k) == v for k, v in requirements.items())
+
+
+def pack_clients(num_clients, num_workers):
+    """
+    Distributes clients round-robin across workers.
+
+    :param num_clients: The total number of clients (i.e. the number of columns in the allocation matrix).
+    :param num_workers: The maximum number of workers.
+    :return: A list containing the client ids for each worker. There are never more workers than clients and no worker stays idle.
+    """
+    workers = [[] for _ in range(min(num_clients, num_workers))]
+    for client_id in range(num_clients):
+        workers[client_id % len(workers)].append(client_id)
+    return workers
+
+
+def params_prefetch_depth(cfg):
+    """
+    :param cfg: The config object.
+    :return: The number of request parameters that each client prepares ahead of time (see ``schedule_for``).
+    """
+    return int(cfg.opts("driver", "params.prefetch", mandatory=False, default_value=0))
+
+
+def create_sampler(cfg, client_id, operation, start_timestamp):
+    """
+    Creates a sampler based on the current configuration.
+
+    :param cfg: The config object.
+    :param client_id: The id of the client that records samples.
+    :param operation: The operation for which samples are recorded.
+    :param start_timestamp: The (client-local) timestamp when the benchmark has been started.
+    :return: A sampler.
+    """
+    if cfg.opts("driver", "aggregate.samples", mandatory=False, default_value=False):
+        return AggregatingSampler(client_id, operation, start_timestamp)
+    else:
+        buffer_size = int(cfg.opts("driver", "sample.buffer.size", mandatory=False, default_value=Sampler.DEFAULT_BUFFER_SIZE))
+        return Sampler(client_id, operation, start_timestamp, buffer_size)
 
 
 class Sampler:
     """
     Encapsulates management of gathered samples.
+
+    Samples are recorded into a columnar buffer which grows if needed so no sample is ever dropped. Reading samples swaps the buffer with
+    a spare one so the recording thread is blocked only for a very short time.
     """
 
-    def __init__(self, client_id, operation, start_timestamp):
+    DEFAULT_BUFFER_SIZE = 16384
+
+    def __init__(self, client_id, operation, start_timestamp, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        :param client_id: The id of the client that records samples.
+        :param operation: The operation for which samples are recorded.
+        :param start_timestamp: The (client-local) timestamp when the benchmark has been started.
+        :param buffer_size: The initial number of samples that can be buffered without growing the buffer. Optional.
+        """
         self.client_id = client_id
         self.operation = operation
         self.start_timestamp = start_timestamp
-        self.q = queue.Queue(maxsize=16384)
+        self.buffer_size = buffer_size
+        self.high_water_mark = 0
+        self.lock = threading.Lock()
+        self._buffer = SampleBuffer(buffer_size)
+        self._spare = SampleBuffer(buffer_size)
+        self._histograms = {}
+
+    def add(self, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period, percent_completed,
+            schedule_lag_ms=None):
+        """
+        Adds a sample.
 
-    def add(self, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period, percent_completed):
-        try:
-            self.q.put_nowait(Sample(self.client_id, time.time(), time.perf_counter() - self.start_timestamp, self.operation,
-                                     sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period,
-                                     percent_completed))
-        except queue.Full:
-            logger.warn("Dropping sample for [%s] due to a full sampling queue." % self.operation.name)
+        :param schedule_lag_ms: The time between the point in time when the request should have been issued according to the schedule and
+        the point in time when it has actually been issued. ``None`` if throughput is not throttled.
+        """
+        absolute_time = time.time()
+        relative_time = time.perf_counter() - self.start_timestamp
+        with self.lock:
+            self._histogram("latency", sample_type).record(latency_ms)
+            self._histogram("service_time", sample_type).record(service_time_ms)
+            if schedule_lag_ms is not None:
+                self._histogram("schedule_lag", sample_type).record(schedule_lag_ms)
+            self._buffer.add(absolute_time, relative_time, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops,
+                             total_ops_unit, time_period, percent_completed, schedule_lag_ms)
+
+    def add_compression(self, sample_type, compression_time_ms, compression_ratio):
+        """
+        Records how long it took to compress a request body ahead of time and how well it could be compressed.
+
+        :param compression_time_ms: The time that was needed to compress the request body.
+        :param compression_ratio: The size of the compressed request body divided by its original size.
+        """
+        with self.lock:
+            self._histogram("compression_time", sample_type).record(compression_time_ms)
+            self._histogram("compression_ratio", sample_type).record(compression_ratio)
+
+    def add_serialization(self, sample_type, serialized_size_kb, serialization_throughput):
+        """
+        Records how large a request body that has been serialized ahead of time is and how fast it has been serialized.
+
+        :param serialized_size_kb: The size of the serialized (but not yet compressed) request body in kB.
+        :param serialization_throughput: The number of MB per second of CPU time that have been serialized. ``None`` if the CPU time was
+        too short to be measured.
+        """
+        with self.lock:
+            self._histogram("serialized_size", sample_type).record(serialized_size_kb)
+            if serialization_throughput is not None:
+                self._histogram("serialization_throughput", sample_type).record(serialization_throughput)
+
+    def _histogram(self, name, sample_type):
+        key = (self.operation.name, name, sample_type)
+        h = self._histograms.get(key)
+        if h is None:
+            h = histogram.Histogram()
+            self._histograms[key] = h
+        return h
+
+    @property
+    def histograms(self):
+        """
+        :return: All histograms that have been recorded since the last call. Key is a tuple of operation name, metric name and sample type.
+        """
+        with self.lock:
+            histograms = self._histograms
+            self._histograms = {}
+        return histograms
 
     @property
     def samples(self):
+        """
+        :return: A list of all samples that have been recorded since the last call.
+        """
+        return self.packed_samples.unpack(self.operation)
+
+    @property
+    def packed_samples(self):
+        """
+        :return: All samples that have been recorded since the last call in the form in which they are sent to the master.
+        """
+        with self.lock:
+            current = self._buffer
+            self._buffer = self._spare
+        if current.size > self.high_water_mark:
+            self.high_water_mark = current.size
+            if current.size > self.buffer_size:
+                logger.info("Sample buffer of client [%d] for [%s] reached a new high-water mark of [%d] samples (initial size [%d])." %
+                            (self.client_id, self.operation.name, current.size, self.buffer_size))
+        packed = PackedSamples(self.client_id, self.operation.name, current)
+        current.clear()
+        self._spare = current
+        return packed
+
+
+class AggregatingSampler(Sampler):
+    """
+    A sampler that pre-aggregates all samples of one second into a ``SampleSummary`` instead of keeping raw samples. This bounds the
+    number of samples that need to be sent to (and kept by) the master regardless of the request rate. Latency and service time are still
+    recorded in histograms so percentiles are unaffected.
+    """
+
+    def __init__(self, client_id, operation, start_timestamp):
+        # we never use the sample buffer
+        super().__init__(client_id, operation, start_timestamp, buffer_size=0)
+        # key = (second, sample type), value = summary
+        self._summaries = {}
+
+    def add(self, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit, time_period, percent_completed,
+            schedule_lag_ms=None):
+        absolute_time = time.time()
+        relative_time = time.perf_counter() - self.start_timestamp
+        key = (int(absolute_time), sample_type)
+        with self.lock:
+            self._histogram("latency", sample_type).record(latency_ms)
+            self._histogram("service_time", sample_type).record(service_time_ms)
+            if schedule_lag_ms is not None:
+                self._histogram("schedule_lag", sample_type).record(schedule_lag_ms)
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = SampleSummary(self.client_id, self.operation, sample_type, total_ops_unit)
+                self._summaries[key] = summary
+            summary.add(absolute_time, relative_time, request_meta_data, latency_ms, service_time_ms, total_ops, time_period,
+                        percent_completed)
+
+    @property
+    def samples(self):
+        """
+        :return: A list of summaries for all samples that have been recorded since the last call in chronological order.
+        """
+        with self.lock:
+            summaries = self._summaries
+            self._summaries = {}
+        return [summaries[k] for k in sorted(summaries.keys())]
+
+    @property
+    def packed_samples(self):
+        # summaries are compact enough to be sent as is
+        return self.samples
+
+
+class SampleSummary:
+    """
+    Summarizes all samples of a client for one operation and sample type within one second.
+
+    It provides the same attributes as ``Sample`` that are needed to calculate throughput and progress. Timestamps, ``time_period`` and
+    ``percent_completed`` refer to the most recent sample in this summary whereas ``total_ops`` is the sum across all samples.
+    """
+
+    def __init__(self, client_id, operation, sample_type, total_ops_unit):
+        self.client_id = client_id
+        self.operation = operation
+        self.sample_type = sample_type
+        self.total_ops_unit = total_ops_unit
+        self.count = 0
+        self.error_count = 0
+        self.total_ops = 0
+        self.latency_ms_sum = 0
+        self.latency_ms_max = 0
+        self.service_time_ms_sum = 0
+        self.service_time_ms_max = 0
+        self.absolute_time = None
+        self.relative_time = None
+        self.time_period = None
+        self.percent_completed = None
+
+    def add(self, absolute_time, relative_time, request_meta_data, latency_ms, service_time_ms, total_ops, time_period, percent_completed):
+        self.count += 1
+        if is_error(request_meta_data):
+            self.error_count += 1
+        self.total_ops += total_ops
+        self.latency_ms_sum += latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+        self.service_time_ms_sum += service_time_ms
+        self.service_time_ms_max = max(self.service_time_ms_max, service_time_ms)
+        self.absolute_time = absolute_time
+        self.relative_time = relative_time
+        self.time_period = time_period
+        self.percent_completed = percent_completed
+
+
+def is_error(request_meta_data):
+    """
+    :param request_meta_data: The request meta data of a sample (may be ``None``).
+    :return: ``True`` iff the corresponding request has failed, i.e. either the runner has reported it as unsuccessful or the request has
+    raised a transport error (see ``execute_single``).
+    """
+    if not request_meta_data:
+        return False
+    return not request_meta_data.get("success", True) or "http_status" in request_meta_data or "error_description" in request_meta_data
+
+
+class SampleBuffer:
+    """
+    A growable columnar buffer for raw samples. Each attribute of a sample is stored in a dedicated column so recording a sample does not
+    allocate any objects.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.absolute_time = array.array("d", [0.0]) * capacity
+        self.relative_time = array.array("d", [0.0]) * capacity
+        self.sample_type = array.array("b", [0]) * capacity
+        self.latency_ms = array.array("d", [0.0]) * capacity
+        self.service_time_ms = array.array("d", [0.0]) * capacity
+        self.total_ops = array.array("d", [0.0]) * capacity
+        self.time_period = array.array("d", [0.0]) * capacity
+        self.percent_completed = array.array("d", [0.0]) * capacity
+        # NaN for requests that have not been throttled
+        self.schedule_lag_ms = array.array("d", [0.0]) * capacity
+        self.request_meta_data = [None] * capacity
+        self.total_ops_unit = [None] * capacity
+
+    def add(self, absolute_time, relative_time, sample_type, request_meta_data, latency_ms, service_time_ms, total_ops, total_ops_unit,
+            time_period, percent_completed, schedule_lag_ms=None):
+        i = self.size
+        if i == self.capacity:
+            self._grow()
+        self.absolute_time[i] = absolute_time
+        self.relative_time[i] = relative_time
+        self.sample_type[i] = sample_type
+        self.request_meta_data[i] = request_meta_data
+        self.latency_ms[i] = latency_ms
+        self.service_time_ms[i] = service_time_ms
+        self.total_ops[i] = total_ops
+        self.total_ops_unit[i] = total_ops_unit
+        self.time_period[i] = time_period
+        self.percent_completed[i] = percent_completed
+        self.schedule_lag_ms[i] = math.nan if schedule_lag_ms is None else schedule_lag_ms
+        self.size = i + 1
+
+    def _grow(self):
+        for column in [self.absolute_time, self.relative_time, self.sample_type, self.latency_ms, self.service_time_ms, self.total_ops,
+                       self.time_period, self.percent_completed, self.schedule_lag_ms]:
+            column.extend(array.array(column.typecode, [0]) * self.capacity)
+        self.request_meta_data.extend([None] * self.capacity)
+        self.total_ops_unit.extend([None] * self.capacity)
+        self.capacity *= 2
+
+    def clear(self):
+        # drop references to meta data so they can be garbage collected
+        self.request_meta_data[0:self.size] = [None] * self.size
+        self.size = 0
+
+    def numeric_columns(self):
+        return [self.absolute_time, self.relative_time, self.sample_type, self.latency_ms, self.service_time_ms, self.total_ops,
+                self.time_period, self.percent_completed, self.schedule_lag_ms]
+
+
+class PackedSamples:
+    """
+    A compact representation of raw samples that is sent from a load generator to the master.
+
+    Instead of pickling one ``Sample`` (including the full operation) per request, the numeric attributes of all samples are sent as raw
+    bytes of their column, the operation is referenced by name once and units as well as the keys of request meta data are interned.
+    Request meta data that are reported for (almost) every request are stored in typed columns as well. A column in which all values are
+    identical (e.g. the sample type or the number of operations of a bulk request) is stored as a single value.
+    """
+
+    # key = meta data key, value = tuple of the expected value type and the type code of its column
+    TYPED_META_DATA = {
+        "success": (bool, "b"),
+        "success-count": (int, "i"),
+        "error-count": (int, "i")
+    }
+
+    def __init__(self, client_id, operation_name, buffer):
+        """
+        :param client_id: The id of the client that has recorded the samples.
+        :param operation_name: The name of the operation for which samples have been recorded.
+        :param buffer: A ``SampleBuffer`` containing the samples.
+        """
+        n = buffer.size
+        self.client_id = client_id
+        self.operation_name = operation_name
+        self.size = n
+        self.typecodes = "".join([column.typecode for column in buffer.numeric_columns()])
+        self.columns = tuple([compact(column[0:n]).tobytes() for column in buffer.numeric_columns()])
+        self.units = []
+        unit_ids = array.array("h")
+        self.meta_data_keys = []
+        # for each entry in ``meta_data_keys`` whether the value of the respective key is stored in a typed column
+        self.meta_data_typed = []
+        meta_data_key_ids = array.array("h")
+        self.meta_data_values = []
+        meta_data_columns = {key: array.array(typecode) for key, (_, typecode) in PackedSamples.TYPED_META_DATA.items()}
+        self.last_percent_completed = buffer.percent_completed[n - 1] if n > 0 else None
+        units = {}
+        meta_data_keys = {}
+        for i in range(n):
+            unit = buffer.total_ops_unit[i]
+            unit_id = units.get(unit)
+            if unit_id is None:
+                unit_id = len(self.units)
+                units[unit] = unit_id
+                self.units.append(unit)
+            unit_ids.append(unit_id)
+
+            meta_data = buffer.request_meta_data[i]
+            if meta_data is None:
+                meta_data_key_ids.append(-1)
+            else:
+                keys = tuple(meta_data.keys())
+                typed = tuple([PackedSamples._is_typed(k, v) for k, v in meta_data.items()])
+                key_id = meta_data_keys.get((keys, typed))
+                if key_id is None:
+                    key_id = len(self.meta_data_keys)
+                    meta_data_keys[(keys, typed)] = key_id
+                    self.meta_data_keys.append(keys)
+                    self.meta_data_typed.append(typed)
+                meta_data_key_ids.append(key_id)
+                for key, is_typed, value in zip(keys, typed, meta_data.values()):
+                    if is_typed:
+                        meta_data_columns[key].append(value)
+                    else:
+                        self.meta_data_values.append(value)
+        self._unit_ids = compact(unit_ids)
+        self._meta_data_key_ids = compact(meta_data_key_ids)
+        self.meta_data_columns = {key: compact(column) for key, column in meta_data_columns.items() if len(column) > 0}
+
+    @staticmethod
+    def _is_typed(key, value):
+        typed = PackedSamples.TYPED_META_DATA.get(key)
+        # custom runners may report values of a different type for the same key
+        if typed is None or type(value) is not typed[0]:
+            return False
+        # counts need to fit into their column
+        return typed[0] is bool or -2 ** 31 <= value < 2 ** 31
+
+    def __len__(self):
+        return self.size
+
+    def unpack(self, operation):
+        """
+        :param operation: The operation that corresponds to ``operation_name``.
+        :return: A list of ``Sample`` instances.
+        """
+        absolute_time, relative_time, sample_type, latency_ms, service_time_ms, total_ops, time_period, percent_completed, \
+            schedule_lag_ms = [self.column(i) for i in range(len(self.columns))]
+        unit_ids = self.unit_ids()
+        sample_types = {t.value: t for t in metrics.SampleType}
         samples = []
-        try:
-            while True:
-                samples.append(self.q.get_nowait())
-        except queue.Empty:
-            pass
+        for i, meta_data in enumerate(self.meta_data()):
+            ops = total_ops[i]
+            lag = schedule_lag_ms[i]
+            samples.append(Sample(self.client_id, absolute_time[i], relative_time[i], operation, sample_types[sample_type[i]], meta_data,
+                                  latency_ms[i], service_time_ms[i], int(ops) if ops.is_integer() else ops, self.units[unit_ids[i]],
+                                  time_period[i], percent_completed[i], None if math.isnan(lag) else lag))
         return samples
 
+    def meta_data(self):
+        """
+        :return: A generator for the request meta data of each sample (or None if a sample has no meta data).
+        """
+        value_pos = 0
+        column_pos = {key: 0 for key in self.meta_data_columns.keys()}
+        for key_id in expand(self._meta_data_key_ids, self.size):
+            if key_id == -1:
+                yield None
+            else:
+                meta_data = {}
+                for key, is_typed in zip(self.meta_data_keys[key_id], self.meta_data_typed[key_id]):
+                    if is_typed:
+                        column = self.meta_data_columns[key]
+                        # a compacted column contains only one value
+                        value = column[column_pos[key]] if len(column) > 1 else column[0]
+                        meta_data[key] = PackedSamples.TYPED_META_DATA[key][0](value)
+                        column_pos[key] += 1
+                    else:
+                        meta_data[key] = self.meta_data_values[value_pos]
+                        value_pos += 1
+                yield meta_data
+
+    def column(self, i):
+        """
+        :param i: The index of a numeric column (see ``SampleBuffer.numeric_columns()``).
+        :return: An array with the values of this column for all samples.
+        """
+        column = array.array(self.typecodes[i])
+        column.frombytes(self.columns[i])
+        return expand(column, self.size)
+
+    def unit_ids(self):
+        """
+        :return: An array with the index into ``units`` for all samples.
+        """
+        return expand(self._unit_ids, self.size)
+
+
+def compact(column):
+    """
+    :param column: An array.
+    :return: A one-element array if all values of ``column`` are identical, otherwise ``column`` itself.
+    """
+    if len(column) > 1:
+        first = column[0:1]
+        # NaN is not equal to itself so we compare the raw values
+        if column.count(first[0]) == len(column) or (first[0] != first[0] and column.tobytes() == first.tobytes() * len(column)):
+            return first
+    return column
+
+
+def expand(column, size):
+    """
+    Reverses ``compact``.
+
+    :param column: A (possibly compacted) array.
+    :param size: The number of values in the original array.
+    :return: An array with ``size`` values.
+    """
+    if len(column) == 1 and size > 1:
+        return column * size
+    return column
+
 
 class Sample:
     def __init__(self, client_id, absolute_time, relative_time, operation, sample_type, request_meta_data, latency_ms, service_time_ms,
-                 total_ops, total_ops_unit, time_period, percent_completed):
+                 total_ops, total_ops_unit, time_period, percent_completed, schedule_lag_ms=None):
         self.client_id = client_id
         self.absolute_time = absolute_time
         self.relative_time = relative_time
@@ -435,6 +1272,8 @@ class Sample:
         self.total_ops_unit = total_ops_unit
         self.time_period = time_period
         self.percent_completed = percent_completed
+        # None if throughput is not throttled
+        self.schedule_lag_ms = schedule_lag_ms
 
 
 def select_challenge(config, t):
@@ -527,91 +1366,224 @@ def _do_wait(es, es_version, expected_cluster_status):
     raise exceptions.RallyAssertionError(msg)
 
 
-def calculate_global_throughput(samples, bucket_interval_secs=1):
-    """
-    Calculates global throughput based on samples gathered from multiple load generators.
-
-    :param samples: A list containing all samples from all load generators.
-    :param bucket_interval_secs: The bucket interval for aggregations.
-    :return: A global view of throughput samples.
-    """
-    samples_per_op = {}
-    # first we group all warmup / measurement samples by operation.
-    for sample in samples:
-        k = sample.operation
-        if k not in samples_per_op:
-            samples_per_op[k] = []
-        samples_per_op[k].append(sample)
-
-    global_throughput = {}
-    # with open("raw_samples.csv", "w") as sample_log:
-    #    print("client_id,absolute_time,relative_time,operation,sample_type,total_ops,time_period", file=sample_log)
-    for k, v in samples_per_op.items():
-        op = k
-        if op not in global_throughput:
-            global_throughput[op] = []
-        # sort all samples by time
-        current_samples = sorted(v, key=lambda s: s.absolute_time)
-
-        total_count = 0
-        interval = 0
-        current_bucket = 0
-        current_sample_type = current_samples[0].sample_type
-        start_time = current_samples[0].absolute_time - current_samples[0].time_period
-        for sample in current_samples:
-            # print("%d,%f,%f,%s,%s,%d,%f" %
-            # (sample.client_id, sample.absolute_time, sample.relative_time, sample.operation, sample.sample_type,
-            #  sample.total_ops, sample.time_period), file=sample_log)
+class ThroughputCalculator:
+    """
+    Calculates the throughput of a single operation across all clients incrementally while samples arrive.
+
+    Each sample is attributed to a time bucket based on the point in time when its request has finished. Buckets are left-open, i.e. a
+    request that finishes exactly at the end of a bucket belongs to this bucket. Adding a sample is O(1) and memory usage depends only on
+    the duration of the task, not on the number of samples. Samples may arrive in any order.
+
+    Based on these buckets, the calculator provides two time series: the windowed throughput is the throughput within each bucket and
+    thus also reveals short dips whereas the cumulative throughput is the average throughput since the start of the task.
+    """
+
+    def __init__(self, bucket_interval_secs=1):
+        """
+        :param bucket_interval_secs: The bucket interval for aggregations.
+        """
+        self.bucket_interval_secs = bucket_interval_secs
+        # all bucket boundaries are relative to the start of the task as determined by the first sample that has arrived
+        self.anchor = None
+        self.relative_time_offset = None
+        self.start_time = None
+        self.end_time = None
+        # unit -> bucket index -> [total ops, sample type]
+        self.buckets = {}
+
+    def add(self, absolute_time, relative_time, sample_type, total_ops, total_ops_unit, time_period):
+        """
+        Adds a single sample.
+
+        :param absolute_time: The absolute timestamp in seconds since epoch when the request has finished.
+        :param relative_time: The relative timestamp in seconds when the request has finished.
+        :param sample_type: The sample type, either as ``SampleType`` or as its integer value.
+        :param total_ops: The number of operations that this sample represents.
+        :param total_ops_unit: The unit of ``total_ops``.
+        :param time_period: The time period in seconds since the client has started to execute the task.
+        """
+        task_start = absolute_time - time_period
+        if self.anchor is None:
+            self.anchor = task_start
+            self.relative_time_offset = relative_time - absolute_time
+            self.start_time = task_start
+            self.end_time = absolute_time
+        else:
+            self.start_time = min(self.start_time, task_start)
+            self.end_time = max(self.end_time, absolute_time)
+
+        bucket_index = math.ceil((absolute_time - self.anchor) / self.bucket_interval_secs) - 1
+        buckets = self.buckets.get(total_ops_unit)
+        if buckets is None:
+            buckets = {}
+            self.buckets[total_ops_unit] = buckets
+        bucket = buckets.get(bucket_index)
+        if bucket is None:
+            buckets[bucket_index] = [total_ops, int(sample_type)]
+        else:
+            bucket[0] += total_ops
+            bucket[1] = max(bucket[1], int(sample_type))
+
+    def add_packed(self, packed):
+        """
+        Adds all samples of a ``PackedSamples`` instance.
+        """
+        absolute_time, relative_time, sample_type, _, _, total_ops, time_period = [packed.column(i) for i in range(7)]
+        units = packed.units
+        for i, unit_id in enumerate(packed.unit_ids()):
+            self.add(absolute_time[i], relative_time[i], sample_type[i], total_ops[i], units[unit_id], time_period[i])
+
+    def windowed_throughput(self):
+        """
+        :return: A list of throughput samples with one sample per bucket as tuples of absolute time, relative time, sample type,
+        throughput and throughput unit. The last bucket is omitted if it is incomplete (unless it is the only one) as it would otherwise
+        distort the throughput at the end of the task.
+        """
+        return self._throughput(cumulative=False)
 
+    def cumulative_throughput(self):
+        """
+        :return: A list of throughput samples containing the average throughput since the start of the task at the end of each bucket
+        as tuples of absolute time, relative time, sample type, throughput and throughput unit. The last sample is taken at the end of the
+        task even if the last bucket is incomplete as it is the average throughput across the whole task.
+        """
+        return self._throughput(cumulative=True)
+
+    def _throughput(self, cumulative):
+        sample_types = {t.value: t for t in metrics.SampleType}
+        throughput = []
+        for unit, buckets in self.buckets.items():
+            first = min(buckets.keys())
+            last = max(buckets.keys())
+            total_count = 0
             # once we have seen a new sample type, we stick to it.
-            if current_sample_type < sample.sample_type:
-                current_sample_type = sample.sample_type
+            current_sample_type = buckets[first][1]
+            for bucket_index in range(first, last + 1):
+                total_ops, sample_type = buckets.get(bucket_index, (0, current_sample_type))
+                current_sample_type = max(current_sample_type, sample_type)
+                total_count += total_ops
+                bucket_start = self.anchor + bucket_index * self.bucket_interval_secs
+                bucket_end = min(bucket_start + self.bucket_interval_secs, self.end_time)
+                if cumulative:
+                    interval = bucket_end - self.start_time
+                else:
+                    if bucket_end < bucket_start + self.bucket_interval_secs and bucket_index > first:
+                        continue
+                    interval = bucket_end - max(bucket_start, self.start_time)
+                # avoid division by zero
+                if interval > 0:
+                    value = total_count if cumulative else total_ops
+                    throughput.append((bucket_end, bucket_end + self.relative_time_offset, sample_types[current_sample_type],
+                                       value / interval, "%s/s" % unit))
+        return throughput
 
-            total_count += sample.total_ops
-            interval = max(sample.absolute_time - start_time, interval)
 
-            # avoid division by zero
-            if interval > 0 and interval >= current_bucket:
-                current_bucket = int(interval) + bucket_interval_secs
-                throughput = (total_count / interval)
-                # we calculate throughput per second
-                global_throughput[op].append(
-                    (sample.absolute_time, sample.relative_time, current_sample_type, throughput, "%s/s" % sample.total_ops_unit))
-    return global_throughput
+# number of seconds before the scheduled time of a request at which a throttled client stops sleeping and starts to busy-wait
+SPIN_THRESHOLD_SECONDS = 0.001
 
 
-def execute_schedule(schedule, es, sampler):
+def execute_schedule(schedule, es, sampler, client_start_timestamp=None):
     """
     Executes tasks according to the schedule for a given operation.
 
     :param schedule: The schedule for this operation.
     :param es: Elasticsearch client that will be used to execute the operation.
     :param sampler: A container to store raw samples.
+    :param client_start_timestamp: The (client-local) timestamp when this client should start. Optional. Starts immediately if ``None``.
     """
+    if client_start_timestamp is not None:
+        wait_until(client_start_timestamp)
     total_start = time.perf_counter()
     # noinspection PyBroadException
     try:
-        for expected_scheduled_time, sample_type, percent_completed, runner, params in schedule:
+        for expected_scheduled_time, throughput_throttled, sample_type, percent_completed, runner, params in schedule:
             absolute_expected_schedule_time = total_start + expected_scheduled_time
-            throughput_throttled = expected_scheduled_time > 0
             if throughput_throttled:
-                rest = absolute_expected_schedule_time - time.perf_counter()
-                if rest > 0:
-                    time.sleep(rest)
+                wait_until(absolute_expected_schedule_time)
             start = time.perf_counter()
-            total_ops, total_ops_unit, request_meta_data = execute_single(runner, es, params)
+            result = execute_single(runner, es, params)
             stop = time.perf_counter()
-
-            service_time = stop - start
-            # Do not calculate latency separately when we don't throttle throughput. This metric is just confusing then.
-            latency = stop - absolute_expected_schedule_time if throughput_throttled else service_time
-            sampler.add(sample_type, request_meta_data, convert.seconds_to_ms(latency), convert.seconds_to_ms(service_time), total_ops,
-                        total_ops_unit, (stop - total_start), percent_completed)
+            record_sample(sampler, sample_type, percent_completed, result, total_start, absolute_expected_schedule_time,
+                          throughput_throttled, start, stop, params)
     except BaseException:
         logger.exception("Could not execute schedule")
         raise
 
 
+def wait_until(deadline, spin_threshold=SPIN_THRESHOLD_SECONDS):
+    """
+    Blocks the calling thread until the given point in time. As the wakeup of ``time.sleep()`` is often late by several milliseconds, it
+    only sleeps until ``spin_threshold`` seconds before the deadline and busy-waits for the rest of the time.
+
+    :param deadline: A timestamp as returned by ``time.perf_counter()``.
+    :param spin_threshold: The number of seconds before the deadline at which to stop sleeping. Optional.
+    """
+    rest = deadline - time.perf_counter()
+    if rest > spin_threshold:
+        time.sleep(rest - spin_threshold)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def sample_buffer_high_water_marks(sampler):
+    """
+    :param sampler: The sampler of a client. May be ``None`` if the client has not executed a task.
+    :return: A dict with the sample buffer high-water mark of the sampler's operation (as expected by ``JoinPointReached``) or ``None``.
+    """
+    return {sampler.operation.name: sampler.high_water_mark} if sampler else None
+
+
+def next_task(tasks, current_task):
+    """
+    Determines the next task that a client needs to run.
+
+    :param tasks: The client's row in the allocation matrix.
+    :param current_task: The index in ``tasks`` at which the search starts.
+    :return: A tuple of the next task (either a ``JoinPoint`` or a ``track.Task``) and the index at which the next search should start.
+    """
+    task = None
+    # skip non-tasks in the task list
+    while task is None:
+        task = tasks[current_task]
+        current_task += 1
+    if not isinstance(task, (JoinPoint, track.Task)):
+        raise exceptions.RallyAssertionError("Unknown task type [%s]" % type(task))
+    return task, current_task
+
+
+def record_sample(sampler, sample_type, percent_completed, result, total_start, absolute_expected_schedule_time, throughput_throttled,
+                  start, stop, params=None):
+    """
+    Calculates latency and service time of a single request and adds a corresponding sample.
+
+    :param sampler: A container to store raw samples.
+    :param result: The return value of ``execute_single``.
+    :param total_start: The timestamp when the schedule has started.
+    :param absolute_expected_schedule_time: The timestamp when the request should have been issued.
+    :param throughput_throttled: Whether the schedule is throttled (otherwise latency is identical to service time).
+    :param start: The timestamp when the request has been issued.
+    :param stop: The timestamp when the response has been received.
+    :param params: The request parameters. Optional. If the request body has been serialized or compressed ahead of time, the size and
+    serialization throughput or compression time and ratio are recorded as well.
+    """
+    total_ops, total_ops_unit, request_meta_data = result
+    service_time = stop - start
+    # Do not calculate latency separately when we don't throttle throughput. This metric is just confusing then.
+    latency = stop - absolute_expected_schedule_time if throughput_throttled else service_time
+    # Shows whether the client could keep up with its schedule. Without throttling there is no schedule to keep up with.
+    schedule_lag = convert.seconds_to_ms(start - absolute_expected_schedule_time) if throughput_throttled else None
+    sampler.add(sample_type, request_meta_data, convert.seconds_to_ms(latency), convert.seconds_to_ms(service_time), total_ops,
+                total_ops_unit, (stop - total_start), percent_completed, schedule_lag)
+    body = params.get("body") if isinstance(params, dict) else None
+    if isinstance(body, client.CompressedBody):
+        sampler.add_compression(sample_type, convert.seconds_to_ms(body.compression_time), body.compression_ratio)
+    serialization_time = params.get("serialization-time") if isinstance(params, dict) else None
+    if serialization_time is not None:
+        serialized_size = body.uncompressed_size if isinstance(body, client.CompressedBody) else len(body)
+        serialization_throughput = convert.bytes_to_mb(serialized_size) / serialization_time if serialization_time > 0 else None
+        sampler.add_serialization(sample_type, convert.bytes_to_kb(serialized_size), serialization_throughput)
+
+
 def execute_single(runner, es, params):
     """
     Invokes the given runner once and provides the runner's return value in a uniform structure.
@@ -768,79 +1740,108 @@ class Allocator:
 
 # Runs a concrete schedule on one worker client
 # Needs to determine the runners and concrete iterations per client.
-def schedule_for(current_track, task, client_index):
+def schedule_for(current_track, task, client_index, prefetch_depth=0, compressor=None):
     """
     Calculates a client's schedule for a given task.
 
     :param current_track: The current track.
     :param task: The task that should be executed.
     :param client_index: The current client index.  Must be in the range [0, `task.clients').
-    :return: A generator for the operations the given client needs to perform for this task.
+    :param prefetch_depth: The number of request parameters that are prepared ahead of time on a background thread. Optional. If zero,
+    parameters are prepared right before each request.
+    :param compressor: A ``client.BodyCompressor`` to compress request bodies while prefetching parameters. Optional.
+    :return: A generator for the operations the given client needs to perform for this task. Each item is a tuple of the expected
+    scheduled time, whether throughput is throttled, sample type, percent completed, runner and request parameters.
     """
     op = task.operation
     num_clients = task.clients
     target_throughput = task.target_throughput / num_clients if task.target_throughput else None
     runner_for_op = runner.runner_for(op.type)
     params_for_op = track.operation_parameters(current_track, op).partition(client_index, num_clients)
+    if target_throughput:
+        sched = scheduler.scheduler_for(task.schedule, 1 / target_throughput, task.params)
+        logger.info("Using [%s] schedule for [%s] with a target throughput of [%s] operations per second and client." %
+                    (task.schedule, op, str(target_throughput)))
+    else:
+        sched = None
+
+    time_based = task.warmup_time_period is not None or task.time_period is not None
+    if prefetch_depth > 0:
+        if not time_based:
+            limit = task.warmup_iterations // num_clients + task.iterations // num_clients
+        elif task.time_period is None:
+            limit = params_for_op.size()
+        else:
+            # the number of requests depends on the response times
+            limit = None
+        params_for_op = prefetch.PrefetchingParamSource(params_for_op, prefetch_depth, limit, name=op.name, compressor=compressor)
 
-    if task.warmup_time_period is not None or task.time_period is not None:
+    if time_based:
         warmup_time_period = task.warmup_time_period if task.warmup_time_period else 0
         logger.info("Creating time-period based schedule for [%s] with a warmup period of [%s] seconds and a time period of [%s] seconds."
                     % (op, str(warmup_time_period), str(task.time_period)))
-        return time_period_based(target_throughput, warmup_time_period, task.time_period, runner_for_op, params_for_op)
+        schedule = time_period_based(sched, warmup_time_period, task.time_period, runner_for_op, params_for_op, client_index, num_clients)
     else:
         logger.info("Creating iteration-count based schedule for [%s] with [%d] warmup iterations and [%d] iterations." %
                     (op, task.warmup_iterations, task.iterations))
-        return iteration_count_based(target_throughput, task.warmup_iterations // num_clients, task.iterations // num_clients,
-                                     runner_for_op, params_for_op)
+        schedule = iteration_count_based(sched, task.warmup_iterations // num_clients, task.iterations // num_clients,
+                                         runner_for_op, params_for_op, client_index, num_clients)
+    return prefetch.closing(schedule, params_for_op) if prefetch_depth > 0 else schedule
 
 
-def time_period_based(target_throughput, warmup_time_period, time_period, runner, params):
+def time_period_based(sched, warmup_time_period, time_period, runner, params, client_index=0, num_clients=1):
     """
     Calculates the necessary schedule for time period based operations.
 
-    :param target_throughput: The desired target throughput in operations / second or None if throughput should not be limited.
+    :param sched: The scheduler that determines when a request should be issued or None if throughput should not be limited.
     :param warmup_time_period: The time period in seconds that is considered for warmup. Must not be None; provide zero instead.
     :param time_period: The time period in seconds that is considered for measurement. May be None.
     :param runner: The runner for a given operation.
     :param params: The parameter source for a given operation.
+    :param client_index: The current client index.
+    :param num_clients: The total number of clients that execute this operation.
     :return: A generator for the corresponding parameters.
     """
-    wait_time = 1 / target_throughput if target_throughput else 0
+    throttled = sched is not None
+    next_scheduled = sched.first(client_index, num_clients) if throttled else 0
     start = time.perf_counter()
     if time_period is None:
         iterations = params.size()
         for it in range(0, iterations):
             sample_type = metrics.SampleType.Warmup if time.perf_counter() - start < warmup_time_period else metrics.SampleType.Normal
             percent_completed = (it + 1) / iterations
-            yield (wait_time * it, sample_type, percent_completed, runner, params.params())
+            yield (next_scheduled, throttled, sample_type, percent_completed, runner, params.params())
+            next_scheduled = sched.next(next_scheduled) if throttled else 0
     else:
         end = start + warmup_time_period + time_period
-        it = 0
         while time.perf_counter() < end:
             now = time.perf_counter()
             sample_type = metrics.SampleType.Warmup if now - start < warmup_time_period else metrics.SampleType.Normal
             percent_completed = (now - start) / (warmup_time_period + time_period)
-            yield (wait_time * it, sample_type, percent_completed, runner, params.params())
-            it += 1
+            yield (next_scheduled, throttled, sample_type, percent_completed, runner, params.params())
+            next_scheduled = sched.next(next_scheduled) if throttled else 0
 
 
-def iteration_count_based(target_throughput, warmup_iterations, iterations, runner, params):
+def iteration_count_based(sched, warmup_iterations, iterations, runner, params, client_index=0, num_clients=1):
     """
     Calculates the necessary schedule based on a given number of iterations.
 
-    :param target_throughput: The desired target throughput in operations / second or None if throughput should not be limited.
+    :param sched: The scheduler that determines when a request should be issued or None if throughput should not be limited.
     :param warmup_iterations: The number of warmup iterations to run. 0 if no warmup should be performed.
     :param iterations: The number of measurement iterations to run.
     :param runner: The runner for a given operation.
     :param params: The parameter source for a given operation.
+    :param client_index: The current client index.
+    :param num_clients: The total number of clients that execute this operation.
     :return: A generator for the corresponding parameters.
     """
-    wait_time = 1 / target_throughput if target_throughput else 0
     total_iterations = warmup_iterations + iterations
     if total_iterations == 0:
         raise exceptions.RallyAssertionError("Operation must run at least for one iteration.")
+    throttled = sched is not None
+    next_scheduled = sched.first(client_index, num_clients) if throttled else 0
     for it in range(0, total_iterations):
         sample_type = metrics.SampleType.Warmup if it < warmup_iterations else metrics.SampleType.Normal
         percent_completed = (it + 1) / total_iterations
-        yield (wait_time * it, sample_type, percent_completed, runner, params.params())
+        yield (next_scheduled, throttled, sample_type, percent_completed, runner, params.params())
+        next_scheduled = sched.next(next_scheduled) if throttled else 0
@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger("rally.driver")
+
+
+class PrefetchingParamSource:
+    """
+    Wraps a parameter source and invokes its ``params()`` ahead of time on a background thread. Hence, reading data (e.g. the next bulk from
+    a data file) happens while the client waits for responses and does not delay the next request. At most ``depth`` parameter sets are
+    held in memory.
+
+    Whenever a client needs parameters, the number of parameter sets that are ready (the queue depth) is recorded. If it is often zero,
+    the data path cannot keep up with the client.
+
+    If request compression is enabled, request bodies that are already available as ``bytes`` are compressed on the background thread as
+    well, so compression does not count towards the service time.
+    """
+
+    def __init__(self, source, depth, limit=None, name=None, compressor=None):
+        """
+        :param source: The parameter source to wrap.
+        :param depth: The maximum number of parameter sets that are prefetched. Must be positive.
+        :param limit: The total number of parameter sets that are needed. Optional. If ``None``, parameters are prefetched until ``close()``
+        is called.
+        :param name: A name for log messages (e.g. the operation name). Optional.
+        :param compressor: A ``client.BodyCompressor`` to compress request bodies ahead of time. Optional.
+        """
+        self.source = source
+        self.depth = depth
+        self.limit = limit
+        self.name = name
+        self.compressor = compressor
+        # index = number of parameter sets that were ready when a client needed parameters, value = how often this was the case
+        self.queue_depths = [0] * (depth + 1)
+        # total time in seconds that clients had to wait for parameters
+        self.wait_time = 0
+        self._queue = queue.Queue(maxsize=depth)
+        self._stopped = threading.Event()
+        self._producer = threading.Thread(target=self._produce, name="rally-params-prefetch-%s" % name, daemon=True)
+        self._producer.start()
+
+    def _produce(self):
+        produced = 0
+        try:
+            while not self._stopped.is_set() and (self.limit is None or produced < self.limit):
+                params = self.source.params()
+                if self.compressor is not None and isinstance(params, dict) and isinstance(params.get("body"), bytes):
+                    params = dict(params, body=self.compressor.compress(params["body"]))
+                produced += 1
+                self._queue.put((params, None))
+        except BaseException as e:
+            # hand any error (also StopIteration when a data file is exhausted) to the client
+            self._queue.put((None, e))
+
+    def partition(self, partition_index, total_partitions):
+        return self.source.partition(partition_index, total_partitions)
+
+    def size(self):
+        return self.source.size()
+
+    def params(self):
+        ready = self._queue.qsize()
+        self.queue_depths[ready] += 1
+        if ready == 0:
+            start = time.perf_counter()
+            params, error = self._queue.get()
+            self.wait_time += time.perf_counter() - start
+        else:
+            params, error = self._queue.get()
+        if error is not None:
+            raise error
+        return params
+
+    def close(self):
+        """
+        Stops prefetching and logs how well the data path could keep up.
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        # unblock the producer if the queue is full
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        total = sum(self.queue_depths)
+        if total > 0:
+            logger.info("Prefetching parameters for [%s]: [%d] of [%d] requests had to wait for parameters ([%.3f] ms in total). "
+                        "Number of requests per queue depth: %s." %
+                        (self.name, self.queue_depths[0], total, self.wait_time * 1000, self.queue_depths))
+
+
+def closing(schedule, resource):
+    """
+    :param schedule: A generator.
+    :param resource: An object with a ``close()`` method.
+    :return: A generator that yields all items of ``schedule`` and closes ``resource`` afterwards (also if the generator is not exhausted).
+    """
+    try:
+        yield from schedule
+    finally:
+        resource.close()
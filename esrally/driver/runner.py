@@ -1,9 +1,10 @@
-import types
 import logging
+import re
+import types
 
 import elasticsearch
 
-from esrally import exceptions, track
+from esrally import client, exceptions, track
 
 logger = logging.getLogger("rally.driver")
 
@@ -64,9 +65,20 @@ class BulkIndex(Runner):
     """
     Bulk indexes the given documents.
 
-    It expects the parameter hash to contain a key "body" containing all documents for the current bulk request.
+    It expects the parameter hash to contain a key "body" containing all documents for the current bulk request. The body is either a list
+    of lines or a ready-to-send ``bytes`` object. In the latter case, the parameter hash also needs to contain the number of documents in
+    the key "bulk-size".
 
+    If "filter_response" is ``True``, Elasticsearch only returns the status of each item. If such a filtered response has not been decoded
+    yet (see ``client.LazyJSONResponse``), failed items are counted on the raw response and successful responses are not decoded at all.
     """
+    # only the status of each item is needed to count errors
+    FILTER_PATH = "errors,items.*.status"
+    # Elasticsearch renders the "errors" flag before the (potentially long) list of items
+    ERRORS_PATTERN = re.compile(r'"errors"\s*:\s*(true|false)')
+    # ignore escaped occurrences in error messages
+    STATUS_PATTERN = re.compile(r'(?<!\\)"status"\s*:\s*(\d+)')
+
     def __init__(self):
         super().__init__()
 
@@ -74,10 +86,21 @@ class BulkIndex(Runner):
         bulk_params = {}
         if "pipeline" in params:
             bulk_params["pipeline"] = params["pipeline"]
+        filtered = params.get("filter_response", False)
+        if filtered:
+            bulk_params["filter_path"] = BulkIndex.FILTER_PATH
 
         with_action_metadata = params["action_metadata_present"]
 
-        if with_action_metadata:
+        if isinstance(params["body"], bytes):
+            bulk_size = params["bulk-size"]
+            # The client would treat the body as an iterable of documents. Hand it directly to the transport which sends bytes as is.
+            if with_action_metadata:
+                path = "/_bulk"
+            else:
+                path = "/%s/%s/_bulk" % (params["index"], params["type"])
+            _, response = es.transport.perform_request("POST", path, params=bulk_params, body=params["body"])
+        elif with_action_metadata:
             # only half of the lines are documents
             bulk_size = len(params["body"]) // 2
             response = es.bulk(body=params["body"], params=bulk_params)
@@ -85,11 +108,7 @@ class BulkIndex(Runner):
             bulk_size = len(params["body"])
             response = es.bulk(body=params["body"], index=params["index"], type=params["type"], params=bulk_params)
 
-        bulk_error_count = 0
-        if response["errors"]:
-            for idx, item in enumerate(response["items"]):
-                if item["index"]["status"] > 299:
-                    bulk_error_count += 1
+        bulk_error_count = self.error_count(response, filtered)
 
         return {
             "weight": bulk_size,
@@ -100,6 +119,26 @@ class BulkIndex(Runner):
             "error-count": bulk_error_count
         }
 
+    def error_count(self, response, filtered=False):
+        """
+        :param response: A bulk response.
+        :param filtered: ``True`` iff the response has been filtered with ``FILTER_PATH``. Optional. Defaults to ``False``.
+        :return: The number of items that have failed.
+        """
+        # only a filtered response is guaranteed to contain nothing but the "errors" flag and the status of each item
+        if filtered and isinstance(response, client.LazyJSONResponse) and not response.decoded:
+            errors = BulkIndex.ERRORS_PATTERN.search(response.raw)
+            if errors is not None:
+                if errors.group(1) == "false":
+                    return 0
+                return sum(1 for status in BulkIndex.STATUS_PATTERN.finditer(response.raw) if int(status.group(1)) > 299)
+        bulk_error_count = 0
+        if response["errors"]:
+            for idx, item in enumerate(response["items"]):
+                if item["index"]["status"] > 299:
+                    bulk_error_count += 1
+        return bulk_error_count
+
 
 class ForceMerge(Runner):
     """
@@ -150,11 +189,12 @@ class Query(Runner):
                pages we will terminate earlier.
     * `items_per_page`: Number of items to retrieve per page.
 
+    If `filter_response` is present and ``True``, Elasticsearch only returns the parts of the response that are needed to run the query
+    (i.e. nothing for a plain query and the scroll id and document ids for scroll queries).
     """
-
-    def __init__(self):
-        self.scroll_id = None
-        self.es = None
+    # a plain query does not inspect the response at all
+    QUERY_FILTER_PATH = "took"
+    SCROLL_FILTER_PATH = "_scroll_id,hits.hits._id"
 
     def __call__(self, es, params):
         if "pages" in params and "items_per_page" in params:
@@ -163,11 +203,16 @@ class Query(Runner):
             return self.request_body_query(es, params)
 
     def request_body_query(self, es, params):
-        es.search(index=params["index"], doc_type=params["type"], request_cache=params["use_request_cache"], body=params["body"])
+        es.search(index=params["index"], doc_type=params["type"], request_cache=params["use_request_cache"], body=params["body"],
+                  params=self.request_params(params, Query.QUERY_FILTER_PATH))
         return 1, "ops"
 
+    def request_params(self, params, filter_path):
+        return {"filter_path": filter_path} if params.get("filter_response", False) else {}
+
     def scroll_query(self, es, params):
-        self.es = es
+        # Keep all scroll state local to this call: the same runner instance may be used concurrently by several clients that share a
+        # worker process.
         r = es.search(
             index=params["index"],
             doc_type=params["type"],
@@ -175,25 +220,23 @@ class Query(Runner):
             sort="_doc",
             scroll="10s",
             size=params["items_per_page"],
-            request_cache=params["use_request_cache"])
-        self.scroll_id = r["_scroll_id"]
-        total_pages = params["pages"]
-        # Note that starting with ES 2.0, the initial call to search() returns already the first result page
-        # so we have to retrieve one page less
-        for page in range(total_pages - 1):
-            hit_count = len(r["hits"]["hits"])
-            if hit_count == 0:
-                # We're done prematurely. Even if we are on page index zero, we still made one call.
-                return page + 1, "ops"
-            r = es.scroll(scroll_id=self.scroll_id, scroll="10s")
-        return total_pages, "ops"
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.scroll_id and self.es:
-            self.es.clear_scroll(scroll_id=self.scroll_id)
-            self.scroll_id = None
-            self.es = None
-        return False
+            request_cache=params["use_request_cache"],
+            params=self.request_params(params, Query.SCROLL_FILTER_PATH))
+        scroll_id = r["_scroll_id"]
+        try:
+            total_pages = params["pages"]
+            # Note that starting with ES 2.0, the initial call to search() returns already the first result page
+            # so we have to retrieve one page less
+            for page in range(total_pages - 1):
+                # a filtered response does not contain "hits" at all if there are no more hits
+                hit_count = len(r.get("hits", {}).get("hits", []))
+                if hit_count == 0:
+                    # We're done prematurely. Even if we are on page index zero, we still made one call.
+                    return page + 1, "ops"
+                r = es.scroll(scroll_id=scroll_id, scroll="10s", params=self.request_params(params, Query.SCROLL_FILTER_PATH))
+            return total_pages, "ops"
+        finally:
+            es.clear_scroll(scroll_id=scroll_id)
 
 
 register_runner(track.OperationType.Index.name, BulkIndex())
@@ -0,0 +1,245 @@
+import array
+import logging
+import math
+import mmap
+import os
+import pickle
+import struct
+
+logger = logging.getLogger("rally.driver")
+
+
+class SampleChunk:
+    """
+    Contains a consecutive range of raw samples of a single operation that has been read from a ``SampleLog``.
+    """
+
+    def __init__(self, operation_name, operation_type):
+        self.operation_name = operation_name
+        self.operation_type = operation_type
+        self.absolute_time = array.array("d")
+        self.relative_time = array.array("d")
+        self.sample_type = array.array("b")
+        self.latency_ms = array.array("d")
+        self.service_time_ms = array.array("d")
+        self.total_ops = array.array("d")
+        self.time_period = array.array("d")
+        # NaN for requests that have not been throttled
+        self.schedule_lag_ms = array.array("d")
+        self.units = []
+        self.meta_data = []
+
+    def __len__(self):
+        return len(self.absolute_time)
+
+
+class SampleLog:
+    """
+    An append-only log of raw samples that is backed by a memory-mapped file.
+
+    Each sample is stored as a fixed-width binary record. Request meta data have a variable size and are stored in a separate file which
+    is referenced by each record. Only their values are stored per record; the keys are interned. Hence, the memory that is needed to
+    record samples is constant regardless of the duration of a race. After the log has been closed, it can be sent to other actors (only
+    its file name and a few lookup tables are serialized) and read in chunks of a bounded size.
+    """
+
+    # absolute time, relative time, latency, service time, total ops, time period, schedule lag, meta data offset, meta data length,
+    # operation id, unit id, meta data keys id, sample type
+    RECORD = struct.Struct("<7dqihhhb")
+    DEFAULT_CAPACITY = 65536
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        """
+        Creates a new empty sample log. An existing file at ``path`` is truncated.
+
+        :param path: The path to the file that contains all records. Request meta data are stored in a file with the same name and the
+        suffix ``.meta``.
+        :param capacity: The initial number of records that fit into the file. The file grows automatically if needed.
+        """
+        self.path = path
+        self.meta_data_path = "%s.meta" % path
+        self.size = 0
+        # lookup tables; each record only contains the index into these lists
+        self.operations = []
+        self.units = []
+        self.meta_data_keys = []
+        self._operation_ids = {}
+        self._unit_ids = {}
+        self._meta_data_keys_ids = {}
+        self._capacity = max(capacity, 1)
+        self._meta_data_offset = 0
+        self._file = open(self.path, "w+b")
+        self._file.truncate(self._capacity * SampleLog.RECORD.size)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._meta_data_file = open(self.meta_data_path, "wb")
+
+    def __len__(self):
+        return self.size
+
+    def append(self, operation, sample_type, absolute_time, relative_time, latency_ms, service_time_ms, total_ops, total_ops_unit,
+               time_period, request_meta_data, schedule_lag_ms=None):
+        """
+        Appends a single sample.
+
+        :param operation: The operation to which this sample belongs.
+        :param sample_type: The sample type, either as ``SampleType`` or as its integer value.
+        :param schedule_lag_ms: The schedule lag of this sample or ``None`` if throughput has not been throttled.
+        """
+        self._reserve(1)
+        meta_data_offset, meta_data_length, meta_data_keys_id = self._write_meta_data(request_meta_data)
+        SampleLog.RECORD.pack_into(self._mmap, self.size * SampleLog.RECORD.size, absolute_time, relative_time, latency_ms,
+                                   service_time_ms, total_ops, time_period, math.nan if schedule_lag_ms is None else schedule_lag_ms,
+                                   meta_data_offset, meta_data_length, self._operation_id(operation), self._unit_id(total_ops_unit),
+                                   meta_data_keys_id, int(sample_type))
+        self.size += 1
+
+    def append_packed(self, operation, packed):
+        """
+        Appends all samples of a ``PackedSamples`` instance.
+
+        :param operation: The operation to which these samples belong.
+        :param packed: The packed samples.
+        """
+        n = len(packed)
+        if n == 0:
+            return
+        self._reserve(n)
+        absolute_time, relative_time, sample_type, latency_ms, service_time_ms, total_ops, time_period, _, schedule_lag_ms = \
+            [packed.column(i) for i in range(9)]
+        operation_id = self._operation_id(operation)
+        # translate the unit ids of the packed samples once
+        unit_ids = [self._unit_id(unit) for unit in packed.units]
+        packed_unit_ids = packed.unit_ids()
+        record_size = SampleLog.RECORD.size
+        pack_into = SampleLog.RECORD.pack_into
+        offset = self.size * record_size
+        for i, meta_data in enumerate(packed.meta_data()):
+            meta_data_offset, meta_data_length, meta_data_keys_id = self._write_meta_data(meta_data)
+            pack_into(self._mmap, offset, absolute_time[i], relative_time[i], latency_ms[i], service_time_ms[i], total_ops[i],
+                      time_period[i], schedule_lag_ms[i], meta_data_offset, meta_data_length, operation_id, unit_ids[packed_unit_ids[i]],
+                      meta_data_keys_id, sample_type[i])
+            offset += record_size
+        self.size += n
+
+    def _write_meta_data(self, request_meta_data):
+        if not request_meta_data:
+            return -1, 0, -1
+        raw_meta_data = pickle.dumps(tuple(request_meta_data.values()), protocol=pickle.HIGHEST_PROTOCOL)
+        meta_data_offset = self._meta_data_offset
+        self._meta_data_file.write(raw_meta_data)
+        self._meta_data_offset += len(raw_meta_data)
+        return meta_data_offset, len(raw_meta_data), self._meta_data_keys_id(tuple(request_meta_data.keys()))
+
+    def close(self):
+        """
+        Closes the log for writing. Afterwards it can only be read.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            # drop unused capacity
+            self._file.truncate(self.size * SampleLog.RECORD.size)
+            self._file.close()
+            self._file = None
+            self._meta_data_file.close()
+            self._meta_data_file = None
+            logger.info("Wrote [%d] samples to [%s]." % (self.size, self.path))
+
+    def chunks(self, chunk_size=100000, include_meta_data=True):
+        """
+        Reads all samples in chunks. Each chunk contains at most ``chunk_size`` consecutive records which are grouped by operation.
+
+        :param chunk_size: The maximum number of records that are held in memory at once.
+        :param include_meta_data: Whether request meta data should be read. If ``False``, the meta data of all samples are ``None``.
+        :return: A generator of lists of ``SampleChunk`` (one per operation that occurs within the current range of records).
+        """
+        if self._mmap is not None:
+            raise RuntimeError("Sample log [%s] needs to be closed before it can be read." % self.path)
+        if self.size == 0:
+            return
+        with open(self.path, "rb") as records_file, open(self.meta_data_path, "rb") as meta_data_file:
+            records = mmap.mmap(records_file.fileno(), 0, access=mmap.ACCESS_READ)
+            meta_data = mmap.mmap(meta_data_file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.meta_data_path) > 0 else None
+            try:
+                for lower in range(0, self.size, chunk_size):
+                    upper = min(lower + chunk_size, self.size)
+                    yield self._read_chunk(records, meta_data if include_meta_data else None, lower, upper)
+            finally:
+                records.close()
+                if meta_data:
+                    meta_data.close()
+
+    def _read_chunk(self, records, meta_data, lower, upper):
+        chunks = {}
+        record_size = SampleLog.RECORD.size
+        for absolute_time, relative_time, latency_ms, service_time_ms, total_ops, time_period, schedule_lag_ms, meta_data_offset, \
+                meta_data_length, operation_id, unit_id, meta_data_keys_id, sample_type in \
+                SampleLog.RECORD.iter_unpack(records[lower * record_size:upper * record_size]):
+            chunk = chunks.get(operation_id)
+            if chunk is None:
+                operation_name, operation_type = self.operations[operation_id]
+                chunk = SampleChunk(operation_name, operation_type)
+                chunks[operation_id] = chunk
+            chunk.absolute_time.append(absolute_time)
+            chunk.relative_time.append(relative_time)
+            chunk.sample_type.append(sample_type)
+            chunk.latency_ms.append(latency_ms)
+            chunk.service_time_ms.append(service_time_ms)
+            chunk.total_ops.append(total_ops)
+            chunk.time_period.append(time_period)
+            chunk.schedule_lag_ms.append(schedule_lag_ms)
+            chunk.units.append(self.units[unit_id])
+            if meta_data_keys_id == -1 or meta_data is None:
+                chunk.meta_data.append(None)
+            else:
+                values = pickle.loads(meta_data[meta_data_offset:meta_data_offset + meta_data_length])
+                chunk.meta_data.append(dict(zip(self.meta_data_keys[meta_data_keys_id], values)))
+        return list(chunks.values())
+
+    def delete(self):
+        """
+        Closes the log and removes all of its files.
+        """
+        self.close()
+        for path in [self.path, self.meta_data_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _reserve(self, n):
+        if self.size + n > self._capacity:
+            self._mmap.close()
+            while self.size + n > self._capacity:
+                self._capacity *= 2
+            self._file.truncate(self._capacity * SampleLog.RECORD.size)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+    def _operation_id(self, operation):
+        operation_id = self._operation_ids.get(operation.name)
+        if operation_id is None:
+            operation_id = len(self.operations)
+            # we also need the operation type when reading the log
+            self.operations.append((operation.name, operation.type))
+            self._operation_ids[operation.name] = operation_id
+        return operation_id
+
+    def _unit_id(self, unit):
+        unit_id = self._unit_ids.get(unit)
+        if unit_id is None:
+            unit_id = len(self.units)
+            self.units.append(unit)
+            self._unit_ids[unit] = unit_id
+        return unit_id
+
+    def _meta_data_keys_id(self, keys):
+        keys_id = self._meta_data_keys_ids.get(keys)
+        if keys_id is None:
+            keys_id = len(self.meta_data_keys)
+            self.meta_data_keys.append(keys)
+            self._meta_data_keys_ids[keys] = keys_id
+        return keys_id
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for transient in ["_file", "_mmap", "_meta_data_file"]:
+            state[transient] = None
+        return state
@@ -0,0 +1,118 @@
+import logging
+import random
+
+from esrally import exceptions
+
+logger = logging.getLogger("rally.driver")
+
+__SCHEDULERS = {}
+
+
+def scheduler_for(name, target_interval, params):
+    """
+    Creates a scheduler.
+
+    :param name: The name of the scheduler as specified in the track.
+    :param target_interval: The average interval in seconds between two consecutive requests of a single client.
+    :param params: A dict with the scheduler-specific options of the corresponding task (e.g. ``jitter``).
+    :return: A new scheduler instance.
+    """
+    try:
+        scheduler_class = __SCHEDULERS[name]
+    except KeyError:
+        raise exceptions.RallyError("No scheduler available for name [%s]" % name)
+    return scheduler_class(target_interval, params)
+
+
+def register_scheduler(name, scheduler_class):
+    logger.debug("Registering scheduler [%s] for [%s]." % (str(scheduler_class), name))
+    __SCHEDULERS[name] = scheduler_class
+
+
+class Scheduler:
+    """
+    A scheduler determines the points in time when a single client should issue its requests.
+
+    All points in time are relative to the start of the task. They depend only on the previous point in time and never on the completion
+    time of a request. Hence, a slow response does not shift the schedule and latency is always measured from the point in time when a
+    request was supposed to be sent (i.e. the schedule is "open-loop").
+    """
+
+    def __init__(self, target_interval, params):
+        """
+        :param target_interval: The average interval in seconds between two consecutive requests of a single client.
+        :param params: A dict with the scheduler-specific options of the corresponding task.
+        """
+        self.target_interval = target_interval
+        self.params = params
+
+    def first(self, client_index, num_clients):
+        """
+        :param client_index: The current client index.  Must be in the range [0, `num_clients').
+        :param num_clients: The total number of clients that execute this task.
+        :return: The point in time in seconds when the first request of this client should be issued.
+        """
+        return 0
+
+    def next(self, current):
+        """
+        :param current: The point in time in seconds when the current request was (supposed to be) issued.
+        :return: The point in time in seconds when the next request should be issued.
+        """
+        raise NotImplementedError("abstract method")
+
+
+class DeterministicScheduler(Scheduler):
+    """
+    Issues requests at a fixed interval. All clients start at the same time.
+    """
+
+    def next(self, current):
+        return current + self.target_interval
+
+
+class StaggeredScheduler(DeterministicScheduler):
+    """
+    Issues requests at a fixed interval but spreads the start of all clients evenly across one interval. This avoids that all clients
+    send their requests at the same time and results in evenly spaced arrivals across all clients.
+    """
+
+    def first(self, client_index, num_clients):
+        return client_index * self.target_interval / num_clients
+
+
+class UniformScheduler(Scheduler):
+    """
+    Issues requests at a randomized interval which is drawn from a uniform distribution around the target interval. The parameter
+    ``jitter`` (default: 0.5) defines the maximum deviation as a fraction of the target interval, e.g. a jitter of 0.2 with a target
+    interval of 100ms results in intervals between 80ms and 120ms.
+    """
+
+    def __init__(self, target_interval, params):
+        super().__init__(target_interval, params)
+        self.jitter = params.get("jitter", 0.5) if params else 0.5
+        if self.jitter < 0 or self.jitter > 1:
+            raise exceptions.SystemSetupError("Jitter must be in the range [0, 1] but was [%s]" % str(self.jitter))
+
+    def next(self, current):
+        return current + self.target_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class PoissonScheduler(Scheduler):
+    """
+    Models requests as a Poisson process, i.e. the intervals between two requests are exponentially distributed with the target interval
+    as their mean. This is the typical arrival pattern of many independent users.
+    """
+
+    def __init__(self, target_interval, params):
+        super().__init__(target_interval, params)
+        self.rate = 1 / target_interval
+
+    def next(self, current):
+        return current + random.expovariate(self.rate)
+
+
+register_scheduler("deterministic", DeterministicScheduler)
+register_scheduler("staggered", StaggeredScheduler)
+register_scheduler("uniform", UniformScheduler)
+register_scheduler("poisson", PoissonScheduler)
@@ -10,7 +10,7 @@ import jinja2
 import psutil
 
 from esrally import config, time, exceptions, client
-from esrally.mechanic import telemetry, cluster
+from esrally.mechanic import telemetry, cluster, mockserver
 from esrally.utils import versions, console, process, io, convert
 
 logger = logging.getLogger("rally.launcher")
@@ -208,6 +208,51 @@ the index size).
         pass
 
 
+class MockLauncher:
+    """
+    Starts a local mock Elasticsearch server (see ``mockserver``) so races can be run without a real cluster. Rally's own components
+    (driver, metrics store and reporter) behave as in a real race but the reported numbers say nothing about Elasticsearch.
+    """
+
+    def __init__(self, cfg, metrics_store, client_factory_class=client.EsClientFactory):
+        self.cfg = cfg
+        self.metrics_store = metrics_store
+        self.client_factory = client_factory_class
+        self.server = None
+
+    def start(self, car=None):
+        latency_spec = self.cfg.opts("mock", "latency", mandatory=False, default_value=None)
+        latency = mockserver.latency_distribution(latency_spec) if latency_spec else None
+        error_rate = float(self.cfg.opts("mock", "error.rate", mandatory=False, default_value=0.0))
+        self.server = mockserver.MockElasticsearch(latency=latency, error_rate=error_rate).start()
+        console.info("Racing against a mock Elasticsearch on port [%d]. The results say nothing about Elasticsearch." % self.server.port,
+                     logger=logger)
+
+        hosts = [{"host": self.server.host, "port": self.server.port}]
+        client_options = self.cfg.opts("launcher", "client.options")
+        # unified client config
+        self.cfg.add(config.Scope.benchmark, "launcher", "external.target.hosts", hosts)
+        self.cfg.add(config.Scope.benchmark, "client", "hosts", hosts)
+        self.cfg.add(config.Scope.benchmark, "client", "options", client_options)
+
+        es = self.client_factory(hosts, client_options).create()
+
+        t = telemetry.Telemetry(self.cfg, devices=[
+            telemetry.ExternalEnvironmentInfo(self.cfg, es, self.metrics_store),
+            telemetry.NodeStats(self.cfg, es, self.metrics_store),
+            telemetry.IndexStats(self.cfg, es, self.metrics_store)
+        ])
+        c = cluster.Cluster([], t)
+        self.cfg.add(config.Scope.benchmark, "source", "distribution.version", mockserver.MOCK_VERSION)
+        t.attach_to_cluster(c)
+        return c
+
+    def stop(self, cluster):
+        if self.server:
+            self.server.stop()
+            self.server = None
+
+
 class InProcessLauncher:
     """
     Launcher is responsible for starting and stopping the benchmark candidate.
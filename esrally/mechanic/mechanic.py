@@ -6,7 +6,7 @@ from esrally.mechanic import supplier, provisioner, launcher
 logger = logging.getLogger("rally.mechanic")
 
 
-def create(cfg, metrics_store, sources=False, build=False, distribution=False, external=False, docker=False):
+def create(cfg, metrics_store, sources=False, build=False, distribution=False, external=False, docker=False, mock=False):
     if sources:
         s = lambda: supplier.from_sources(cfg, build)
         p = provisioner.local_provisioner(cfg)
@@ -23,9 +23,13 @@ def create(cfg, metrics_store, sources=False, build=False, distribution=False, e
         s = lambda: None
         p = provisioner.no_op_provisioner(cfg)
         l = launcher.DockerLauncher(cfg, metrics_store)
+    elif mock:
+        s = lambda: None
+        p = provisioner.no_op_provisioner(cfg)
+        l = launcher.MockLauncher(cfg, metrics_store)
     else:
         # It is a programmer error (and not a user error) if this function is called with wrong parameters
-        raise RuntimeError("One of sources, distribution, docker or external must be True")
+        raise RuntimeError("One of sources, distribution, docker, external or mock must be True")
 
     return Mechanic(cfg, s, p, l)
 
@@ -0,0 +1,363 @@
+import gzip
+import http.server
+import itertools
+import json
+import logging
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from esrally import exceptions
+
+logger = logging.getLogger("rally.mockserver")
+
+# The version that the mock server reports. Rally chooses version-specific behavior (e.g. for cluster health checks) based on it.
+MOCK_VERSION = "5.0.0"
+MOCK_NODE_NAME = "rally-mock-node-0"
+
+
+class LatencyDistribution:
+    """
+    Determines the artificial processing time of a request.
+    """
+
+    def __init__(self, name, sample):
+        """
+        :param name: A human-readable description of this distribution.
+        :param sample: A function without arguments that returns a latency in milliseconds.
+        """
+        self.name = name
+        self.sample = sample
+
+    def __str__(self):
+        return self.name
+
+
+def latency_distribution(spec, rand=random.Random()):
+    """
+    Parses a latency distribution specification. Supported formats (all values in milliseconds):
+
+    * ``fixed:<latency>``: Every request takes the same time.
+    * ``uniform:<min>:<max>``: Latency is distributed uniformly between ``min`` and ``max``.
+    * ``exponential:<mean>``: Latency follows an exponential distribution with the given mean (many fast requests and a long tail).
+
+    :param spec: A specification string.
+    :param rand: A random number generator. Intended for testing.
+    :return: A ``LatencyDistribution``.
+    """
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(":")] if args else []
+    except ValueError:
+        raise exceptions.SystemSetupError("Invalid latency distribution [%s]. Parameters must be numeric." % spec)
+    if any(v < 0 for v in values):
+        raise exceptions.SystemSetupError("Invalid latency distribution [%s]. Parameters must not be negative." % spec)
+    if name == "fixed" and len(values) == 1:
+        latency = values[0]
+        return LatencyDistribution(spec, lambda: latency)
+    elif name == "uniform" and len(values) == 2 and values[0] <= values[1]:
+        lower, upper = values
+        return LatencyDistribution(spec, lambda: rand.uniform(lower, upper))
+    elif name == "exponential" and len(values) == 1:
+        mean = values[0]
+        return LatencyDistribution(spec, lambda: rand.expovariate(1 / mean) if mean > 0 else 0)
+    else:
+        raise exceptions.SystemSetupError("Invalid latency distribution [%s]. Use one of 'fixed:<latency>', 'uniform:<min>:<max>' or "
+                                          "'exponential:<mean>' (values in milliseconds)." % spec)
+
+
+class MockElasticsearch:
+    """
+    A stub HTTP server that speaks the subset of the Elasticsearch REST API that Rally uses during a race (bulk indexing, searches and
+    scrolls, index management, cluster health and stats). It does not store any documents but answers with well-formed responses so tracks,
+    schedules and parameter sources can be tried out without a real cluster.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=None, error_rate=0.0, hits=10, rand=random.Random()):
+        """
+        :param host: The address to bind to.
+        :param port: The port to bind to. Optional. By default an unused port is chosen.
+        :param latency: A ``LatencyDistribution`` for bulk and search requests. Optional. By default requests are answered immediately.
+        :param error_rate: The probability in the range [0, 1] that a request fails. For bulk requests, individual items fail instead.
+        :param hits: The total number of hits that each search request matches.
+        :param rand: A random number generator. Intended for testing.
+        """
+        if error_rate < 0 or error_rate > 1:
+            raise exceptions.SystemSetupError("The error rate must be in the range [0, 1] but was [%s]." % str(error_rate))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hits = hits
+        self.rand = rand
+        self.indices = set()
+        self.bulk_requests = 0
+        self.indexed_docs = 0
+        self.search_requests = 0
+        self._scrolls = {}
+        self._scroll_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="rally-mock-elasticsearch", daemon=True)
+        self._thread.start()
+        logger.info("Started mock Elasticsearch on [%s:%d] (latency [%s], error rate [%s])." %
+                    (self.host, self.port, self.latency, str(self.error_rate)))
+        return self
+
+    def stop(self):
+        # shutdown() waits for the serving thread and would block forever if the server has not been started
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        logger.info("Stopped mock Elasticsearch. It has received [%d] bulk requests with [%d] documents and [%d] search requests." %
+                    (self.bulk_requests, self.indexed_docs, self.search_requests))
+
+    def _simulate_processing(self):
+        if self.latency:
+            delay = self.latency.sample()
+            if delay > 0:
+                time.sleep(delay / 1000)
+
+    def _fails(self):
+        return self.error_rate > 0 and self.rand.random() < self.error_rate
+
+    def handle(self, method, path, params, body):
+        """
+        :param method: The HTTP method.
+        :param path: A list of the non-empty path components.
+        :param params: A dict of query parameters.
+        :param body: The (uncompressed) request body as bytes. May be empty.
+        :return: A tuple of HTTP status and response body (a dict or a string).
+        """
+        api = next((p for p in path if p.startswith("_") and p != "_all"), None)
+        if method == "GET" and not path:
+            return 200, {
+                "name": MOCK_NODE_NAME,
+                "cluster_name": "rally-mock",
+                "version": {"number": MOCK_VERSION, "build_hash": "mock", "lucene_version": "6.2.0"},
+                "tagline": "You Know, for Search"
+            }
+        elif api == "_bulk":
+            return self._bulk(body)
+        elif api == "_search" and "scroll" in path:
+            return self._scroll(method, path, params, body)
+        elif api == "_search":
+            return self._search(params, body)
+        elif api == "_cluster":
+            return 200, {"cluster_name": "rally-mock", "status": "green", "timed_out": False, "number_of_nodes": 1,
+                         "number_of_data_nodes": 1, "active_primary_shards": len(self.indices), "active_shards": len(self.indices),
+                         "relocating_shards": 0, "initializing_shards": 0, "unassigned_shards": 0}
+        elif api == "_cat":
+            return 200, ""
+        elif api in ["_forcemerge", "_optimize", "_refresh", "_flush"]:
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        elif api == "_stats":
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0},
+                         "_all": {"primaries": {"docs": {"count": self.indexed_docs}}, "total": {"docs": {"count": self.indexed_docs}}},
+                         "indices": {}}
+        elif api == "_nodes":
+            return 200, {"cluster_name": "rally-mock", "nodes": {"mock": self._node_stats() if "stats" in path else self._node_info()}}
+        elif api == "_mapping" or (len(path) == 3 and path[2] == "_mapping"):
+            return 200, {"acknowledged": True}
+        elif api is None and len(path) == 1:
+            return self._index(method, path[0])
+        else:
+            return 400, {"error": {"type": "illegal_argument_exception",
+                                   "reason": "mock Elasticsearch does not support [%s /%s]" % (method, "/".join(path))}, "status": 400}
+
+    def _index(self, method, index):
+        with self._lock:
+            if method == "HEAD":
+                return (200 if index in self.indices else 404), ""
+            elif method == "PUT":
+                self.indices.add(index)
+                return 200, {"acknowledged": True}
+            elif method == "DELETE":
+                self.indices.discard(index)
+                return 200, {"acknowledged": True}
+        return 405, {"error": "Incorrect HTTP method for uri [/%s]" % index, "status": 405}
+
+    def _bulk(self, body):
+        self._simulate_processing()
+        lines = body.splitlines()
+        actions = sum(1 for line in lines if line.startswith((b'{"index"', b'{"create"', b'{ "index"', b'{ "create"')))
+        # bulk bodies without action and meta-data lines consist only of documents
+        docs = actions if actions > 0 else len([line for line in lines if line.strip()])
+        items = []
+        errors = False
+        for _ in range(docs):
+            if self._fails():
+                errors = True
+                items.append({"index": {"status": 429, "error": {"type": "es_rejected_execution_exception",
+                                                                 "reason": "rejected by mock Elasticsearch"}}})
+            else:
+                items.append({"index": {"status": 201, "result": "created"}})
+        with self._lock:
+            self.bulk_requests += 1
+            self.indexed_docs += docs
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+    def _search(self, params, body):
+        self._simulate_processing()
+        with self._lock:
+            self.search_requests += 1
+        if self._fails():
+            return 503, {"error": {"type": "search_phase_execution_exception", "reason": "failed by mock Elasticsearch"}, "status": 503}
+        size = int(params.get("size", 10))
+        response = self._hits(min(size, self.hits))
+        if "scroll" in params:
+            with self._lock:
+                scroll_id = "mock-scroll-%d" % next(self._scroll_ids)
+                self._scrolls[scroll_id] = [size, self.hits - size]
+            response["_scroll_id"] = scroll_id
+        return 200, response
+
+    def _scroll(self, method, path, params, body):
+        scroll_ids = scroll_ids_of(path, params, body)
+        if method == "DELETE":
+            with self._lock:
+                for scroll_id in scroll_ids:
+                    self._scrolls.pop(scroll_id, None)
+            return 200, {"succeeded": True}
+        scroll_id = scroll_ids[0] if scroll_ids else None
+        self._simulate_processing()
+        with self._lock:
+            scroll = self._scrolls.get(scroll_id)
+            if scroll is None:
+                return 404, {"error": {"type": "search_context_missing_exception", "reason": "No search context found"}, "status": 404}
+            size, remaining = scroll
+            page = max(min(size, remaining), 0)
+            scroll[1] = remaining - page
+        response = self._hits(page)
+        response["_scroll_id"] = scroll_id
+        return 200, response
+
+    def _hits(self, count):
+        return {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "failed": 0},
+            "hits": {
+                "total": self.hits,
+                "max_score": 1.0,
+                "hits": [{"_index": "mock", "_type": "mock", "_id": str(i), "_score": 1.0, "_source": {}} for i in range(count)]
+            }
+        }
+
+    def _node_info(self):
+        return {
+            "name": MOCK_NODE_NAME,
+            "host": self.host,
+            "version": MOCK_VERSION,
+            "attributes": {},
+            "os": {"name": "mock", "version": MOCK_VERSION, "available_processors": 1},
+            "jvm": {"vm_vendor": "mock", "version": MOCK_VERSION}
+        }
+
+    def _node_stats(self):
+        return {
+            "name": MOCK_NODE_NAME,
+            "host": self.host,
+            "jvm": {"gc": {"collectors": {"young": {"collection_time_in_millis": 0}, "old": {"collection_time_in_millis": 0}}}}
+        }
+
+
+def scroll_ids_of(path, params, body):
+    """
+    Determines the scroll ids of a scroll request. Depending on the client version, they are provided in the path, as a request
+    parameter, as a JSON body or as a plain text body.
+
+    :return: A list of scroll ids.
+    """
+    scroll_id = None
+    idx = path.index("scroll")
+    if idx + 1 < len(path):
+        scroll_id = path[idx + 1]
+    elif "scroll_id" in params:
+        scroll_id = params["scroll_id"]
+    elif body:
+        text = body.decode("utf-8").strip()
+        if text.startswith("{"):
+            scroll_id = json.loads(text).get("scroll_id")
+        else:
+            scroll_id = text
+    if scroll_id is None:
+        return []
+    elif isinstance(scroll_id, list):
+        return scroll_id
+    else:
+        return scroll_id.split(",")
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def server_bind(self):
+        # HTTPServer resolves the fully qualified host name which can take a long time without network access
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = self.server_address[:2]
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    # keep connections alive like Elasticsearch does
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle()
+
+    def _handle(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = [urllib.parse.unquote(p) for p in url.path.split("/") if p]
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length > 0 else b""
+        if body and self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            status, response = self.server.mock.handle(self.command, path, params, body)
+        except BaseException as e:
+            logger.exception("Mock Elasticsearch could not handle [%s %s]." % (self.command, self.path))
+            status, response = 500, {"error": {"type": "exception", "reason": str(e)}, "status": 500}
+        if isinstance(response, str):
+            payload = response.encode("utf-8")
+            content_type = "text/plain; charset=UTF-8"
+        else:
+            payload = json.dumps(response).encode("utf-8")
+            content_type = "application/json; charset=UTF-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # the default implementation writes every request to stderr
+        pass
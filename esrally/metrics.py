@@ -1,3 +1,4 @@
+import array
 import collections
 import datetime
 import logging
@@ -13,7 +14,7 @@ import elasticsearch
 import elasticsearch.helpers
 import tabulate
 from esrally import time, exceptions
-from esrally.utils import console
+from esrally.utils import console, histogram
 
 logger = logging.getLogger("rally.metrics")
 
@@ -174,6 +175,8 @@ class MetricsStore:
             self._meta_info = meta_info
         self._clock = clock
         self._stop_watch = self._clock.stop_watch()
+        # key = (name, operation, sample type, lap), value = histogram
+        self._histograms = {}
 
     def open(self, invocation, track_name, challenge_name, car_name, create=False):
         """
@@ -349,7 +352,7 @@ class MetricsStore:
     def _put(self, level, level_key, name, value, unit, operation, operation_type, sample_type, absolute_time=None, relative_time=None,
              meta_data=None):
         if level == MetaInfoScope.cluster:
-            meta = self._meta_info[MetaInfoScope.cluster]
+            meta = self._meta_info[MetaInfoScope.cluster].copy()
         elif level == MetaInfoScope.node:
             meta = self._meta_info[MetaInfoScope.cluster].copy()
             meta.update(self._meta_info[MetaInfoScope.node][level_key])
@@ -363,6 +366,13 @@ class MetricsStore:
         if relative_time is None:
             relative_time = self._stop_watch.split_time()
 
+        doc = self._create_doc(name, value, unit, operation, operation_type, sample_type.name.lower(), absolute_time, relative_time, meta)
+
+        assert self.lap is not None, "Attempting to store [%s] without a lap." % doc
+
+        self._add(doc)
+
+    def _create_doc(self, name, value, unit, operation, operation_type, sample_type_name, absolute_time, relative_time, meta):
         doc = {
             "@timestamp": time.to_epoch_millis(absolute_time),
             "relative-time": int(relative_time * 1000 * 1000),
@@ -375,28 +385,139 @@ class MetricsStore:
             "name": name,
             "value": value,
             "unit": unit,
-            "sample-type": sample_type.name.lower(),
+            "sample-type": sample_type_name,
             "meta": meta
         }
         if operation:
             doc["operation"] = operation
         if operation_type:
             doc["operation-type"] = operation_type
+        return doc
 
-        assert self.lap is not None, "Attempting to store [%s] without a lap." % doc
+    def bulk_put_value_cluster_level(self, name, values, unit, operation=None, operation_type=None, sample_types=None, absolute_times=None,
+                                     relative_times=None, meta_data=None):
+        """
+        Adds multiple cluster level value metrics at once. This is considerably faster than calling ``put_value_cluster_level`` for each
+        value because all properties that are identical for each metric record are only determined once.
 
-        self._add(doc)
+        :param name: The name of the metric.
+        :param values: A sequence of metric values.
+        :param unit: The unit of all metric values (e.g. ms, docs/s).
+        :param operation The operation name to which these values apply. Optional. Defaults to None.
+        :param operation_type The operation type to which these values apply. Optional. Defaults to None.
+        :param sample_types A sequence containing the sample type for each value, either as ``SampleType`` or as its integer value.
+        :param absolute_times A sequence containing the absolute timestamp in seconds since epoch for each value.
+        :param relative_times A sequence containing the relative timestamp in seconds since the start of the benchmark for each value.
+        :param meta_data: A sequence containing a dict with additional key-value pairs (or None) for each value. Defaults to None.
+        """
+        assert self.lap is not None, "Attempting to store [%s] without a lap." % name
+        sample_type_names = {}
+        for t in SampleType:
+            sample_type_names[t] = t.name.lower()
+            sample_type_names[t.value] = t.name.lower()
+        # all records without request meta data share one copy of the cluster meta info
+        cluster_meta = self._meta_info[MetaInfoScope.cluster].copy()
+        for i, value in enumerate(values):
+            if meta_data and meta_data[i]:
+                meta = cluster_meta.copy()
+                meta["operation"] = meta_data[i]
+            else:
+                meta = cluster_meta
+            self._add(self._create_doc(name, value, unit, operation, operation_type, sample_type_names[sample_types[i]], absolute_times[i],
+                                       relative_times[i], meta))
+
+    def put_histogram(self, name, h, operation=None, sample_type=SampleType.Normal):
+        """
+        Adds a histogram of values for the given metric. It is merged with all histograms that have previously been added for the same
+        metric, operation, sample type and lap.
+
+        :param name: The name of the metric.
+        :param h: A ``histogram.Histogram``.
+        :param operation The operation name to which this histogram applies. Optional. Defaults to None.
+        :param sample_type Whether this histogram contains warmup or normal measurement samples. Defaults to SampleType.Normal.
+        """
+        assert self.lap is not None, "Attempting to store histogram [%s] without a lap." % name
+        self._merge_histogram((name, operation, sample_type, self.lap), h)
+
+    def _merge_histogram(self, key, h):
+        if key in self._histograms:
+            self._histograms[key].merge(h)
+        else:
+            self._histograms[key] = h
+
+    def get_histogram(self, name, operation=None, sample_type=None, lap=None):
+        """
+        Gets a histogram for the given metric that has been merged across all clients (and all laps unless a lap is specified).
+
+        :param name: The metric name to query.
+        :param operation The operation name to query. Optional.
+        :param sample_type The sample type to query. Optional. By default, all samples are considered.
+        :param lap The lap to query. Optional. By default, all laps are considered.
+        :return: A ``histogram.Histogram`` or None if no histogram has been stored for this metric.
+        """
+        merged = None
+        for (h_name, h_operation, h_sample_type, h_lap), h in self._histograms.items():
+            if h_name == name and \
+                    (operation is None or h_operation == operation) and \
+                    (sample_type is None or h_sample_type == sample_type) and \
+                    (lap is None or h_lap == lap):
+                if merged is None:
+                    merged = histogram.Histogram(h.highest_trackable_value_ms, h.significant_digits)
+                merged.merge(h)
+        return merged
 
     def bulk_add(self, docs):
         """
 
-        Adds raw metrics store documents previously created with #to_externalizable()
+        Adds raw metrics store documents and histograms previously created with #to_externalizable()
 
         :param docs:
         :return:
         """
-        for doc in pickle.loads(zlib.decompress(docs)):
+        raw_docs, histograms = pickle.loads(zlib.decompress(docs))
+        for doc in raw_docs:
             self._add(doc)
+        for key, h in histograms.items():
+            self._merge_histogram(key, h)
+
+    def add_sample_log(self, sample_log, chunk_size=100000):
+        """
+        Adds latency, service time and (for throttled requests) schedule lag of all raw samples in a sample log. The log is read in chunks
+        and each chunk is flushed immediately so the memory that is needed does not depend on the number of samples.
+
+        :param sample_log: A closed ``SampleLog``.
+        :param chunk_size: The number of samples that are processed at once.
+        """
+        quiet = self._config.opts("system", "quiet.mode", mandatory=False, default_value=False)
+        progress = console.progress()
+        total = len(sample_log)
+        processed = 0
+        stop_watch = self._clock.stop_watch()
+        stop_watch.start()
+        for chunks in sample_log.chunks(chunk_size):
+            for chunk in chunks:
+                for name, values in [("latency", chunk.latency_ms), ("service_time", chunk.service_time_ms)]:
+                    self.bulk_put_value_cluster_level(name, values, "ms", operation=chunk.operation_name,
+                                                      operation_type=chunk.operation_type, sample_types=chunk.sample_type,
+                                                      absolute_times=chunk.absolute_time, relative_times=chunk.relative_time,
+                                                      meta_data=chunk.meta_data)
+                throttled = [i for i, lag in enumerate(chunk.schedule_lag_ms) if not math.isnan(lag)]
+                if throttled:
+                    self.bulk_put_value_cluster_level("schedule_lag", [chunk.schedule_lag_ms[i] for i in throttled], "ms",
+                                                      operation=chunk.operation_name, operation_type=chunk.operation_type,
+                                                      sample_types=[chunk.sample_type[i] for i in throttled],
+                                                      absolute_times=[chunk.absolute_time[i] for i in throttled],
+                                                      relative_times=[chunk.relative_time[i] for i in throttled],
+                                                      meta_data=[chunk.meta_data[i] for i in throttled])
+                processed += len(chunk)
+            self.flush()
+            logger.debug("Added [%d/%d] samples." % (processed, total))
+            if not quiet:
+                progress.print("Storing samples", "[%3d%% done]" % (round(processed / total * 100)))
+        if not quiet and total > 0:
+            progress.finish()
+        stop_watch.stop()
+        logger.info("Adding [%d] samples took [%.3f] seconds." % (len(sample_log), stop_watch.total_time()))
 
     def _add(self, doc):
         """
@@ -689,6 +810,13 @@ class EsMetricsStore(MetricsStore):
 
 
 class InMemoryMetricsStore(MetricsStore):
+    # key = metric name, value = the corresponding column of a ``SampleChunk``
+    SAMPLE_LOG_METRICS = {
+        "latency": "latency_ms",
+        "service_time": "service_time_ms",
+        "schedule_lag": "schedule_lag_ms"
+    }
+
     def __init__(self, config, clock=time.Clock, meta_info=None, lap=None):
         """
 
@@ -701,12 +829,54 @@ class InMemoryMetricsStore(MetricsStore):
         """
         super().__init__(config=config, clock=clock, meta_info=meta_info, lap=lap)
         self.docs = []
+        # raw samples are read column-wise from the sample logs in a single pass on the first query (see get()).
+        self.sample_logs = []
+        # key = (lap, operation name, operation type, metric name, sample type value), value = an array of the corresponding values
+        self._sample_log_columns = None
 
     def __del__(self):
         """
         Deletes the metrics store instance.
         """
         del self.docs
+        del self.sample_logs
+
+    def add_sample_log(self, sample_log, chunk_size=100000):
+        self.sample_logs.append((self._lap, sample_log, chunk_size))
+        self._sample_log_columns = None
+
+    def _read_sample_log_columns(self):
+        """
+        Reads all sample logs in chunks and groups the values of all metrics in ``SAMPLE_LOG_METRICS``. The result is cached so a report
+        that issues many queries reads each sample log only once.
+        """
+        if self._sample_log_columns is None:
+            columns = collections.defaultdict(lambda: array.array("d"))
+            for sample_log_lap, sample_log, chunk_size in self.sample_logs:
+                for chunks in sample_log.chunks(chunk_size, include_meta_data=False):
+                    for chunk in chunks:
+                        for t in set(chunk.sample_type):
+                            for name, attribute in InMemoryMetricsStore.SAMPLE_LOG_METRICS.items():
+                                column = getattr(chunk, attribute)
+                                # the schedule lag of requests that have not been throttled is NaN
+                                columns[(sample_log_lap, chunk.operation_name, chunk.operation_type, name, t)].extend(
+                                    v for v, sample_type in zip(column, chunk.sample_type) if sample_type == t and not math.isnan(v))
+            self._sample_log_columns = dict(columns)
+        return self._sample_log_columns
+
+    def _sample_log_values(self, name, operation, operation_type, sample_type, lap):
+        values = []
+        if name not in InMemoryMetricsStore.SAMPLE_LOG_METRICS or not self.sample_logs:
+            return values
+        for (column_lap, column_operation, column_operation_type, column_name, column_sample_type), column in \
+                self._read_sample_log_columns().items():
+            if column_name == name and \
+                    (lap is None or column_lap == lap) and \
+                    (operation is None or column_operation == operation) and \
+                    (operation_type is None or column_operation_type == operation_type.name) and \
+                    (sample_type is None or column_sample_type == sample_type.value):
+                values.extend(column)
+        return values
 
     def _add(self, doc):
         self.docs.append(doc)
@@ -715,7 +885,7 @@ class InMemoryMetricsStore(MetricsStore):
         pass
 
     def to_externalizable(self):
-        compressed = zlib.compress(pickle.dumps(self.docs))
+        compressed = zlib.compress(pickle.dumps((self.docs, self._histograms)))
         logger.info("Compression changed size of metric store from [%d] bytes to [%d] bytes" %
                     (sys.getsizeof(self.docs), sys.getsizeof(compressed)))
         return compressed
@@ -724,8 +894,7 @@ class InMemoryMetricsStore(MetricsStore):
         if docs == self.docs:
             return
         else:
-            for doc in pickle.loads(zlib.decompress(docs)):
-                self._add(doc)
+            super().bulk_add(docs)
 
     def get_percentiles(self, name, operation=None, operation_type=None, sample_type=None, lap=None, percentiles=None):
         if percentiles is None:
@@ -774,6 +943,18 @@ class InMemoryMetricsStore(MetricsStore):
         else:
             return None
 
+    def get_unit(self, name, operation=None, operation_type=None):
+        unit = super().get_unit(name, operation, operation_type)
+        if unit is None and name in InMemoryMetricsStore.SAMPLE_LOG_METRICS and self.sample_logs:
+            # all raw samples in sample logs are stored in milliseconds
+            return "ms"
+        return unit
+
+    def get(self, name, operation=None, operation_type=None, sample_type=None, lap=None):
+        values = super().get(name, operation, operation_type, sample_type, lap)
+        values.extend(self._sample_log_values(name, operation, operation_type, sample_type, lap))
+        return values
+
     def _get(self, name, operation, operation_type, sample_type, lap, mapper):
         return [mapper(doc)
                 for doc in self.docs
@@ -56,6 +56,7 @@ class Benchmark:
         self.cluster = None
         self.actor_system = None
         self.track = None
+        self.sample_logs = []
 
     def setup(self):
         self.mechanic.prepare_candidate()
@@ -76,6 +77,10 @@ class Benchmark:
             self.cluster.on_benchmark_stop()
             logger.info("Bulk adding data to metrics store.")
             self.metrics_store.bulk_add(result.metrics)
+            if result.sample_log is not None:
+                logger.info("Adding raw samples to metrics store.")
+                self.sample_logs.append(result.sample_log)
+                self.metrics_store.add_sample_log(result.sample_log)
             logger.info("Flushing metrics data...")
             self.metrics_store.flush()
             logger.info("Flushing done")
@@ -106,6 +111,8 @@ class Benchmark:
         console.println("")
         console.info("Archiving logs in %s" % archive_path)
         shutil.rmtree(log_root)
+        for sample_log in self.sample_logs:
+            sample_log.delete()
 
 
 class LapCounter:
@@ -186,6 +193,13 @@ def benchmark_only(cfg):
     return race(Benchmark(cfg, mechanic.create(cfg, metrics_store, external=True), metrics_store), cfg)
 
 
+def benchmark_mock(cfg):
+    # there is no real benchmark candidate, so we use the same special car name as for external benchmarks.
+    cfg.add(config.Scope.benchmark, "benchmarks", "car", "external")
+    metrics_store = metrics.metrics_store(cfg, read_only=False)
+    return race(Benchmark(cfg, mechanic.create(cfg, metrics_store, mock=True), metrics_store), cfg)
+
+
 def docker(cfg):
     metrics_store = metrics.metrics_store(cfg, read_only=False)
     return race(Benchmark(cfg, mechanic.create(cfg, metrics_store, docker=True), metrics_store), cfg)
@@ -203,6 +217,9 @@ Pipeline("from-distribution",
 Pipeline("benchmark-only",
          "Assumes an already running Elasticsearch instance, runs a benchmark and reports results", benchmark_only)
 
+Pipeline("benchmark-mock",
+         "Starts a local mock Elasticsearch, runs a benchmark against it and reports results (to try out tracks)", benchmark_mock)
+
 # Very experimental Docker pipeline. Should only be used with great care and is also not supported on all platforms.
 Pipeline("docker",
          "Runs a benchmark against the official Elasticsearch Docker container and reports results", docker, stable=False)
@@ -182,6 +182,12 @@ def parse_args():
             raise argparse.ArgumentTypeError("must be positive but was %s" % value)
         return value
 
+    def non_negative_number(v):
+        value = float(v)
+        if value < 0:
+            raise argparse.ArgumentTypeError("must not be negative but was %s" % value)
+        return value
+
     # try to preload configurable defaults, but this does not work together with `--configuration-name` (which is undocumented anyway)
     cfg = config.Config()
     if cfg.config_present():
@@ -293,6 +299,17 @@ def parse_args():
             help="define a comma-separated list of host:port pairs which should be targeted iff using the pipeline 'benchmark-only' "
                  "(default: localhost:9200).",
             default="localhost:9200")
+        p.add_argument(
+            "--mock-latency",
+            help="define the latency distribution of the mock Elasticsearch iff using the pipeline 'benchmark-mock', e.g. "
+                 "'exponential:5' (default: no latency).",
+            default=None)
+        p.add_argument(
+            "--mock-error-rate",
+            type=non_negative_number,
+            help="define the probability that a request to the mock Elasticsearch fails iff using the pipeline 'benchmark-mock' "
+                 "(default: 0).",
+            default=0)
         p.add_argument(
             "--client-options",
             help="define a comma-separated list of client options to use. The options will be passed to the Elasticsearch Python client "
@@ -322,6 +339,38 @@ def parse_args():
             type=positive_number,
             help="number of laps that the benchmark should run (default: 1).",
             default=1)
+        p.add_argument(
+            "--driver-engine",
+            help="define how clients are run: 'actor' runs each client in a dedicated process, 'asyncio' packs all clients onto a few "
+                 "worker processes (default: actor).",
+            choices=["actor", "asyncio"],
+            default="actor")
+        p.add_argument(
+            "--driver-workers",
+            type=positive_number,
+            help="number of worker processes that are used by the 'asyncio' driver engine (default: number of CPU cores).",
+            default=None)
+        p.add_argument(
+            "--load-driver-hosts",
+            help="define a comma-separated list of hosts which should generate load (default: localhost). Each remote host needs to run "
+                 "esrallyd and may be followed by the admin port of its actor system, e.g. 192.168.14.3:1900.",
+            default="localhost")
+        p.add_argument(
+            "--task-pause",
+            type=non_negative_number,
+            help="number of seconds to wait after all clients have finished a task before the next task starts (default: 5).",
+            default=5)
+        p.add_argument(
+            "--aggregate-samples",
+            help="aggregate samples per operation and second on the load generators instead of sending each individual sample to the "
+                 "coordinator (default: false).",
+            default=False,
+            action="store_true")
+        p.add_argument(
+            "--params-prefetch",
+            type=non_negative_number,
+            help="number of request parameters that each client prepares ahead of time on a background thread (default: 0).",
+            default=0)
         # undocumented for the time being...
         p.add_argument(
             "--test-mode",
@@ -532,7 +581,8 @@ def convert_hosts(configured_host_list):
 
 def bootstrap_actor_system(cfg, system_base="multiprocTCPBase"):
     try:
-        return thespian.actors.ActorSystem(system_base, logDefs=configure_actor_logging(cfg))
+        # remote load driver hosts (see esrallyd) join the actor system of the coordinator
+        return thespian.actors.ActorSystem(system_base, capabilities={"coordinator": True}, logDefs=configure_actor_logging(cfg))
     except thespian.actors.ActorSystemException:
         logger.exception("Could not initialize internal actor system. Terminating.")
         console.error("Could not initialize successfully.\n")
@@ -578,10 +628,18 @@ def main():
     cfg.add(config.Scope.applicationOverride, "benchmarks", "cluster.health", args.cluster_health)
     cfg.add(config.Scope.applicationOverride, "benchmarks", "laps", args.laps)
     cfg.add(config.Scope.applicationOverride, "benchmarks", "test.mode", args.test_mode)
+    cfg.add(config.Scope.applicationOverride, "driver", "engine", args.driver_engine)
+    cfg.add(config.Scope.applicationOverride, "driver", "workers", args.driver_workers)
+    cfg.add(config.Scope.applicationOverride, "driver", "aggregate.samples", args.aggregate_samples)
+    cfg.add(config.Scope.applicationOverride, "driver", "task.pause", args.task_pause)
+    cfg.add(config.Scope.applicationOverride, "driver", "params.prefetch", int(args.params_prefetch))
+    cfg.add(config.Scope.applicationOverride, "driver", "load.driver.hosts", csv_to_list(args.load_driver_hosts))
     cfg.add(config.Scope.applicationOverride, "provisioning", "datapaths", csv_to_list(args.data_paths))
     cfg.add(config.Scope.applicationOverride, "provisioning", "install.preserve", convert.to_bool(args.preserve_install))
     cfg.add(config.Scope.applicationOverride, "launcher", "external.target.hosts", convert_hosts(csv_to_list(args.target_hosts)))
     cfg.add(config.Scope.applicationOverride, "launcher", "client.options", kv_to_map(csv_to_list(args.client_options)))
+    cfg.add(config.Scope.applicationOverride, "mock", "latency", args.mock_latency)
+    cfg.add(config.Scope.applicationOverride, "mock", "error.rate", args.mock_error_rate)
     cfg.add(config.Scope.applicationOverride, "report", "reportformat", args.report_format)
     cfg.add(config.Scope.applicationOverride, "report", "reportfile", args.report_file)
     if args.override_src_dir is not None:
@@ -0,0 +1,80 @@
+import argparse
+import sys
+
+import thespian.actors
+from esrally import rally
+from esrally.utils import console
+
+DEFAULT_PORT = 1900
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="esrallyd",
+                                     description="Starts or stops a Rally load driver host. A load driver host joins the actor system of "
+                                                 "the Rally coordinator and runs load generators on its behalf "
+                                                 "(see --load-driver-hosts).")
+    parser.add_argument("--version", action="version", version="%(prog)s " + rally.version())
+
+    subparsers = parser.add_subparsers(title="subcommands", dest="subcommand")
+    start_command = subparsers.add_parser("start", help="Starts a load driver host")
+    start_command.add_argument(
+        "--node-ip",
+        required=True,
+        help="the IP address of this machine as specified in --load-driver-hosts on the coordinator.")
+    start_command.add_argument(
+        "--node-port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="the admin port of the actor system on this machine (default: %d). Use different ports to run multiple load driver hosts on "
+             "one machine." % DEFAULT_PORT)
+    start_command.add_argument(
+        "--coordinator-ip",
+        required=True,
+        help="the IP address of the machine that runs the Rally coordinator.")
+    start_command.add_argument(
+        "--coordinator-port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="the admin port of the actor system of the Rally coordinator (default: %d)." % DEFAULT_PORT)
+
+    stop_command = subparsers.add_parser("stop", help="Stops a load driver host")
+    stop_command.add_argument(
+        "--node-port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="the admin port of the actor system on this machine (default: %d)." % DEFAULT_PORT)
+    return parser.parse_args()
+
+
+def start(args):
+    capabilities = {
+        "coordinator": False,
+        "ip": args.node_ip,
+        "Admin Port": args.node_port,
+        "Convention Address.IPv4": "%s:%d" % (args.coordinator_ip, args.coordinator_port)
+    }
+    # the actor system keeps running in the background after this process has terminated
+    thespian.actors.ActorSystem("multiprocTCPBase", capabilities=capabilities)
+    console.info("Started load driver host [%s:%d] (coordinator at [%s:%d])." %
+                 (args.node_ip, args.node_port, args.coordinator_ip, args.coordinator_port))
+
+
+def stop(args):
+    thespian.actors.ActorSystem("multiprocTCPBase", capabilities={"Admin Port": args.node_port}).shutdown()
+    console.info("Stopped load driver host on port [%d]." % args.node_port)
+
+
+def main():
+    console.init()
+    args = parse_args()
+    if args.subcommand == "start":
+        start(args)
+    elif args.subcommand == "stop":
+        stop(args)
+    else:
+        console.error("Please specify a subcommand (start or stop).")
+        sys.exit(64)
+
+
+if __name__ == "__main__":
+    main()
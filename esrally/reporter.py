@@ -46,6 +46,14 @@ class Stats:
                 self.op_metrics[op]["throughput"] = self.summary_stats("throughput", op)
                 self.op_metrics[op]["latency"] = self.single_latency(op)
                 self.op_metrics[op]["service_time"] = self.single_latency(op, metric_name="service_time")
+                # only available for throttled operations
+                self.op_metrics[op]["schedule_lag"] = self.single_latency(op, metric_name="schedule_lag")
+                # only available if request bodies are compressed ahead of time
+                self.op_metrics[op]["compression_time"] = self.single_latency(op, metric_name="compression_time")
+                self.op_metrics[op]["compression_ratio"] = self.single_latency(op, metric_name="compression_ratio")
+                # only available if request bodies are serialized ahead of time
+                self.op_metrics[op]["serialized_size"] = self.single_latency(op, metric_name="serialized_size")
+                self.op_metrics[op]["serialization_throughput"] = self.single_latency(op, metric_name="serialization_throughput")
 
         self.total_time = self.sum("indexing_total_time")
         self.merge_time = self.sum("merges_total_time")
@@ -123,6 +131,10 @@ class Stats:
 
     def single_latency(self, operation, metric_name="latency"):
         sample_type = metrics.SampleType.Normal
+        # prefer histograms which have been recorded by the load generators as we can determine percentiles in O(buckets) from them
+        h = self.store.get_histogram(metric_name, operation=operation, sample_type=sample_type, lap=self.lap)
+        if h and h.total_count > 0:
+            return h.percentiles(self.percentiles_for_sample_size(h.total_count))
         sample_size = self.store.get_count(metric_name, operation=operation, sample_type=sample_type, lap=self.lap)
         if sample_size > 0:
             return self.store.get_percentiles(metric_name,
@@ -213,6 +225,9 @@ class SummaryReporter:
                         metrics_table += self.report_throughput(stats, task.operation)
                         metrics_table += self.report_latency(stats, task.operation)
                         metrics_table += self.report_service_time(stats, task.operation)
+                        metrics_table += self.report_schedule_lag(stats, task.operation)
+                        metrics_table += self.report_compression(stats, task.operation)
+                        metrics_table += self.report_serialization(stats, task.operation)
 
                 meta_info_table += self.report_meta_info()
 
@@ -287,6 +302,33 @@ class SummaryReporter:
             lines.append([self.lap, "%sth percentile service time" % percentile, operation.name, value, "ms"])
         return lines
 
+    def report_schedule_lag(self, stats, operation):
+        lines = []
+        schedule_lag = stats.op_metrics[operation.name]["schedule_lag"]
+        for percentile, value in schedule_lag.items():
+            lines.append([self.lap, "%sth percentile schedule lag" % percentile, operation.name, value, "ms"])
+        return lines
+
+    def report_compression(self, stats, operation):
+        lines = []
+        compression_time = stats.op_metrics[operation.name]["compression_time"]
+        for percentile, value in compression_time.items():
+            lines.append([self.lap, "%sth percentile compression CPU time" % percentile, operation.name, value, "ms"])
+        compression_ratio = stats.op_metrics[operation.name]["compression_ratio"]
+        for percentile, value in compression_ratio.items():
+            lines.append([self.lap, "%sth percentile compression ratio" % percentile, operation.name, value, ""])
+        return lines
+
+    def report_serialization(self, stats, operation):
+        lines = []
+        serialized_size = stats.op_metrics[operation.name]["serialized_size"]
+        for percentile, value in serialized_size.items():
+            lines.append([self.lap, "%sth percentile serialized body size" % percentile, operation.name, value, "kB"])
+        serialization_throughput = stats.op_metrics[operation.name]["serialization_throughput"]
+        for percentile, value in serialization_throughput.items():
+            lines.append([self.lap, "%sth percentile serialization throughput" % percentile, operation.name, value, "MB/s"])
+        return lines
+
     def report_total_times(self, stats):
         total_times = []
         unit = "min"
@@ -415,6 +457,9 @@ class ComparisonReporter:
                     metrics_table += self.report_throughput(baseline_stats, contender_stats, t1.operation)
                     metrics_table += self.report_latency(baseline_stats, contender_stats, t1.operation)
                     metrics_table += self.report_service_time(baseline_stats, contender_stats, t1.operation)
+                    metrics_table += self.report_schedule_lag(baseline_stats, contender_stats, t1.operation)
+                    metrics_table += self.report_compression(baseline_stats, contender_stats, t1.operation)
+                    metrics_table += self.report_serialization(baseline_stats, contender_stats, t1.operation)
 
         print_internal(tabulate.tabulate(metrics_table,
                                          headers=["Metric", "Operation", "Baseline", "Contender", "Diff", "Unit"],
@@ -455,6 +500,49 @@ class ComparisonReporter:
                                        operation, "ms", treat_increase_as_improvement=False))
         return lines
 
+    def report_schedule_lag(self, baseline_stats, contender_stats, operation):
+        lines = []
+
+        baseline_schedule_lag = baseline_stats.op_metrics[operation.name]["schedule_lag"]
+        contender_schedule_lag = contender_stats.op_metrics[operation.name]["schedule_lag"]
+
+        for percentile, baseline_value in baseline_schedule_lag.items():
+            if percentile in contender_schedule_lag:
+                contender_value = contender_schedule_lag[percentile]
+                lines.append(self.line("%sth percentile schedule lag" % percentile, baseline_value, contender_value,
+                                       operation, "ms", treat_increase_as_improvement=False))
+        return lines
+
+    def report_compression(self, baseline_stats, contender_stats, operation):
+        lines = []
+
+        for metric_name, label, unit in [("compression_time", "compression CPU time", "ms"),
+                                         ("compression_ratio", "compression ratio", "")]:
+            baseline_values = baseline_stats.op_metrics[operation.name][metric_name]
+            contender_values = contender_stats.op_metrics[operation.name][metric_name]
+
+            for percentile, baseline_value in baseline_values.items():
+                if percentile in contender_values:
+                    contender_value = contender_values[percentile]
+                    lines.append(self.line("%sth percentile %s" % (percentile, label), baseline_value, contender_value,
+                                           operation, unit, treat_increase_as_improvement=False))
+        return lines
+
+    def report_serialization(self, baseline_stats, contender_stats, operation):
+        lines = []
+
+        for metric_name, label, unit, increase_is_improvement in [("serialized_size", "serialized body size", "kB", False),
+                                                                  ("serialization_throughput", "serialization throughput", "MB/s", True)]:
+            baseline_values = baseline_stats.op_metrics[operation.name][metric_name]
+            contender_values = contender_stats.op_metrics[operation.name][metric_name]
+
+            for percentile, baseline_value in baseline_values.items():
+                if percentile in contender_values:
+                    contender_value = contender_values[percentile]
+                    lines.append(self.line("%sth percentile %s" % (percentile, label), baseline_value, contender_value,
+                                           operation, unit, treat_increase_as_improvement=increase_is_improvement))
+        return lines
+
     def report_merge_part_times(self, baseline_stats, contender_stats):
         lines = []
         if baseline_stats.has_merge_part_stats() and contender_stats.has_merge_part_stats():
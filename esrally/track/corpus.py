@@ -0,0 +1,332 @@
+import bisect
+import hashlib
+import json
+import logging
+import mmap
+import os
+import time
+
+from esrally.utils import io, console
+
+logger = logging.getLogger("rally.track")
+
+METADATA_VERSION = 1
+# the fingerprint is calculated from this many evenly spaced blocks of the data file (including the first and the last block)
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+# document sizes are determined for at most this many lines (the lines at evenly spaced entries of the offset index)
+DOCUMENT_SIZE_SAMPLES = 1000
+DOCUMENT_SIZE_PERCENTILES = [50, 90, 99, 100]
+CHECKPOINTS_VERSION = 1
+# minimum distance in decompressed bytes between two checkpoints of an archive
+DEFAULT_CHECKPOINT_GRANULARITY = 64 * 1024 * 1024
+
+
+def metadata_path(data_file_path):
+    return "%s.meta" % data_file_path
+
+
+def fingerprint(data_file_path, blocks=FINGERPRINT_BLOCKS, block_size=FINGERPRINT_BLOCK_SIZE):
+    """
+    Calculates a fingerprint of a data file based on its size and a sample of its contents. It is cheap to calculate even for very large
+    files but, unlike file modification times, it does not change when the file is copied, moved or touched.
+
+    :param data_file_path: The path to the data file.
+    :return: The fingerprint as a hex string.
+    """
+    size = os.path.getsize(data_file_path)
+    h = hashlib.sha1()
+    h.update(str(size).encode("utf-8"))
+    with open(data_file_path, mode="rb") as f:
+        if size <= blocks * block_size:
+            h.update(f.read())
+        else:
+            step = (size - block_size) // (blocks - 1)
+            for i in range(blocks):
+                f.seek(i * step)
+                h.update(f.read(block_size))
+    return h.hexdigest()
+
+
+class CorpusMetadata:
+    """
+    Metadata about a data file (corpus) that are expensive to determine. They are stored in a sidecar file next to the data file.
+    """
+
+    def __init__(self, size, fingerprint, number_of_lines, average_document_size, document_size_percentiles, offset_index_version,
+                 offset_index_granularity, version=METADATA_VERSION):
+        """
+        :param size: The size of the data file in bytes.
+        :param fingerprint: The fingerprint of the data file (see ``fingerprint()``).
+        :param number_of_lines: The number of lines in the data file.
+        :param average_document_size: The average size of a line in bytes (without the line ending).
+        :param document_size_percentiles: A dict of percentile to size in bytes based on a sample of lines.
+        :param offset_index_version: The format version of the corresponding offset index.
+        :param offset_index_granularity: The granularity of the corresponding offset index.
+        :param version: The version of the metadata format.
+        """
+        self.size = size
+        self.fingerprint = fingerprint
+        self.number_of_lines = number_of_lines
+        self.average_document_size = average_document_size
+        self.document_size_percentiles = document_size_percentiles
+        self.offset_index_version = offset_index_version
+        self.offset_index_granularity = offset_index_granularity
+        self.version = version
+
+    def as_dict(self):
+        return {
+            "version": self.version,
+            "size": self.size,
+            "fingerprint": self.fingerprint,
+            "lines": self.number_of_lines,
+            "average-document-size": self.average_document_size,
+            "document-size-percentiles": {str(k): v for k, v in self.document_size_percentiles.items()},
+            "offset-index-version": self.offset_index_version,
+            "offset-index-granularity": self.offset_index_granularity
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(size=d["size"], fingerprint=d["fingerprint"], number_of_lines=d["lines"],
+                   average_document_size=d["average-document-size"],
+                   document_size_percentiles={_percentile(k): v for k, v in d["document-size-percentiles"].items()},
+                   offset_index_version=d["offset-index-version"], offset_index_granularity=d["offset-index-granularity"],
+                   version=d["version"])
+
+    def describes(self, data_file_path, granularity):
+        """
+        :return: ``True`` iff these metadata (still) describe the given data file and its offset index with the given granularity.
+        """
+        return self.version == METADATA_VERSION and \
+            self.offset_index_version == io.OFFSET_INDEX_VERSION and \
+            self.offset_index_granularity == granularity and \
+            os.path.getsize(data_file_path) == self.size and \
+            fingerprint(data_file_path) == self.fingerprint
+
+
+def load(data_file_path):
+    """
+    :return: The stored ``CorpusMetadata`` of the given data file or ``None`` if there are none (or they cannot be read).
+    """
+    path = metadata_path(data_file_path)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, mode="rt", encoding="utf-8") as f:
+            return CorpusMetadata.from_dict(json.load(f))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        logger.exception("Ignoring corpus metadata in [%s] as they cannot be read." % path)
+        return None
+
+
+def store(data_file_path, metadata):
+    with open(metadata_path(data_file_path), mode="wt", encoding="utf-8") as f:
+        json.dump(metadata.as_dict(), f, indent=2, sort_keys=True)
+
+
+def document_sizes(data_file_path, entries, samples=DOCUMENT_SIZE_SAMPLES):
+    """
+    :param data_file_path: The path to the data file.
+    :param entries: The entries of the offset index of this data file.
+    :return: A list of the sizes in bytes of the lines at (at most ``samples``) evenly spaced entries.
+    """
+    if not entries or os.path.getsize(data_file_path) == 0:
+        return []
+    step = max(1, len(entries) // samples)
+    sizes = []
+    with open(data_file_path, mode="rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for _, offset in entries[::step][:samples]:
+            end = mm.find(b"\n", offset)
+            sizes.append((end if end >= 0 else len(mm)) - offset)
+    return sizes
+
+
+def percentiles(values, ps):
+    """
+    :return: A dict of nearest-rank percentiles of the given values.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {p: ordered[max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))] for p in ps}
+
+
+def prepare(data_file_path, granularity=io.DEFAULT_OFFSET_INDEX_GRANULARITY, processes=None):
+    """
+    Ensures that the offset index and the metadata of a data file are up to date. Both are only (re)built if the stored metadata do not
+    match the data file's size and fingerprint. Hence, a data file that has been moved or touched is not indexed again.
+
+    :param data_file_path: The path to the data file.
+    :param granularity: The granularity of the offset index.
+    :param processes: The maximum number of worker processes to create the offset index. Optional. Defaults to the number of CPUs.
+    :return: The ``CorpusMetadata`` of the data file.
+    """
+    metadata = load(data_file_path)
+    if metadata is not None and metadata.describes(data_file_path, granularity) and \
+            offset_index_matches(data_file_path, granularity, metadata.number_of_lines):
+        logger.info("Reusing offset index and metadata of [%s] as its fingerprint is unchanged." % data_file_path)
+        return metadata
+
+    console.info("Preparing file offset table for [%s] ... " % data_file_path, end="", flush=True, logger=logger)
+    start = time.perf_counter()
+    size = os.path.getsize(data_file_path)
+    entries, number_of_lines = io.offset_index_entries(data_file_path, granularity, processes)
+    io.write_offset_index(io.offset_index_path(data_file_path), entries, number_of_lines, granularity)
+    # all bytes that are not a line ending belong to a document
+    newlines = number_of_lines if size > 0 and _ends_with_newline(data_file_path) else max(0, number_of_lines - 1)
+    metadata = CorpusMetadata(size=size,
+                              fingerprint=fingerprint(data_file_path),
+                              number_of_lines=number_of_lines,
+                              average_document_size=(size - newlines) / number_of_lines if number_of_lines > 0 else 0,
+                              document_size_percentiles=percentiles(document_sizes(data_file_path, entries), DOCUMENT_SIZE_PERCENTILES),
+                              offset_index_version=io.OFFSET_INDEX_VERSION,
+                              offset_index_granularity=granularity)
+    store(data_file_path, metadata)
+    console.println("[OK]")
+    duration = time.perf_counter() - start
+    size_in_mb = size / 1024 / 1024
+    logger.info("Indexed [%d] lines of [%s] ([%.2f] MB) in [%.3f] s ([%.2f] MB/s)." %
+                (number_of_lines, data_file_path, size_in_mb, duration, size_in_mb / duration if duration > 0 else 0))
+    return metadata
+
+
+def checkpoints_path(archive_path):
+    return "%s.checkpoints" % archive_path
+
+
+class ArchiveCheckpoints:
+    """
+    Positions in a .bz2 or .gz archive at which decompression can start (see ``io.archive_checkpoints()``) together with metadata about
+    the archive's contents. They are stored in a sidecar file next to the archive.
+    """
+
+    def __init__(self, size, fingerprint, number_of_lines, uncompressed_size, granularity, checkpoints, version=CHECKPOINTS_VERSION):
+        """
+        :param size: The size of the archive in bytes.
+        :param fingerprint: The fingerprint of the archive (see ``fingerprint()``).
+        :param number_of_lines: The number of lines in the decompressed archive.
+        :param uncompressed_size: The size of the decompressed archive in bytes.
+        :param granularity: The minimum distance in decompressed bytes between two checkpoints.
+        :param checkpoints: A list of tuples (offset in the archive, number of the first line, whether it starts in the middle of a line)
+        sorted by offset.
+        :param version: The version of the checkpoint format.
+        """
+        self.size = size
+        self.fingerprint = fingerprint
+        self.number_of_lines = number_of_lines
+        self.uncompressed_size = uncompressed_size
+        self.granularity = granularity
+        self.checkpoints = checkpoints
+        self.version = version
+
+    @property
+    def average_document_size(self):
+        newlines = min(self.number_of_lines, self.uncompressed_size)
+        return (self.uncompressed_size - newlines) / self.number_of_lines if self.number_of_lines > 0 else 0
+
+    @property
+    def single_stream(self):
+        """
+        :return: ``True`` iff the archive consists of a single compressed stream although it is larger than the granularity. Then there
+        is no checkpoint other than the beginning of the archive and each client needs to decompress all data before its slice.
+        """
+        return len(self.checkpoints) == 1 and self.uncompressed_size > self.granularity
+
+    def lookup(self, line):
+        """
+        :param line: A line number.
+        :return: The last checkpoint that starts at or before the given line.
+        """
+        i = bisect.bisect_right([first_line for _, first_line, _ in self.checkpoints], line)
+        return self.checkpoints[i - 1] if i > 0 else (0, 0, False)
+
+    def as_dict(self):
+        return {
+            "version": self.version,
+            "size": self.size,
+            "fingerprint": self.fingerprint,
+            "lines": self.number_of_lines,
+            "uncompressed-size": self.uncompressed_size,
+            "granularity": self.granularity,
+            "checkpoints": [list(c) for c in self.checkpoints]
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(size=d["size"], fingerprint=d["fingerprint"], number_of_lines=d["lines"], uncompressed_size=d["uncompressed-size"],
+                   granularity=d["granularity"], checkpoints=[tuple(c) for c in d["checkpoints"]], version=d["version"])
+
+    def describes(self, archive_path, granularity):
+        """
+        :return: ``True`` iff these checkpoints (still) belong to the given archive and have been determined with the given granularity.
+        """
+        return self.version == CHECKPOINTS_VERSION and \
+            self.granularity == granularity and \
+            os.path.getsize(archive_path) == self.size and \
+            fingerprint(archive_path) == self.fingerprint
+
+
+def load_checkpoints(archive_path):
+    """
+    :return: The stored ``ArchiveCheckpoints`` of the given archive or ``None`` if there are none (or they cannot be read).
+    """
+    path = checkpoints_path(archive_path)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, mode="rt", encoding="utf-8") as f:
+            return ArchiveCheckpoints.from_dict(json.load(f))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        logger.exception("Ignoring archive checkpoints in [%s] as they cannot be read." % path)
+        return None
+
+
+def prepare_archive(archive_path, granularity=DEFAULT_CHECKPOINT_GRANULARITY):
+    """
+    Ensures that the checkpoints of an archive are up to date so its documents can be streamed without decompressing it to disk. Like
+    ``prepare()``, the archive is only scanned again if its size or fingerprint have changed.
+
+    :param archive_path: The path to a .bz2 or .gz archive.
+    :param granularity: The minimum distance in decompressed bytes between two checkpoints.
+    :return: The ``ArchiveCheckpoints`` of the archive.
+    """
+    checkpoints = load_checkpoints(archive_path)
+    if checkpoints is not None and checkpoints.describes(archive_path, granularity):
+        logger.info("Reusing checkpoints of [%s] as its fingerprint is unchanged." % archive_path)
+        return checkpoints
+
+    console.info("Preparing checkpoints for streaming [%s] ... " % archive_path, end="", flush=True, logger=logger)
+    start = time.perf_counter()
+    entries, number_of_lines, uncompressed_size = io.archive_checkpoints(archive_path, granularity)
+    checkpoints = ArchiveCheckpoints(size=os.path.getsize(archive_path),
+                                     fingerprint=fingerprint(archive_path),
+                                     number_of_lines=number_of_lines,
+                                     uncompressed_size=uncompressed_size,
+                                     granularity=granularity,
+                                     checkpoints=entries)
+    with open(checkpoints_path(archive_path), mode="wt", encoding="utf-8") as f:
+        json.dump(checkpoints.as_dict(), f, indent=2, sort_keys=True)
+    console.println("[OK]")
+    logger.info("Found [%d] checkpoints and [%d] lines in [%s] in [%.3f] s." %
+                (len(entries), number_of_lines, archive_path, time.perf_counter() - start))
+    return checkpoints
+
+
+def offset_index_matches(data_file_path, granularity, number_of_lines):
+    index = io.OffsetIndex(io.offset_index_path(data_file_path)).open()
+    if index is None:
+        return False
+    with index:
+        return index.granularity == granularity and index.number_of_lines == number_of_lines
+
+
+def _percentile(key):
+    p = float(key)
+    return int(p) if p.is_integer() else p
+
+
+def _ends_with_newline(data_file_path):
+    with open(data_file_path, mode="rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
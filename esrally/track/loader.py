@@ -11,7 +11,7 @@ import jinja2.exceptions
 import jsonschema
 import tabulate
 from esrally import exceptions, time, PROGRAM_NAME
-from esrally.track import params, track
+from esrally.track import corpus, params, track
 from esrally.utils import io, convert, net, git, versions, console
 
 logger = logging.getLogger("rally.track")
@@ -174,14 +174,81 @@ def prepare_track(track, cfg):
                                            (basename, extracted_bytes, expected_size_in_bytes))
         return basename, decompressed
 
+    offset_index_granularity = int(cfg.opts("benchmarks", "offset.index.granularity", mandatory=False,
+                                            default_value=io.DEFAULT_OFFSET_INDEX_GRANULARITY))
+    checkpoint_granularity = int(cfg.opts("benchmarks", "archive.checkpoint.granularity", mandatory=False,
+                                          default_value=corpus.DEFAULT_CHECKPOINT_GRANULARITY))
+    stream = streams_from_archive(track)
+    lines_per_document = source_lines_per_document(track)
     for index in track.indices:
         for type in index.types:
             if type.document_archive:
                 data_url = "%s/%s" % (track.source_root_url, os.path.basename(type.document_archive))
                 download(cfg, data_url, type.document_archive, type.compressed_size_in_bytes)
-                decompressed_file_path, was_decompressed = decompress(type.document_archive, type.uncompressed_size_in_bytes)
-                # just rebuild the file every time for the time being. Later on, we might check the data file fingerprint to avoid it
-                io.prepare_file_offset_table(decompressed_file_path)
+                if stream and io.is_streamable_archive(type.document_archive):
+                    # documents are read directly from the archive so we don't need to decompress it
+                    data_path = type.document_archive
+                    metadata = corpus.prepare_archive(data_path, checkpoint_granularity)
+                    if metadata.single_stream:
+                        raise exceptions.SystemSetupError("Cannot stream documents from [%s] as it consists of a single compressed stream "
+                                                          "so clients could not start in the middle of it. Compress it as several "
+                                                          "concatenated streams (e.g. with pbzip2) or use a different \"corpus-reader\"."
+                                                          % data_path)
+                else:
+                    data_path, was_decompressed = decompress(type.document_archive, type.uncompressed_size_in_bytes)
+                    metadata = corpus.prepare(data_path, offset_index_granularity)
+                check_document_count(type, data_path, metadata.number_of_lines, lines_per_document)
+                type.average_document_size_in_bytes = metadata.average_document_size
+
+
+def index_operations(t):
+    """
+    :param t: A track.
+    :return: A list of all bulk index operations in all challenges of the track.
+    """
+    return [task.operation for challenge in t.challenges for element in challenge.schedule for task in element
+            if task.operation.type == track.OperationType.Index.name]
+
+
+def streams_from_archive(t):
+    """
+    :param t: A track.
+    :return: ``True`` iff all bulk index operations of the track read their documents directly from archives
+    (``"corpus-reader": "archive"``).
+    """
+    operations = index_operations(t)
+    return len(operations) > 0 and all(op.params.get("corpus-reader") == "archive" for op in operations)
+
+
+def source_lines_per_document(t):
+    """
+    :param t: A track.
+    :return: The number of lines per document in the track's data files. This is 2 if any bulk index operation reads the action and
+    meta-data lines from the data file (``"action-and-meta-data": "sourcefile"``), otherwise 1.
+    """
+    if any(op.params.get("action-and-meta-data") == "sourcefile" for op in index_operations(t)):
+        return 2
+    else:
+        return 1
+
+
+def check_document_count(type, data_path, number_of_lines, lines_per_document=1):
+    """
+    Checks the number of documents of a type against its data file. If the track does not specify a document count, it is set based on
+    the number of lines in the data file.
+
+    :param type: The type whose data file has been prepared.
+    :param data_path: The path to the data file (or archive).
+    :param number_of_lines: The number of lines in the data file as determined by ``corpus.prepare`` or ``corpus.prepare_archive``.
+    :param lines_per_document: The number of lines per document in the data file. Optional. Defaults to 1.
+    """
+    available_documents = number_of_lines // lines_per_document
+    if type.number_of_documents == 0:
+        logger.info("Setting number of documents of [%s] to [%d] based on [%s]." % (type, available_documents, data_path))
+        type.number_of_documents = available_documents
+    elif type.number_of_documents > available_documents:
+        raise exceptions.DataError("[%s] contains only [%d] documents but [%d] documents are expected. Please check the document "
+                                   "count of type [%s]." % (data_path, available_documents, type.number_of_documents, type))
 
 
 class TrackRepository:
@@ -471,6 +538,14 @@ class TrackSpecificationReader:
             tasks.append(self.parse_task(task, ops, challenge_name, default_warmup_iterations, default_iterations))
         return track.Parallel(tasks, clients)
 
+    # properties of a task that are not specific to a scheduler
+    TASK_PROPERTIES = ["operation", "warmup-iterations", "iterations", "warmup-time-period", "time-period", "clients", "target-throughput",
+                       "schedule"]
+
+    def _scheduler_params(self, task_spec):
+        # everything else are options of the scheduler (e.g. "jitter")
+        return {k: v for k, v in task_spec.items() if k not in TrackSpecificationReader.TASK_PROPERTIES}
+
     def parse_task(self, task_spec, ops, challenge_name, default_warmup_iterations=0, default_iterations=1):
         op_name = task_spec["operation"]
         if op_name not in ops:
@@ -483,13 +558,18 @@ class TrackSpecificationReader:
                           warmup_time_period=self._r(task_spec, "warmup-time-period", error_ctx=op_name, mandatory=False),
                           time_period=self._r(task_spec, "time-period", error_ctx=op_name, mandatory=False),
                           clients=self._r(task_spec, "clients", error_ctx=op_name, mandatory=False, default_value=1),
-                          target_throughput=self._r(task_spec, "target-throughput", error_ctx=op_name, mandatory=False))
+                          target_throughput=self._r(task_spec, "target-throughput", error_ctx=op_name, mandatory=False),
+                          schedule=self._r(task_spec, "schedule", error_ctx=op_name, mandatory=False, default_value="deterministic"),
+                          params=self._scheduler_params(task_spec))
         if task.warmup_iterations != default_warmup_iterations and task.time_period is not None:
             self._error("Operation '%s' in challenge '%s' mixes warmup iterations with time periods. Please do not mix time periods and "
                         "iterations." % (op_name, challenge_name))
         elif task.warmup_time_period is not None and task.iterations != default_iterations:
             self._error("Operation '%s' in challenge '%s' mixes warmup time period with iterations. Please do not mix time periods and "
                         "iterations." % (op_name, challenge_name))
+        elif "schedule" in task_spec and task.target_throughput is None:
+            self._error("Operation '%s' in challenge '%s' defines the schedule '%s' but no target throughput. Please define a target "
+                        "throughput." % (op_name, challenge_name, task.schedule))
 
         return task
 
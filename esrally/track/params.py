@@ -1,11 +1,12 @@
 import logging
+import mmap
 import random
 import time
 import types
 from enum import Enum
 
-from esrally import exceptions
-from esrally.track import track
+from esrally import client, exceptions
+from esrally.track import corpus, track
 from esrally.utils import io
 
 logger = logging.getLogger("rally.track")
@@ -127,6 +128,7 @@ class SearchParamSource(ParamSource):
         query_body = params.get("body", None)
         pages = params.get("pages", None)
         items_per_page = params.get("results-per-page", None)
+        filter_response = params.get("filter-response", False)
 
         self.query_params = {
             "index": index_name,
@@ -142,6 +144,8 @@ class SearchParamSource(ParamSource):
             self.query_params["pages"] = pages
         if items_per_page:
             self.query_params["items_per_page"] = items_per_page
+        if filter_response:
+            self.query_params["filter_response"] = filter_response
 
     def params(self):
         return self.query_params
@@ -197,6 +201,18 @@ class BulkIndexParamSource(ParamSource):
                                            (id_conflicts, action_metadata))
 
         self.pipeline = params.get("pipeline", None)
+        self.serialize_body = params.get("serialize-body", False)
+        self.filter_response = params.get("filter-response", False)
+        self.corpus_reader = params.get("corpus-reader", "text")
+        if self.corpus_reader not in CORPUS_READERS:
+            raise exceptions.InvalidSyntax("Unknown 'corpus-reader' setting [%s]" % self.corpus_reader)
+        if self.corpus_reader == "archive":
+            for index in indices:
+                for type in index.types:
+                    if type.document_file and not io.is_streamable_archive(type.document_archive):
+                        raise exceptions.InvalidSyntax("Cannot stream documents of [%s/%s] from archive [%s]. Only %s archives are "
+                                                       "supported." % (index, type, type.document_archive,
+                                                                       ", ".join(io.STREAMABLE_ARCHIVE_EXTENSIONS)))
         try:
             self.bulk_size = int(params["bulk-size"])
             if self.bulk_size <= 0:
@@ -219,7 +235,8 @@ class BulkIndexParamSource(ParamSource):
 
     def partition(self, partition_index, total_partitions):
         return PartitionBulkIndexParamSource(self.indices, partition_index, total_partitions, self.action_metadata,
-                                             self.batch_size, self.bulk_size, self.id_conflicts, self.pipeline)
+                                             self.batch_size, self.bulk_size, self.id_conflicts, self.pipeline, self.serialize_body,
+                                             self.filter_response, self.corpus_reader)
 
     def params(self):
         raise exceptions.RallyError("Do not use a BulkIndexParamSource without partitioning")
@@ -230,7 +247,7 @@ class BulkIndexParamSource(ParamSource):
 
 class PartitionBulkIndexParamSource(ParamSource):
     def __init__(self, indices, partition_index, total_partitions, action_metadata, batch_size, bulk_size, id_conflicts=None,
-                 pipeline=None):
+                 pipeline=None, serialize_body=False, filter_response=False, corpus_reader="text"):
         """
 
         :param indices: Specification of affected indices.
@@ -241,6 +258,9 @@ class PartitionBulkIndexParamSource(ParamSource):
         :param bulk_size: The size of bulk index operations (number of documents per bulk).
         :param id_conflicts: The type of id conflicts.
         :param pipeline: The name of the ingest pipeline to run.
+        :param serialize_body: Whether to provide each bulk body as ``bytes`` that are ready to be sent.
+        :param filter_response: Whether Elasticsearch should only return the parts of bulk responses that are needed to count errors.
+        :param corpus_reader: The name of the reader for the data files (see ``CORPUS_READERS``).
         """
         super().__init__(indices, {})
         self.partition_index = partition_index
@@ -249,9 +269,13 @@ class PartitionBulkIndexParamSource(ParamSource):
         self.bulk_size = bulk_size
         self.id_conflicts = id_conflicts
         self.pipeline = pipeline
+        self.serialize_body = serialize_body
+        self.filter_response = filter_response
+        self.corpus_reader = corpus_reader
         self.action_metadata = action_metadata
         self.internal_params = bulk_data_based(total_partitions, partition_index, indices, action_metadata, batch_size,
-                                               bulk_size, id_conflicts, pipeline)
+                                               bulk_size, id_conflicts, pipeline, serialize_body=serialize_body,
+                                               filter_response=filter_response, create_reader=CORPUS_READERS[corpus_reader])
 
     def partition(self, partition_index, total_partitions):
         raise exceptions.RallyError("Cannot partition a PartitionBulkIndexParamSource further")
@@ -305,8 +329,27 @@ def chain(*iterables):
                 yield element
 
 
+# bounds for the read buffer of data files that are read line by line
+MIN_READ_BUFFER_SIZE = 64 * 1024
+MAX_READ_BUFFER_SIZE = 16 * 1024 * 1024
+
+
+def read_buffer_size(type, lines):
+    """
+    :param type: The type whose data file is read.
+    :param lines: The number of lines that should fit into the read buffer.
+    :return: A read buffer size in bytes based on the average document size of the type's data file (within the bounds
+    ``MIN_READ_BUFFER_SIZE`` and ``MAX_READ_BUFFER_SIZE``) or -1 (i.e. the default buffer size) if the average document size is unknown.
+    """
+    if not type.average_document_size_in_bytes:
+        return -1
+    return min(max(int(lines * type.average_document_size_in_bytes), MIN_READ_BUFFER_SIZE), MAX_READ_BUFFER_SIZE)
+
+
 def create_default_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
-    source = Slice(io.FileSource, offset, num_lines)
+    lines_per_doc = 2 if action_metadata == ActionMetaData.SourceFile else 1
+    # a bulk is read with as few system calls as possible
+    source = Slice(io.FileSource, offset, num_lines, buffer_size=read_buffer_size(type, bulk_size * lines_per_doc))
 
     if action_metadata == ActionMetaData.Generate:
         am_handler = GenerateActionMetaData(index, type, build_conflicting_ids(id_conflicts, num_docs, offset))
@@ -320,6 +363,41 @@ def create_default_reader(index, type, offset, num_lines, num_docs, action_metad
     return IndexDataReader(type.document_file, batch_size, bulk_size, source, am_handler, index, type)
 
 
+def create_mmap_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
+    if action_metadata == ActionMetaData.Generate:
+        am_handler = GenerateActionMetaData(index, type, build_conflicting_ids(id_conflicts, num_docs, offset))
+    elif action_metadata == ActionMetaData.NoMetaData or action_metadata == ActionMetaData.SourceFile:
+        # action and meta-data lines (if any) are read along with the documents
+        am_handler = None
+    else:
+        raise RuntimeError("Missing action-meta-data handler implementation for %s" % action_metadata)
+
+    lines_per_doc = 2 if action_metadata == ActionMetaData.SourceFile else 1
+    return MmapIndexDataReader(type.document_file, batch_size, bulk_size, offset, num_lines, lines_per_doc, am_handler, index, type)
+
+
+def create_archive_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
+    if action_metadata == ActionMetaData.Generate:
+        am_handler = GenerateActionMetaData(index, type, build_conflicting_ids(id_conflicts, num_docs, offset))
+    elif action_metadata == ActionMetaData.NoMetaData or action_metadata == ActionMetaData.SourceFile:
+        # action and meta-data lines (if any) are read along with the documents
+        am_handler = None
+    else:
+        raise RuntimeError("Missing action-meta-data handler implementation for %s" % action_metadata)
+
+    lines_per_doc = 2 if action_metadata == ActionMetaData.SourceFile else 1
+    return ArchiveIndexDataReader(type.document_archive, batch_size, bulk_size, offset, num_lines, lines_per_doc, am_handler, index,
+                                  type)
+
+
+# readers for the data files that can be chosen with the operation parameter "corpus-reader"
+CORPUS_READERS = {
+    "text": create_default_reader,
+    "mmap": create_mmap_reader,
+    "archive": create_archive_reader
+}
+
+
 def bounds(total_docs, client_index, num_clients, action_metadata):
     """
 
@@ -347,7 +425,7 @@ def bounds(total_docs, client_index, num_clients, action_metadata):
 
 
 def bulk_data_based(num_clients, client_index, indices, action_metadata, batch_size, bulk_size, id_conflicts, pipeline,
-                    create_reader=create_default_reader):
+                    serialize_body=False, filter_response=False, create_reader=create_default_reader):
     """
     Calculates the necessary schedule for bulk operations.
 
@@ -359,6 +437,10 @@ def bulk_data_based(num_clients, client_index, indices, action_metadata, batch_s
     :param bulk_size: The size of bulk index operations (number of documents per bulk).
     :param id_conflicts: The type of id conflicts to simulate.
     :param pipeline: Name of the ingest pipeline to use. May be None.
+    :param serialize_body: If ``True``, each bulk body is provided as UTF-8 encoded ``bytes`` (including action and meta-data lines and
+                           the trailing newline) together with the number of documents in ``bulk-size``. Otherwise, it is provided as a
+                           list of lines.
+    :param filter_response: If ``True``, Elasticsearch only returns the parts of the bulk response that are needed to count errors.
     :param create_reader: A function to create the index reader. By default a file based index reader will be created. This parameter is
                           intended for testing only.
     :return: A generator for the bulk operations of the given client.
@@ -370,26 +452,62 @@ def bulk_data_based(num_clients, client_index, indices, action_metadata, batch_s
             if num_docs > 0:
                 logger.info("Client [%d] will index [%d] docs starting from line offset [%d] for [%s/%s]" %
                             (client_index, num_docs, offset, index, type))
+                if type.average_document_size_in_bytes:
+                    lines_per_bulk = bulk_size * num_lines // num_docs
+                    logger.info("Client [%d] will read approximately [%d] bytes per bulk from [%s] ([%.2f] MB in total)." %
+                                (client_index, lines_per_bulk * type.average_document_size_in_bytes, type.document_file,
+                                 num_lines * type.average_document_size_in_bytes / 1024 / 1024))
                 readers.append(create_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts))
             else:
                 logger.info("Client [%d] skips [%s/%s] (no documents to read)." % (client_index, index, type))
     reader = chain(*readers)
     bulk_id = 0
-    for index, type, batch in reader:
-        # each batch can contain of one or more bulks
-        for bulk in batch:
-            bulk_id += 1
-            params = {
-                "index": index,
-                "type": type,
-                "action_metadata_present": action_metadata != ActionMetaData.NoMetaData,
-                "body": bulk,
-                # a globally unique id for this bulk
-                "bulk-id": "%d-%d" % (client_index, bulk_id)
-            }
-            if pipeline:
-                params["pipeline"] = pipeline
-            yield params
+    action_metadata_present = action_metadata != ActionMetaData.NoMetaData
+    serialized_bytes = 0
+    serialization_time = 0
+    try:
+        for index, type, batch in reader:
+            # each batch can contain of one or more bulks
+            for bulk in batch:
+                bulk_id += 1
+                params = {
+                    "index": index,
+                    "type": type,
+                    "action_metadata_present": action_metadata_present,
+                    "body": bulk,
+                    # a globally unique id for this bulk
+                    "bulk-id": "%d-%d" % (client_index, bulk_id)
+                }
+                if isinstance(bulk, bytes):
+                    # already serialized by the reader
+                    lines = bulk.count(b"\n")
+                    params["bulk-size"] = lines // 2 if action_metadata_present else lines
+                elif serialize_body:
+                    start = client.cpu_time()
+                    params["body"] = serialize_bulk(bulk)
+                    # recorded by the driver along with the request (see ``driver.record_sample``)
+                    params["serialization-time"] = client.cpu_time() - start
+                    serialization_time += params["serialization-time"]
+                    serialized_bytes += len(params["body"])
+                    params["bulk-size"] = len(bulk) // 2 if action_metadata_present else len(bulk)
+                if pipeline:
+                    params["pipeline"] = pipeline
+                if filter_response:
+                    params["filter_response"] = True
+                yield params
+    finally:
+        if serialize_body and bulk_id > 0:
+            logger.info("Client [%d] serialized [%d] bulk bodies with [%d] bytes in [%.3f] s ([%.2f] MB/s)." %
+                        (client_index, bulk_id, serialized_bytes, serialization_time,
+                         serialized_bytes / serialization_time / 1024 / 1024 if serialization_time > 0 else 0))
+
+
+def serialize_bulk(lines):
+    """
+    :param lines: A list of lines of a bulk request (without line endings).
+    :return: The bulk request body as UTF-8 encoded ``bytes``, terminated by a newline as required by the bulk API.
+    """
+    return ("\n".join(lines) + "\n").encode("utf-8")
 
 
 class NoneActionMetaData:
@@ -436,15 +554,16 @@ class SourceActionMetaData:
 
 
 class Slice:
-    def __init__(self, source_class, offset, number_of_lines):
+    def __init__(self, source_class, offset, number_of_lines, buffer_size=-1):
         self.source_class = source_class
         self.source = None
         self.offset = offset
         self.number_of_lines = number_of_lines
+        self.buffer_size = buffer_size
         self.current_line = 0
 
     def open(self, file_name, mode):
-        self.source = self.source_class(file_name, mode).open()
+        self.source = self.source_class(file_name, mode, buffer_size=self.buffer_size).open()
         # skip offset number of lines
         logger.info("Skipping %d lines in [%s]." % (self.offset, file_name))
         start = time.perf_counter()
@@ -536,6 +655,227 @@ class IndexDataReader:
         return False
 
 
+class BytesIndexDataReader:
+    """
+    Base class for readers that provide each bulk as a UTF-8 encoded ``bytes`` body that is ready to be sent. In contrast to
+    ``IndexDataReader``, lines are neither decoded nor stripped: The lines of a bulk are read in one piece. If action and meta-data lines
+    need to be generated, they are interleaved with the documents afterwards.
+
+    Subclasses implement ``read_lines()``.
+    """
+
+    def __init__(self, batch_size, bulk_size, offset, number_of_lines, lines_per_doc, action_metadata, index_name, type_name):
+        """
+        :param batch_size: The number of documents to read in one go.
+        :param bulk_size: The number of documents per bulk.
+        :param offset: The number of lines to skip at the beginning of the data file.
+        :param number_of_lines: The number of lines to read.
+        :param lines_per_doc: The number of lines in the data file per document (2 if it contains action and meta-data lines).
+        :param action_metadata: An iterator of action and meta-data lines or ``None`` if they should not be generated.
+        :param index_name: The name of the index.
+        :param type_name: The name of the type.
+        """
+        self.batch_size = batch_size
+        self.bulk_size = bulk_size
+        self.offset = offset
+        self.number_of_lines = number_of_lines
+        self.lines_per_doc = lines_per_doc
+        self.action_metadata = action_metadata
+        self.index_name = index_name
+        self.type_name = type_name
+        self.remaining_lines = number_of_lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Returns the bodies of N bulk requests (where N is bulk_size / batch_size)
+        """
+        batch = []
+        docs_in_batch = 0
+        while docs_in_batch < self.batch_size:
+            docs_in_bulk, bulk = self.read_bulk()
+            if docs_in_bulk == 0:
+                break
+            docs_in_batch += docs_in_bulk
+            batch.append(bulk)
+        if docs_in_batch == 0:
+            raise StopIteration()
+        logger.debug("Returning a batch with %d bulks." % len(batch))
+        return self.index_name, self.type_name, batch
+
+    def read_bulk(self):
+        lines, body = self.read_lines(min(self.bulk_size * self.lines_per_doc, self.remaining_lines))
+        self.remaining_lines -= lines
+        if lines == 0:
+            return 0, None
+        # the bulk API requires a trailing newline but the last line of the data file might lack one
+        if not body.endswith(b"\n"):
+            body += b"\n"
+        docs = lines // self.lines_per_doc
+        if self.action_metadata is None:
+            return docs, body
+        # interleave generated action and meta-data lines with the documents
+        parts = [None] * (2 * docs)
+        parts[0::2] = [next(self.action_metadata).encode("utf-8") for _ in range(docs)]
+        # the body ends with a newline, so the last element after splitting is empty
+        parts[1::2] = body.split(b"\n")[:-1]
+        parts.append(b"")
+        return docs, b"\n".join(parts)
+
+    def read_lines(self, max_lines):
+        """
+        Reads up to ``max_lines`` lines from the current position in one piece.
+
+        :return: A tuple of the number of lines that have been read and the lines as ``bytes``.
+        """
+        raise NotImplementedError("abstract method")
+
+
+class MmapIndexDataReader(BytesIndexDataReader):
+    """
+    Reads a slice of a memory-mapped data file in bulks. The lines of each bulk are copied from the mapped file in one piece.
+    """
+
+    def __init__(self, data_file, batch_size, bulk_size, offset, number_of_lines, lines_per_doc, action_metadata, index_name, type_name):
+        """
+        :param data_file: The path to the data file.
+
+        See ``BytesIndexDataReader`` for all other parameters.
+        """
+        super().__init__(batch_size, bulk_size, offset, number_of_lines, lines_per_doc, action_metadata, index_name, type_name)
+        self.data_file = data_file
+        self.f = None
+        self.mm = None
+        self.position = 0
+
+    def __enter__(self):
+        self.f = open(self.data_file, mode="rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info("Skipping %d lines in [%s]." % (self.offset, self.data_file))
+        start = time.perf_counter()
+        io.skip_lines(self.data_file, self.mm, self.offset)
+        end = time.perf_counter()
+        logger.info("Skipping %d lines took %f s." % (self.offset, end - start))
+        self.position = self.mm.tell()
+        return self
+
+    def read_lines(self, max_lines):
+        mm = self.mm
+        start = self.position
+        end = start
+        lines = 0
+        while lines < max_lines and end < len(mm):
+            newline = mm.find(b"\n", end)
+            end = len(mm) if newline == -1 else newline + 1
+            lines += 1
+        self.position = end
+        return lines, mm[start:end]
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.mm.close()
+        self.f.close()
+        self.mm = None
+        self.f = None
+        return False
+
+
+class ArchiveIndexDataReader(BytesIndexDataReader):
+    """
+    Reads a slice of the documents in a .bz2 or .gz archive in bulks without decompressing the archive to disk. The archive is decompressed
+    on a background thread ahead of this reader. If the archive has been prepared with ``corpus.prepare_archive()``, decompression starts
+    at the last checkpoint before the slice instead of at the beginning of the archive.
+    """
+
+    def __init__(self, archive_path, batch_size, bulk_size, offset, number_of_lines, lines_per_doc, action_metadata, index_name,
+                 type_name, stream_class=io.ArchiveStream):
+        """
+        :param archive_path: The path to the archive.
+        :param stream_class: The class that decompresses the archive. This parameter is intended for testing only.
+
+        See ``BytesIndexDataReader`` for all other parameters.
+        """
+        super().__init__(batch_size, bulk_size, offset, number_of_lines, lines_per_doc, action_metadata, index_name, type_name)
+        self.archive_path = archive_path
+        self.stream_class = stream_class
+        self.stream = None
+        self.buffer = bytearray()
+        self.position = 0
+
+    def __enter__(self):
+        checkpoints = corpus.load_checkpoints(self.archive_path)
+        archive_offset, first_line, partial = checkpoints.lookup(self.offset) if checkpoints else (0, 0, False)
+        logger.info("Starting to decompress [%s] at offset [%d] (line [%d]) and skipping %d lines." %
+                    (self.archive_path, archive_offset, first_line, self.offset - first_line))
+        start = time.perf_counter()
+        self.stream = self.stream_class(self.archive_path, archive_offset).open()
+        if partial:
+            # the first line of the checkpoint belongs to the preceding gzip member or bz2 stream
+            self.skip_lines(1)
+        self.skip_lines(self.offset - first_line)
+        end = time.perf_counter()
+        logger.info("Skipping %d lines took %f s." % (self.offset - first_line, end - start))
+        return self
+
+    def _fill(self):
+        """
+        Appends the next chunk of decompressed data to the buffer and drops all data that have already been read.
+
+        :return: ``False`` iff the archive is exhausted.
+        """
+        data = self.stream.read()
+        if not data:
+            return False
+        del self.buffer[:self.position]
+        self.position = 0
+        self.buffer += data
+        return True
+
+    def skip_lines(self, number_of_lines):
+        while number_of_lines > 0:
+            available = self.buffer.count(b"\n", self.position)
+            if available >= number_of_lines:
+                for _ in range(number_of_lines):
+                    self.position = self.buffer.index(b"\n", self.position) + 1
+                return
+            number_of_lines -= available
+            # keep only the beginning of the next line
+            self.position = max(self.position, self.buffer.rfind(b"\n") + 1)
+            if not self._fill():
+                self.position = len(self.buffer)
+                return
+
+    def read_lines(self, max_lines):
+        end = self.position
+        lines = 0
+        while lines < max_lines:
+            newline = self.buffer.find(b"\n", end)
+            if newline >= 0:
+                end = newline + 1
+                lines += 1
+            else:
+                start = self.position
+                if not self._fill():
+                    # the last line of the archive might lack a line ending
+                    if end < len(self.buffer):
+                        end = len(self.buffer)
+                        lines += 1
+                    break
+                # the buffer has been compacted
+                end -= start
+        body = bytes(self.buffer[self.position:end])
+        self.position = end
+        return lines, body
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stream.close()
+        self.stream = None
+        self.buffer = bytearray()
+        self.position = 0
+        return False
+
+
 register_param_source_for_operation(track.OperationType.Index, BulkIndexParamSource)
 register_param_source_for_operation(track.OperationType.Search, SearchParamSource)
 
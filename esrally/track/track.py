@@ -40,7 +40,7 @@ class Type:
 
     def __init__(self, name, mapping_file, document_file=None, document_archive=None, number_of_documents=0,
                  compressed_size_in_bytes=0,
-                 uncompressed_size_in_bytes=0):
+                 uncompressed_size_in_bytes=0, average_document_size_in_bytes=None):
         """
 
         Creates a new type. Mappings are mandatory but the document_archive (and associated properties) are optional.
@@ -57,6 +57,8 @@ class Type:
          user reporting. Only needed if a document_archive is given.
         :param uncompressed_size_in_bytes: The size in bytes of the benchmark document after decompressing it. Only needed if a
         document_archive is given.
+        :param average_document_size_in_bytes: The average size in bytes of a line in the document file. Optional. It is determined when
+        the track is prepared and used to estimate the size of bulk requests.
         """
         self.name = name
         self.mapping_file = mapping_file
@@ -65,6 +67,7 @@ class Type:
         self.number_of_documents = number_of_documents
         self.compressed_size_in_bytes = compressed_size_in_bytes
         self.uncompressed_size_in_bytes = uncompressed_size_in_bytes
+        self.average_document_size_in_bytes = average_document_size_in_bytes
 
     def has_valid_document_data(self):
         return self.document_file is not None and \
@@ -180,7 +183,10 @@ class Parallel:
 
 
 class Task:
-    def __init__(self, operation, warmup_iterations=0, iterations=1, warmup_time_period=None, time_period=None, clients=1, target_throughput=None):
+    def __init__(self, operation, warmup_iterations=0, iterations=1, warmup_time_period=None, time_period=None, clients=1,
+                 target_throughput=None, schedule="deterministic", params=None):
+        if params is None:
+            params = {}
         self.operation = operation
         self.warmup_iterations = warmup_iterations
         self.iterations = iterations
@@ -188,6 +194,8 @@ class Task:
         self.time_period = time_period
         self.clients = clients
         self.target_throughput = target_throughput
+        self.schedule = schedule
+        self.params = params
 
     def __iter__(self):
         return iter([self])
@@ -0,0 +1,184 @@
+import array
+import collections
+import itertools
+import math
+import zlib
+
+
+class Histogram:
+    """
+    A log-linear histogram for recording latencies in the spirit of HdrHistogram.
+
+    Values are recorded in a fixed number of buckets whose width grows with the magnitude of the value. This guarantees a relative error
+    that is bound by the number of significant digits, needs constant memory regardless of the number of recorded values and allows to
+    merge histograms of multiple clients (or laps) exactly by adding up their bucket counts.
+
+    Values are provided in milliseconds but tracked internally with microsecond resolution.
+    """
+
+    UNITS_PER_MS = 1000
+
+    def __init__(self, highest_trackable_value_ms=3600 * 1000, significant_digits=3):
+        """
+        Creates a new empty histogram.
+
+        :param highest_trackable_value_ms: The highest value in milliseconds that should be tracked accurately. Larger values are still
+        counted but fall into the last bucket. Default: one hour.
+        :param significant_digits: The number of significant decimal digits that should be preserved. Must be in the range [1, 5].
+        Default: 3.
+        """
+        if significant_digits < 1 or significant_digits > 5:
+            raise ValueError("Significant digits must be in the range [1, 5] but was [%s]" % str(significant_digits))
+        self.highest_trackable_value_ms = highest_trackable_value_ms
+        self.significant_digits = significant_digits
+
+        largest_value_with_single_unit_resolution = 2 * 10 ** significant_digits
+        sub_bucket_count_magnitude = int(math.ceil(math.log2(largest_value_with_single_unit_resolution)))
+        self._sub_bucket_half_count_magnitude = sub_bucket_count_magnitude - 1
+        self._sub_bucket_count = 1 << sub_bucket_count_magnitude
+        self._sub_bucket_half_count = self._sub_bucket_count // 2
+        self._sub_bucket_mask = self._sub_bucket_count - 1
+
+        self._highest_trackable_value = int(highest_trackable_value_ms * Histogram.UNITS_PER_MS)
+        bucket_count = 1
+        smallest_untrackable_value = self._sub_bucket_count
+        while smallest_untrackable_value <= self._highest_trackable_value:
+            smallest_untrackable_value <<= 1
+            bucket_count += 1
+        self._counts_len = (bucket_count + 1) * self._sub_bucket_half_count
+        self._counts = array.array("q", [0]) * self._counts_len
+
+        self.total_count = 0
+        self.min = None
+        self.max = None
+        # indices of all populated buckets if known (see ``__setstate__()``) together with the total count at the time they were determined
+        self._populated = None
+        self._populated_count = None
+
+    def record(self, value_ms):
+        """
+        Records a single value.
+
+        :param value_ms: A non-negative value in milliseconds.
+        """
+        self._counts[self._counts_index_for(value_ms)] += 1
+        self.total_count += 1
+        if self.min is None or value_ms < self.min:
+            self.min = value_ms
+        if self.max is None or value_ms > self.max:
+            self.max = value_ms
+
+    def merge(self, other):
+        """
+        Adds all values of another histogram to this one. Both histograms must have been created with the same parameters.
+
+        :param other: Another histogram.
+        :return: This histogram (to allow chaining).
+        """
+        if self._counts_len != other._counts_len or self._sub_bucket_count != other._sub_bucket_count:
+            raise ValueError("Cannot merge histograms with different parameters.")
+        if other.total_count == 0:
+            return self
+        counts = self._counts
+        other_counts = other._counts
+        for idx in other._populated_indices():
+            counts[idx] += other_counts[idx]
+        self.total_count += other.total_count
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        return self
+
+    def percentiles(self, percentiles):
+        """
+        Determines values at the given percentiles with a single pass over all buckets.
+
+        :param percentiles: A list of percentiles in the range [0, 100].
+        :return: An ordered dictionary of the determined percentile values in ascending order. Key is the percentile, value is the
+        determined value in milliseconds. If the histogram is empty, an empty dictionary is returned.
+        """
+        result = collections.OrderedDict()
+        if self.total_count == 0:
+            return result
+        pending = sorted(percentiles, key=float)
+        cumulative = 0
+        pos = 0
+        for idx in self._populated_indices():
+            count = self._counts[idx]
+            cumulative += count
+            if cumulative == self.total_count:
+                # the remaining percentiles are all in the last populated bucket for which we know the exact maximum
+                break
+            while pos < len(pending) and cumulative >= self._count_at_percentile(pending[pos]):
+                result[pending[pos]] = self._clamp(self._highest_equivalent_value(idx) / Histogram.UNITS_PER_MS)
+                pos += 1
+            if pos == len(pending):
+                break
+        for p in pending[pos:]:
+            result[p] = self.max
+        return result
+
+    def _populated_indices(self):
+        """
+        :return: An iterable of the indices of all buckets that contain at least one value in ascending order.
+        """
+        if self.total_count == 0:
+            return []
+        # a histogram that has been sent by another actor knows its populated buckets until new values are added
+        if self._populated is not None and self._populated_count == self.total_count:
+            return self._populated
+        # only buckets between the minimum and the maximum can be populated; skip empty ones without iterating in Python
+        lower = self._counts_index_for(self.min)
+        upper = self._counts_index_for(self.max)
+        return itertools.compress(range(lower, upper + 1), self._counts[lower:upper + 1])
+
+    def _count_at_percentile(self, percentile):
+        return max(1, int(math.ceil(float(percentile) / 100.0 * self.total_count)))
+
+    def _clamp(self, value_ms):
+        # the bucket boundaries may lie outside of the actually recorded range
+        return min(max(value_ms, self.min), self.max)
+
+    def _counts_index_for(self, value_ms):
+        value = min(int(value_ms * Histogram.UNITS_PER_MS), self._highest_trackable_value)
+        if value < 0:
+            raise ValueError("Cannot record negative value [%s]" % str(value_ms))
+        bucket_index = (value | self._sub_bucket_mask).bit_length() - (self._sub_bucket_half_count_magnitude + 1)
+        sub_bucket_index = value >> bucket_index
+        return ((bucket_index + 1) << self._sub_bucket_half_count_magnitude) + (sub_bucket_index - self._sub_bucket_half_count)
+
+    def _highest_equivalent_value(self, counts_index):
+        bucket_index = (counts_index >> self._sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (counts_index & (self._sub_bucket_half_count - 1)) + self._sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self._sub_bucket_half_count
+            bucket_index = 0
+        return (sub_bucket_index << bucket_index) + (1 << bucket_index) - 1
+
+    def __getstate__(self):
+        # Histograms are sent between actors. Buckets are sparsely populated so only populated buckets are sent as (index, count) pairs.
+        state = self.__dict__.copy()
+        indices = array.array("q", self._populated_indices())
+        counts = array.array("q", [self._counts[idx] for idx in indices])
+        state["_counts"] = zlib.compress(indices.tobytes() + counts.tobytes())
+        state["_populated"] = None
+        state["_populated_count"] = None
+        return state
+
+    def __setstate__(self, state):
+        pairs = array.array("q")
+        pairs.frombytes(zlib.decompress(state["_counts"]))
+        n = len(pairs) // 2
+        indices = pairs[:n]
+        counts = array.array("q", [0]) * state["_counts_len"]
+        for idx, count in zip(indices, pairs[n:]):
+            counts[idx] = count
+        state["_counts"] = counts
+        # allows to merge this histogram by only visiting populated buckets
+        state["_populated"] = indices
+        state["_populated_count"] = state["total_count"]
+        self.__dict__.update(state)
+
+    def __repr__(self, *args, **kwargs):
+        return "Histogram(count=%d, min=%s, max=%s)" % (self.total_count, str(self.min), str(self.max))
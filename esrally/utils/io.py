@@ -1,15 +1,20 @@
+import bisect
+import concurrent.futures
+import mmap
 import os
 import errno
+import queue
+import struct
+import threading
 import re
 import subprocess
 import bz2
 import gzip
 import zipfile
 import tarfile
+import zlib
 import logging
 
-from esrally.utils import console
-
 logger = logging.getLogger("rally.utils.io")
 
 
@@ -17,13 +22,19 @@ class FileSource:
     """
     FileSource is a wrapper around a plain file which simplifies testing of file I/O calls.
     """
-    def __init__(self, file_name, mode):
+    def __init__(self, file_name, mode, buffer_size=-1):
+        """
+        :param file_name: The path to the file.
+        :param mode: The file mode.
+        :param buffer_size: The size of the read buffer in bytes. Optional. Defaults to Python's default buffer size.
+        """
         self.file_name = file_name
         self.mode = mode
+        self.buffer_size = buffer_size
         self.f = None
 
     def open(self):
-        self.f = open(self.file_name, self.mode)
+        self.f = open(self.file_name, self.mode, buffering=self.buffer_size)
         # allow for chaining
         return self
 
@@ -57,10 +68,12 @@ class StringAsFileSource:
     Implementation of ``FileSource`` intended for tests. It's kept close to ``FileSource`` to simplify maintenance but it is not meant to
      be used in production code.
     """
-    def __init__(self, contents, mode):
+    def __init__(self, contents, mode, buffer_size=-1):
         """
         :param contents: The file contents as an array of strings. Each item in the array should correspond to one line.
         :param mode: The file mode. It is ignored in this implementation but kept to implement the same interface as ``FileSource``.
+        :param buffer_size: The size of the read buffer. It is ignored in this implementation but kept to implement the same interface as
+        ``FileSource``.
         """
         self.contents = contents
         self.current_index = 0
@@ -184,6 +197,173 @@ def _do_decompress(target_directory, compressed_file):
         compressed_file.close()
 
 
+# Archives can be streamed if they consist of a single compressed file. They may consist of several concatenated gzip members or bz2
+# streams (as created by e.g. pbzip2). Decompression can start at the beginning of each of them.
+STREAMABLE_ARCHIVE_EXTENSIONS = [".bz2", ".gz"]
+ARCHIVE_READ_SIZE = 1024 * 1024
+
+
+def is_streamable_archive(archive_path):
+    return archive_path is not None and splitext(archive_path)[1] in STREAMABLE_ARCHIVE_EXTENSIONS
+
+
+def _decompressor(archive_path):
+    _, extension = splitext(archive_path)
+    if extension == ".bz2":
+        return bz2.BZ2Decompressor()
+    elif extension == ".gz":
+        # expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        raise RuntimeError("Unsupported file extension [%s]. Cannot stream [%s]" % (extension, archive_path))
+
+
+def decompressed_members(archive_path, offset=0, read_size=ARCHIVE_READ_SIZE):
+    """
+    Decompresses a .bz2 or .gz archive incrementally.
+
+    :param archive_path: The path to the archive.
+    :param offset: The offset in bytes of a gzip member or bz2 stream in the archive at which decompression starts. Optional.
+    :param read_size: The number of compressed bytes to read at once. Optional.
+    :return: A generator of tuples (offset of the gzip member or bz2 stream that the data belong to, decompressed data).
+    """
+    with open(archive_path, mode="rb") as f:
+        f.seek(offset)
+        member_offset = offset
+        # the offset of ``data`` in the archive
+        position = offset
+        decompressor = _decompressor(archive_path)
+        data = f.read(read_size)
+        while data:
+            decompressed = decompressor.decompress(data)
+            if decompressed:
+                yield member_offset, decompressed
+            if decompressor.eof:
+                # the next member starts within ``data``
+                unused = decompressor.unused_data
+                position += len(data) - len(unused)
+                data = unused if unused else f.read(read_size)
+                # like gzip, skip zero padding after a complete member (e.g. of archives that are written in fixed-size blocks)
+                while data and not data.strip(b"\x00"):
+                    position += len(data)
+                    data = f.read(read_size)
+                padding = len(data) - len(data.lstrip(b"\x00"))
+                position += padding
+                data = data[padding:]
+                member_offset = position
+                decompressor = _decompressor(archive_path)
+            else:
+                position += len(data)
+                data = f.read(read_size)
+
+
+class ArchiveStream:
+    """
+    Decompresses a .bz2 or .gz archive on a background thread ahead of the consumer. As zlib and bz2 release the GIL while decompressing,
+    decompression runs in parallel to the consumer.
+    """
+
+    def __init__(self, archive_path, offset=0, queue_size=16):
+        """
+        :param archive_path: The path to the archive.
+        :param offset: The offset in bytes of a gzip member or bz2 stream in the archive at which decompression starts. Optional.
+        :param queue_size: The maximum number of decompressed chunks that are buffered. Optional.
+        """
+        self.archive_path = archive_path
+        self.offset = offset
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._done = False
+
+    def open(self):
+        self._thread = threading.Thread(target=self._decompress, name="decompress-%s" % basename(self.archive_path), daemon=True)
+        self._thread.start()
+        # allow for chaining
+        return self
+
+    def _decompress(self):
+        try:
+            for _, data in decompressed_members(self.archive_path, self.offset):
+                if not self._put(data):
+                    return
+            self._put(None)
+        except BaseException as e:
+            logger.exception("Could not decompress [%s]." % self.archive_path)
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self):
+        """
+        :return: The next chunk of decompressed data or ``b""`` if the archive is exhausted.
+        """
+        if self._done:
+            return b""
+        item = self._queue.get()
+        if item is None:
+            self._done = True
+            return b""
+        elif isinstance(item, BaseException):
+            self._done = True
+            raise item
+        return item
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __str__(self, *args, **kwargs):
+        return self.archive_path
+
+
+def archive_checkpoints(archive_path, granularity):
+    """
+    Decompresses an archive once and determines the positions at which decompression can start later on. These are the gzip members or
+    bz2 streams that start at least ``granularity`` decompressed bytes after the previous checkpoint.
+
+    :param archive_path: The path to a .bz2 or .gz archive.
+    :param granularity: The minimum distance in decompressed bytes between two checkpoints.
+    :return: A tuple of a list of checkpoints, the number of lines and the number of decompressed bytes. Each checkpoint is a tuple of
+    the offset of the gzip member or bz2 stream in the archive, the number of the first line that starts in it and whether it starts
+    in the middle of a line.
+    """
+    checkpoints = [(0, 0, False)]
+    current_member = 0
+    number_of_newlines = 0
+    size = 0
+    last_checkpoint_size = 0
+    ends_with_newline = True
+    for member_offset, data in decompressed_members(archive_path):
+        if member_offset != current_member:
+            current_member = member_offset
+            if size - last_checkpoint_size >= granularity:
+                partial = not ends_with_newline
+                checkpoints.append((member_offset, number_of_newlines + (1 if partial else 0), partial))
+                last_checkpoint_size = size
+        number_of_newlines += data.count(b"\n")
+        size += len(data)
+        ends_with_newline = data.endswith(b"\n")
+    number_of_lines = number_of_newlines if ends_with_newline else number_of_newlines + 1
+    return checkpoints, number_of_lines, size
+
+
 # just in a dedicated method to ease mocking
 def dirname(path):
     return os.path.dirname(path)
@@ -217,30 +397,185 @@ def splitext(file_name):
         return os.path.splitext(file_name)
 
 
-def prepare_file_offset_table(data_file_path):
-    """
-    Creates a file that contains a mapping from line numbers to file offsets for the provided path. This file is used internally by
-    #skip_lines(data_file_path, data_file) to speed up line skipping.
-
-    :param data_file_path: The path to a text file that is readable by this process.
-    """
-    offset_file_path = "%s.offset" % data_file_path
-    # recreate only if necessary as this can be time-consuming
-    if not os.path.exists(offset_file_path) or os.path.getmtime(offset_file_path) < os.path.getmtime(data_file_path):
-        console.info("Preparing file offset table for [%s] ... " % data_file_path, end="", flush=True, logger=logger)
-        line_number = 0
-        with open(offset_file_path, mode="w") as offset_file:
-            with open(data_file_path, mode="rt") as data_file:
-                while True:
-                    line = data_file.readline()
-                    if len(line) == 0:
-                        break
-                    line_number += 1
-                    if line_number % 50000 == 0:
-                        print("%d;%d" % (line_number, data_file.tell()), file=offset_file)
-        console.println("[OK]")
+# The offset index of a data file starts with a header (magic bytes, format version, granularity in bytes and number of lines of the data
+# file) followed by fixed-width entries of (line number, byte offset), all as little-endian unsigned 64 bit integers. For each multiple of
+# `granularity` bytes, there is an entry for the first line that starts at or after it (unless it is the same line as for the previous
+# multiple). Thus the entries are sorted by line number and can be determined independently for each byte range of the data file.
+OFFSET_INDEX_MAGIC = b"RLYOFFS\x00"
+OFFSET_INDEX_VERSION = 1
+OFFSET_INDEX_HEADER = struct.Struct("<8sQQQ")
+OFFSET_INDEX_ENTRY = struct.Struct("<QQ")
+DEFAULT_OFFSET_INDEX_GRANULARITY = 64 * 1024
+# data files are split in byte ranges of at least this size that are indexed in parallel
+MIN_OFFSET_INDEX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def offset_index_path(data_file_path):
+    return "%s.offset" % data_file_path
+
+
+class OffsetIndex:
+    """
+    A memory-mapped, read-only view of the offset index of a data file. The offset of any line is found with a binary search over the
+    entries, so at most ``granularity`` bytes (plus one line) need to be read afterwards to reach the line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+        self._mm = None
+        self.granularity = None
+        self.number_of_lines = None
+
+    def open(self):
+        """
+        :return: This instance if ``path`` is a valid offset index of the current version, otherwise ``None``.
+        """
+        try:
+            self._f = open(self.path, mode="rb")
+            size = os.fstat(self._f.fileno()).st_size
+            if size < OFFSET_INDEX_HEADER.size or (size - OFFSET_INDEX_HEADER.size) % OFFSET_INDEX_ENTRY.size != 0:
+                self.close()
+                return None
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.close()
+            return None
+        magic, version, self.granularity, self.number_of_lines = OFFSET_INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic != OFFSET_INDEX_MAGIC or version != OFFSET_INDEX_VERSION:
+            self.close()
+            return None
+        return self
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return (len(self._mm) - OFFSET_INDEX_HEADER.size) // OFFSET_INDEX_ENTRY.size
+
+    def __getitem__(self, i):
+        """
+        :return: The ``i``th entry as a tuple of line number and byte offset.
+        """
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return OFFSET_INDEX_ENTRY.unpack_from(self._mm, OFFSET_INDEX_HEADER.size + i * OFFSET_INDEX_ENTRY.size)
+
+    def lookup(self, line_number):
+        """
+        :param line_number: A (zero-based) line number.
+        :return: A tuple of the line number and byte offset of the closest indexed line at or before ``line_number``.
+        """
+        i = bisect.bisect_right(_LineNumbers(self), line_number)
+        return self[i - 1] if i > 0 else (0, 0)
+
+
+class _LineNumbers:
+    """
+    A sequence view of the line numbers in an offset index (needed for ``bisect``).
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.index[i][0]
+
+
+def write_offset_index(offset_index_path, entries, number_of_lines, granularity):
+    """
+    :param offset_index_path: The path of the offset index file.
+    :param entries: An iterable of (line number, byte offset) tuples in ascending order.
+    :param number_of_lines: The total number of lines in the data file.
+    :param granularity: The minimum number of bytes between two entries.
+    """
+    with open(offset_index_path, mode="wb") as f:
+        f.write(OFFSET_INDEX_HEADER.pack(OFFSET_INDEX_MAGIC, OFFSET_INDEX_VERSION, granularity, number_of_lines))
+        for line_number, offset in entries:
+            f.write(OFFSET_INDEX_ENTRY.pack(line_number, offset))
+
+
+def _index_range(data_file_path, start, end, granularity):
+    """
+    Determines the offset index entries for a byte range of a data file. It only needs to count newlines so it works on raw bytes.
+
+    :param start: The start of the byte range (inclusive). Must be a multiple of ``granularity``.
+    :param end: The end of the byte range (exclusive).
+    :return: A tuple of the number of newlines in the range and a list of entries as tuples of the number of newlines between ``start``
+    and the line start, and the offset of the line start.
+    """
+    entries = []
+    newlines = 0
+    with open(data_file_path, mode="rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        position = start
+        for boundary in range(start, end, granularity):
+            if boundary < position:
+                # the line that starts at or after the previous boundary also covers this one
+                continue
+            line_start = mm.find(b"\n", boundary - 1) + 1 if boundary > 0 else 0
+            # no line starts after this boundary in the current range (a later range will index it if needed)
+            if (line_start == 0 and boundary > 0) or line_start >= end or line_start >= size:
+                break
+            newlines += mm[position:line_start].count(b"\n")
+            position = line_start
+            entries.append((newlines, line_start))
+        newlines += mm[position:end].count(b"\n")
+        # a trailing line without newline counts as well
+        if end == size and size > 0 and mm[size - 1:size] != b"\n":
+            newlines += 1
+    return newlines, entries
+
+
+def offset_index_entries(data_file_path, granularity, processes=None):
+    """
+    Determines the entries of the offset index of a data file. The file is split into byte ranges which are indexed in parallel by
+    ``processes`` worker processes.
+
+    :param data_file_path: The path to the data file.
+    :param granularity: The distance in bytes between indexed lines.
+    :param processes: The maximum number of worker processes. Optional. Defaults to the number of CPUs.
+    :return: A tuple of the list of entries and the number of lines in the data file.
+    """
+    size = os.path.getsize(data_file_path)
+    if size == 0:
+        return [], 0
+    processes = processes if processes else (os.cpu_count() or 1)
+    chunk_size = max(MIN_OFFSET_INDEX_CHUNK_SIZE, -(-size // processes))
+    # all ranges must start at a multiple of the granularity
+    chunk_size = -(-chunk_size // granularity) * granularity
+    ranges = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    if len(ranges) == 1:
+        results = [_index_range(data_file_path, 0, size, granularity)]
     else:
-        logger.info("Skipping creation of file offset table at [%s] as it is still valid." % offset_file_path)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(processes, len(ranges))) as executor:
+            futures = [executor.submit(_index_range, data_file_path, start, end, granularity) for start, end in ranges]
+            results = [f.result() for f in futures]
+
+    entries = []
+    lines = 0
+    for newlines, range_entries in results:
+        for newlines_before, offset in range_entries:
+            # a long line may span range boundaries
+            if not entries or entries[-1][1] != offset:
+                entries.append((lines + newlines_before, offset))
+        lines += newlines
+    return entries, lines
 
 
 def skip_lines(data_file_path, data_file, number_of_lines_to_skip):
@@ -254,19 +589,14 @@ def skip_lines(data_file_path, data_file, number_of_lines_to_skip):
     if number_of_lines_to_skip == 0:
         return
 
-    offset_file_path = "%s.offset" % data_file_path
     offset = 0
     remaining_lines = number_of_lines_to_skip
     # can we fast forward?
-    if os.path.exists(offset_file_path):
-        with open(offset_file_path) as offsets:
-            for line in offsets:
-                line_number, offset_in_bytes = [int(i) for i in line.strip().split(";")]
-                if line_number <= number_of_lines_to_skip:
-                    offset = offset_in_bytes
-                    remaining_lines = number_of_lines_to_skip - line_number
-                else:
-                    break
+    index = OffsetIndex(offset_index_path(data_file_path)).open()
+    if index is not None:
+        with index:
+            line_number, offset = index.lookup(number_of_lines_to_skip)
+        remaining_lines = number_of_lines_to_skip - line_number
     # fast forward to the last known file offset
     data_file.seek(offset)
     # forward the last remaining lines if needed
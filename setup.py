@@ -43,7 +43,7 @@ setup(name="esrally",
       license="Apache License, Version 2.0",
       packages=find_packages(
           where=".",
-          exclude=("tests*",)
+          exclude=("tests*", "benchmarks*")
       ),
       include_package_data=True,
       package_data={"": ["*.json"]},
@@ -51,7 +51,7 @@ setup(name="esrally",
       test_suite="tests",
       tests_require=tests_require,
       entry_points={
-          "console_scripts": ["esrally=esrally.rally:main"],
+          "console_scripts": ["esrally=esrally.rally:main", "esrallyd=esrally.rallyd:main"],
       },
       classifiers=[
           "Topic :: System :: Benchmark",
@@ -62,7 +62,6 @@ setup(name="esrally",
           "Operating System :: POSIX",
           "Programming Language :: Python",
           "Programming Language :: Python :: 3",
-          "Programming Language :: Python :: 3.4",
           "Programming Language :: Python :: 3.5"
       ],
       zip_safe=False)
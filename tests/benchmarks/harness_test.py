@@ -0,0 +1,59 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks import harness
+
+
+class MeasureTests(TestCase):
+    def test_reports_fastest_run_per_operation(self):
+        durations = iter([0, 4, 10, 12, 20, 23])
+        setups = []
+
+        def setup():
+            setups.append(True)
+            return lambda: None, 2
+
+        m = harness.measure(harness.Benchmark("test", setup, repetitions=3), timer=lambda: next(durations))
+
+        self.assertEqual(3, len(setups))
+        self.assertEqual("test", m.name)
+        self.assertEqual(2, m.ops)
+        self.assertEqual(1, m.time_per_op)
+
+
+class BaselineTests(TestCase):
+    def test_missing_baseline_is_empty(self):
+        self.assertEqual({}, harness.load_baseline("/does/not/exist/baseline.json"))
+
+    def test_save_retains_thresholds(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "baseline.json")
+            harness.save_baseline(path, [harness.Measurement("a", 2.0, 10), harness.Measurement("b", 3.0, 10)],
+                                  previous={"a": {"time_per_op": 1.0, "threshold": 0.5}, "c": {"time_per_op": 4.0}})
+
+            self.assertEqual({
+                "a": {"time_per_op": 2.0, "threshold": 0.5},
+                "b": {"time_per_op": 3.0},
+                "c": {"time_per_op": 4.0}
+            }, harness.load_baseline(path))
+
+
+class RegressionTests(TestCase):
+    def test_detects_regressions_beyond_threshold(self):
+        baseline = {
+            "within-threshold": {"time_per_op": 1.0},
+            "beyond-threshold": {"time_per_op": 1.0},
+            "own-threshold": {"time_per_op": 1.0, "threshold": 1.0}
+        }
+        measurements = [
+            harness.Measurement("within-threshold", 1.2, 10),
+            harness.Measurement("beyond-threshold", 1.3, 10),
+            harness.Measurement("own-threshold", 1.9, 10),
+            harness.Measurement("no-baseline", 100.0, 10)
+        ]
+
+        r = harness.regressions(measurements, baseline, default_threshold=0.25)
+
+        self.assertEqual(["beyond-threshold"], [regression.name for regression in r])
+        self.assertAlmostEqual(0.3, r[0].change)
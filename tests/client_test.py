@@ -0,0 +1,83 @@
+import gzip
+from unittest import TestCase
+
+from esrally import client
+
+
+class BodyCompressorTests(TestCase):
+    def test_compresses_body(self):
+        compressor = client.BodyCompressor(level=1)
+        body = b'{"query": {"match_all": {}}}' * 10
+
+        compressed = compressor.compress(body)
+
+        self.assertIsInstance(compressed, client.CompressedBody)
+        self.assertEqual(body, gzip.decompress(compressed))
+        self.assertEqual(len(body), compressed.uncompressed_size)
+        self.assertLess(compressed.compression_ratio, 1.0)
+        self.assertGreaterEqual(compressed.compression_time, 0)
+
+    def test_does_not_compress_twice(self):
+        compressor = client.BodyCompressor()
+        compressed = compressor.compress(b"abc")
+
+        self.assertIs(compressed, compressor.compress(compressed))
+
+    def test_caches_recently_used_bodies(self):
+        compressor = client.BodyCompressor(cache_size=2)
+        a = compressor.compress(b"a")
+        b = compressor.compress(b"b")
+
+        self.assertIs(a, compressor.compress(b"a"))
+        # evicts "b" as "a" has been used more recently
+        compressor.compress(b"c")
+        self.assertIs(a, compressor.compress(b"a"))
+        self.assertIsNot(b, compressor.compress(b"b"))
+
+    def test_does_not_cache_large_bodies(self):
+        compressor = client.BodyCompressor()
+        body = b"a" * (client.BodyCompressor.MAX_CACHED_BODY_SIZE + 1)
+
+        self.assertIsNot(compressor.compress(body), compressor.compress(body))
+
+    def test_creates_compressor_from_client_options(self):
+        self.assertIsNone(client.body_compressor({}))
+        self.assertIsNone(client.body_compressor({"compressed": False}))
+
+        compressor = client.body_compressor({"compressed": True, "compression_level": 3, "compression_cache_size": 0})
+        self.assertEqual(3, compressor.level)
+        self.assertEqual(0, compressor.cache_size)
+
+
+class LazyJSONResponseTests(TestCase):
+    def test_decodes_on_first_access_only(self):
+        calls = []
+
+        def loads(s):
+            calls.append(s)
+            return {"took": 3, "errors": False}
+
+        response = client.LazyJSONResponse('{"took": 3, "errors": false}', loads)
+        self.assertFalse(response.decoded)
+
+        self.assertEqual(3, response["took"])
+        self.assertFalse(response.get("errors"))
+        self.assertEqual({"took", "errors"}, set(response.keys()))
+        self.assertTrue(response.decoded)
+        self.assertEqual(1, len(calls))
+
+    def test_serializer_defers_decoding(self):
+        response = client.LazyJSONSerializer().loads('{"acknowledged": true}')
+
+        self.assertIsInstance(response, client.LazyJSONResponse)
+        self.assertFalse(response.decoded)
+        self.assertEqual({"acknowledged": True}, dict(response))
+
+
+class EsClientFactoryTests(TestCase):
+    def test_decodes_lazily_only_for_load_generators(self):
+        load_generator = client.EsClientFactory([{"host": "localhost", "port": 9200}], {"lazy_responses": True}, load_generator=True)
+        admin = client.EsClientFactory([{"host": "localhost", "port": 9200}], {"lazy_responses": True})
+
+        self.assertIsInstance(load_generator.create().transport.serializer, client.LazyJSONSerializer)
+        self.assertNotIsInstance(admin.create().transport.serializer, client.LazyJSONSerializer)
@@ -0,0 +1,275 @@
+import asyncio
+import concurrent.futures
+import select
+import time
+import unittest.mock as mock
+from unittest import TestCase
+
+import thespian.actors
+from esrally import config, metrics, track
+from esrally.driver import driver, async_driver, runner
+from esrally.track import params
+
+
+class AsyncExecutorTests(TestCase):
+    def setUp(self):
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        self.test_track = track.Track(name="unittest", short_description="unittest track", description="unittest track",
+                                      source_root_url="http://example.org",
+                                      indices=None,
+                                      challenges=None)
+        self.loop = asyncio.new_event_loop()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.loop.close()
+        self.pool.shutdown()
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_execute_schedules_of_multiple_clients_concurrently(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+        task = track.Task(track.Operation("time-based", track.OperationType.Index.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action_metadata_present": True,
+            "size": 5
+        },
+                                          param_source="driver-test-param-source"),
+                          warmup_time_period=0, clients=2, target_throughput=None)
+
+        samplers = []
+        coroutines = []
+        for client_id in range(2):
+            sampler = driver.Sampler(client_id=client_id, operation=task.operation, start_timestamp=100)
+            samplers.append(sampler)
+            schedule = driver.schedule_for(self.test_track, task, client_id)
+            coroutines.append(async_driver.execute_schedule_async(schedule, es, sampler, self.pool))
+
+        tasks = [self.loop.create_task(coroutine) for coroutine in coroutines]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        for t in tasks:
+            # raises if the schedule has failed
+            t.result()
+
+        for client_id, sampler in enumerate(samplers):
+            samples = sampler.samples
+            self.assertEqual(5, len(samples))
+            for sample in samples:
+                self.assertEqual(client_id, sample.client_id)
+                self.assertEqual(metrics.SampleType.Normal, sample.sample_type)
+                # latency equals service time in throughput mode
+                self.assertEqual(sample.latency_ms, sample.service_time_ms)
+                self.assertEqual(1, sample.total_ops)
+                self.assertEqual("docs", sample.total_ops_unit)
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_throttles_throughput(self, es):
+        es.search.return_value = {}
+        task = track.Task(track.Operation("search", track.OperationType.Search.name, params={
+            "index": "unittest",
+            "type": "type",
+            "use_request_cache": False,
+            "body": {"query": {"match_all": {}}}
+        },
+                                          param_source="driver-test-param-source"),
+                          warmup_iterations=0, iterations=3, clients=1, target_throughput=50)
+        sampler = driver.Sampler(client_id=0, operation=task.operation, start_timestamp=100)
+        schedule = driver.schedule_for(self.test_track, task, 0)
+
+        self.loop.run_until_complete(async_driver.execute_schedule_async(schedule, es, sampler, self.pool))
+
+        samples = sampler.samples
+        self.assertEqual(3, len(samples))
+        # the last request is scheduled 40ms after the first one
+        self.assertGreaterEqual(samples[-1].time_period, 0.04)
+
+
+class AsyncScheduleTests(TestCase):
+    class NoopRunner(runner.Runner):
+        def __call__(self, es, params):
+            return 1, "ops"
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.operation = track.Operation("search", track.OperationType.Search.name)
+
+    def tearDown(self):
+        self.loop.close()
+        self.pool.shutdown()
+
+    def test_slow_params_of_one_client_do_not_delay_other_clients(self):
+        def slow_schedule():
+            for _ in range(2):
+                # e.g. reading a large bulk from a data file
+                time.sleep(0.5)
+                yield 0, False, metrics.SampleType.Normal, 0, AsyncScheduleTests.NoopRunner(), {}
+
+        def throttled_schedule():
+            for i in range(1, 6):
+                yield i * 0.05, True, metrics.SampleType.Normal, i / 5, AsyncScheduleTests.NoopRunner(), {}
+
+        slow_sampler = driver.Sampler(client_id=0, operation=self.operation, start_timestamp=0)
+        throttled_sampler = driver.Sampler(client_id=1, operation=self.operation, start_timestamp=0)
+        tasks = [self.loop.create_task(async_driver.execute_schedule_async(slow_schedule(), None, slow_sampler, self.pool)),
+                 self.loop.create_task(async_driver.execute_schedule_async(throttled_schedule(), None, throttled_sampler, self.pool))]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        for t in tasks:
+            t.result()
+
+        self.assertEqual(2, len(slow_sampler.samples))
+        samples = throttled_sampler.samples
+        self.assertEqual(5, len(samples))
+        for sample in samples:
+            self.assertLess(sample.schedule_lag_ms, 100)
+
+
+class ConcurrentClientsTests(TestCase):
+    def test_counts_clients_that_run_a_task_at_the_same_time(self):
+        task = track.Task(track.Operation("index", track.OperationType.Index.name), clients=2)
+        j0 = driver.JoinPoint(0)
+        j1 = driver.JoinPoint(1)
+        j2 = driver.JoinPoint(2)
+        allocations = {
+            0: [j0, task, j1, task, j2],
+            1: [j0, task, j1, None, j2],
+            2: [j0, None, j1, None, j2],
+        }
+        self.assertEqual(2, async_driver.concurrent_clients(allocations))
+
+    def test_needs_at_least_one_thread(self):
+        j0 = driver.JoinPoint(0)
+        self.assertEqual(1, async_driver.concurrent_clients({0: [j0, None, driver.JoinPoint(1)]}))
+        self.assertEqual(1, async_driver.concurrent_clients({}))
+
+
+class AsyncLoadGeneratorTests(TestCase):
+    def setUp(self):
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        self.test_track = track.Track(name="unittest", short_description="unittest track", description="unittest track",
+                                      source_root_url="http://example.org",
+                                      indices=None,
+                                      challenges=None)
+        self.cfg = config.Config()
+        self.cfg.add(config.Scope.application, "client", "hosts", [{"host": "localhost", "port": 9200}])
+        self.cfg.add(config.Scope.application, "client", "options", {})
+        self.task = track.Task(track.Operation("time-based", track.OperationType.Index.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action_metadata_present": True,
+            "size": 5
+        },
+                                               param_source="driver-test-param-source"),
+                               warmup_time_period=0, clients=2, target_throughput=None)
+        self.generator = async_driver.AsyncLoadGenerator()
+        self.generator.send = mock.Mock()
+        self.generator.wakeupAfter = mock.Mock()
+
+    def tearDown(self):
+        self.generator.receiveMessage(thespian.actors.ActorExitRequest(), "master")
+
+    def sent_messages(self, message_type):
+        return [c[0][1] for c in self.generator.send.call_args_list if isinstance(c[0][1], message_type)]
+
+    def wait_for_clients(self):
+        for c in self.generator.clients.values():
+            if c.future is not None:
+                c.future.result(timeout=10)
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_drives_clients_through_join_points(self, client_factory, load_track_plugins):
+        es = client_factory.return_value.create.return_value
+        es.bulk.return_value = {
+            "errors": False
+        }
+        allocations = {
+            0: [driver.JoinPoint(0), self.task, driver.JoinPoint(1)],
+            1: [driver.JoinPoint(0), self.task, driver.JoinPoint(1)]
+        }
+
+        self.generator.receiveMessage(async_driver.StartWorker(0, self.cfg, self.test_track, allocations), "master")
+
+        # all clients reach the first join point immediately
+        self.assertEqual([(0, driver.JoinPoint(0)), (1, driver.JoinPoint(0))],
+                         sorted((m.client_id, m.task) for m in self.sent_messages(driver.JoinPointReached)))
+        self.generator.send.reset_mock()
+
+        for client_id in allocations.keys():
+            self.generator.receiveMessage(driver.Drive(client_id, time.perf_counter()), "master")
+        self.wait_for_clients()
+        self.generator.receiveMessage(thespian.actors.WakeupMessage(async_driver.AsyncLoadGenerator.WAKEUP_INTERVAL_SECONDS), None)
+
+        self.assertEqual([], self.sent_messages(driver.BenchmarkFailure))
+        self.assertEqual([(0, driver.JoinPoint(1)), (1, driver.JoinPoint(1))],
+                         sorted((m.client_id, m.task) for m in self.sent_messages(driver.JoinPointReached)))
+        for m in self.sent_messages(driver.JoinPointReached):
+            self.assertEqual({"time-based": 5}, m.sample_buffer_high_water_marks)
+        for client_id in allocations.keys():
+            self.assertEqual(5, sum(len(m.samples) for m in self.sent_messages(driver.UpdateSamples) if m.client_id == client_id))
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_continues_as_soon_as_a_client_has_finished(self, client_factory, load_track_plugins):
+        es = client_factory.return_value.create.return_value
+        es.bulk.return_value = {
+            "errors": False
+        }
+        allocations = {
+            0: [self.task, driver.JoinPoint(0)]
+        }
+
+        watch = self.generator.receiveMessage(async_driver.StartWorker(0, self.cfg, self.test_track, allocations), "master")
+        self.assertIsInstance(watch, thespian.actors.ThespianWatch)
+        readable, _, _ = select.select(watch.filenos, [], [], 10)
+        # no need to wait for the next periodic wakeup
+        self.assertIsNone(self.generator.receiveMessage(thespian.actors.WatchMessage(readable), None))
+
+        self.assertEqual([driver.JoinPoint(0)], [m.task for m in self.sent_messages(driver.JoinPointReached)])
+        self.assertEqual(5, sum(len(m.samples) for m in self.sent_messages(driver.UpdateSamples)))
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_replies_to_clock_synchronization(self, client_factory, load_track_plugins):
+        self.generator.receiveMessage(async_driver.StartWorker(1, self.cfg, self.test_track, {0: [driver.JoinPoint(0)]}), "master")
+        self.generator.receiveMessage(driver.SynchronizeClock(1, 42.0), "master")
+
+        reading, = self.sent_messages(driver.ClockReading)
+        self.assertEqual(1, reading.worker_id)
+        self.assertEqual(42.0, reading.master_timestamp)
+        self.assertLessEqual(reading.received_timestamp, reading.sent_timestamp)
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_reports_failure_only_once(self, client_factory, load_track_plugins):
+        es = client_factory.return_value.create.return_value
+        es.bulk.side_effect = ValueError("unexpected")
+        allocations = {
+            0: [self.task, driver.JoinPoint(0)]
+        }
+
+        self.generator.receiveMessage(async_driver.StartWorker(0, self.cfg, self.test_track, allocations), "master")
+        with self.assertRaises(ValueError):
+            self.wait_for_clients()
+        wakeup = thespian.actors.WakeupMessage(async_driver.AsyncLoadGenerator.WAKEUP_INTERVAL_SECONDS)
+        self.generator.receiveMessage(wakeup, None)
+        self.generator.receiveMessage(wakeup, None)
+
+        self.assertEqual(1, len(self.sent_messages(driver.BenchmarkFailure)))
+
+
+class DriverTestParamSource:
+    def __init__(self, indices=None, params=None):
+        if params is None:
+            params = {}
+        self._indices = indices
+        self._params = params
+
+    def partition(self, partition_index, total_partitions):
+        return self
+
+    def size(self):
+        return self._params["size"] if "size" in self._params else 1
+
+    def params(self):
+        return self._params
@@ -1,9 +1,17 @@
+import concurrent.futures
+import datetime
+import os
+import pickle
+import select
+import time
 import unittest.mock as mock
 from unittest import TestCase
 
-from esrally import metrics, track
+import elasticsearch
+import thespian.actors
+from esrally import config, exceptions, metrics, track, client
 from esrally.utils import io
-from esrally.driver import driver
+from esrally.driver import driver, runner
 from esrally.track import params
 
 
@@ -27,7 +35,7 @@ class DriverTestParamSource:
 class ScheduleTestCase(TestCase):
     def assert_schedule(self, expected_schedule, schedule):
         idx = 0
-        for invocation_time, sample_type, progress_percent, runner, params in schedule:
+        for invocation_time, throttled, sample_type, progress_percent, runner, params in schedule:
             exp_invocation_time, exp_sample_type, exp_progress_percent, exp_params = expected_schedule[idx]
             self.assertAlmostEqual(exp_invocation_time, invocation_time, msg="Expected invocation time does not match")
             self.assertEqual(exp_sample_type, sample_type, "Sample type does not match")
@@ -160,6 +168,541 @@ class AllocatorTests(TestCase):
         self.assertEqual([{op1, op2, op3}], allocator.operations_per_joinpoint)
 
 
+class SamplerTests(TestCase):
+    def test_records_histograms_and_resets_them_on_read(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        sampler.add(metrics.SampleType.Warmup, None, 20, 10, 1, "docs", 1, 0.5)
+        sampler.add(metrics.SampleType.Normal, None, 8, 4, 1, "docs", 2, 1.0)
+
+        histograms = sampler.histograms
+        self.assertEqual(4, len(histograms))
+        self.assertEqual(20, histograms[("index", "latency", metrics.SampleType.Warmup)].max)
+        self.assertEqual(4, histograms[("index", "service_time", metrics.SampleType.Normal)].max)
+        self.assertEqual({}, sampler.histograms)
+
+    def test_records_compression_of_precompressed_bodies(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        body = client.CompressedBody(b"compressed", uncompressed_size=40, compression_time=0.002)
+
+        driver.record_sample(sampler, metrics.SampleType.Normal, 1.0, (1, "docs", None), total_start=0,
+                             absolute_expected_schedule_time=0, throughput_throttled=False, start=1, stop=2, params={"body": body})
+
+        histograms = sampler.histograms
+        self.assertEqual(2, histograms[("index", "compression_time", metrics.SampleType.Normal)].max)
+        self.assertEqual(0.25, histograms[("index", "compression_ratio", metrics.SampleType.Normal)].max)
+
+    def test_records_serialization_of_preserialized_bodies(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        body = client.CompressedBody(b"compressed", uncompressed_size=2 * 1024 * 1024, compression_time=0.002)
+
+        driver.record_sample(sampler, metrics.SampleType.Normal, 1.0, (1, "docs", None), total_start=0,
+                             absolute_expected_schedule_time=0, throughput_throttled=False, start=1, stop=2,
+                             params={"body": body, "serialization-time": 0.5})
+
+        histograms = sampler.histograms
+        # the size is measured before compression
+        self.assertAlmostEqual(2048, histograms[("index", "serialized_size", metrics.SampleType.Normal)].max, delta=2)
+        self.assertAlmostEqual(4, histograms[("index", "serialization_throughput", metrics.SampleType.Normal)].max, delta=0.01)
+
+    def test_never_drops_samples(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=3, operation=op, start_timestamp=0, buffer_size=4)
+        for i in range(10):
+            sampler.add(metrics.SampleType.Normal, {"bulk-size": i}, i, i / 2, 1000, "docs", i, i / 10)
+
+        samples = sampler.samples
+        self.assertEqual(10, len(samples))
+        self.assertEqual(10, sampler.high_water_mark)
+        for i, sample in enumerate(samples):
+            self.assertEqual(3, sample.client_id)
+            self.assertEqual(op, sample.operation)
+            self.assertEqual(metrics.SampleType.Normal, sample.sample_type)
+            self.assertEqual({"bulk-size": i}, sample.request_meta_data)
+            self.assertEqual(i, sample.latency_ms)
+            self.assertEqual(i / 2, sample.service_time_ms)
+            self.assertEqual(1000, sample.total_ops)
+            self.assertEqual("docs", sample.total_ops_unit)
+            self.assertEqual(i, sample.time_period)
+            self.assertEqual(i / 10, sample.percent_completed)
+
+        # buffer is empty after it has been drained
+        self.assertEqual([], sampler.samples)
+        sampler.add(metrics.SampleType.Warmup, None, 1, 1, 1, "ops", 1, 1)
+        self.assertEqual(1, len(sampler.samples))
+        self.assertEqual(10, sampler.high_water_mark)
+
+
+    def test_records_schedule_lag_only_for_throttled_requests(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        sampler.add(metrics.SampleType.Normal, None, 8, 4, 1, "docs", 1, 0.5, schedule_lag_ms=0.25)
+        sampler.add(metrics.SampleType.Normal, None, 8, 4, 1, "docs", 2, 1.0)
+
+        histograms = sampler.histograms
+        self.assertEqual(1, histograms[("index", "schedule_lag", metrics.SampleType.Normal)].total_count)
+        samples = pickle.loads(pickle.dumps(sampler.packed_samples)).unpack(op)
+        self.assertEqual(0.25, samples[0].schedule_lag_ms)
+        self.assertIsNone(samples[1].schedule_lag_ms)
+
+    def test_compacts_schedule_lag_of_unthrottled_requests(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        for i in range(10):
+            sampler.add(metrics.SampleType.Normal, None, i, i, 1, "docs", i, i / 10)
+
+        packed = sampler.packed_samples
+        self.assertEqual(8, len(packed.columns[8]))
+        self.assertEqual([None] * 10, [sample.schedule_lag_ms for sample in packed.unpack(op)])
+
+
+class PackedSamplesTests(TestCase):
+    def test_pack_and_unpack(self):
+        op = track.Operation("index", track.OperationType.Index, params={"bulk-size": 5000}, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=2, operation=op, start_timestamp=0)
+        sampler.add(metrics.SampleType.Warmup, None, 12.5, 10.0, 5000, "docs", 1.5, 0.25)
+        sampler.add(metrics.SampleType.Normal, {"success": True, "error-count": 0}, 8, 4, 2.5, "MB", 2.5, 0.5)
+        sampler.add(metrics.SampleType.Normal, {"success": False, "error-count": 3}, 9, 5, 5000, "docs", 3.5, 1.0)
+
+        packed = pickle.loads(pickle.dumps(sampler.packed_samples))
+        self.assertEqual(3, len(packed))
+        self.assertEqual("index", packed.operation_name)
+        self.assertEqual(["docs", "MB"], packed.units)
+        self.assertEqual([("success", "error-count")], packed.meta_data_keys)
+        # all meta data are stored in typed columns
+        self.assertEqual([], packed.meta_data_values)
+        self.assertEqual([0, 3], packed.meta_data_columns["error-count"].tolist())
+
+        samples = packed.unpack(op)
+        self.assertEqual(3, len(samples))
+        self.assertEqual(metrics.SampleType.Warmup, samples[0].sample_type)
+        self.assertIsNone(samples[0].request_meta_data)
+        self.assertEqual(12.5, samples[0].latency_ms)
+        self.assertEqual(5000, samples[0].total_ops)
+        self.assertEqual("docs", samples[0].total_ops_unit)
+        self.assertEqual(2.5, samples[1].total_ops)
+        self.assertEqual("MB", samples[1].total_ops_unit)
+        self.assertEqual({"success": True, "error-count": 0}, samples[1].request_meta_data)
+        self.assertEqual({"success": False, "error-count": 3}, samples[2].request_meta_data)
+        for sample in samples:
+            self.assertEqual(2, sample.client_id)
+            self.assertEqual(op, sample.operation)
+
+    def test_stores_unexpected_meta_data_values_as_is(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        sampler.add(metrics.SampleType.Normal, {"success": "yes", "error-count": 2 ** 40}, 8, 4, 1, "docs", 1, 0.5)
+        sampler.add(metrics.SampleType.Normal, {"success": True, "error-count": 2}, 8, 4, 1, "docs", 2, 1.0)
+
+        packed = pickle.loads(pickle.dumps(sampler.packed_samples))
+        self.assertEqual(["yes", 2 ** 40], packed.meta_data_values)
+        self.assertEqual([{"success": "yes", "error-count": 2 ** 40}, {"success": True, "error-count": 2}], list(packed.meta_data()))
+
+    def test_compacts_constant_columns(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        for i in range(10):
+            sampler.add(metrics.SampleType.Normal, {"success": True, "success-count": 5000, "error-count": 0}, i, i, 5000, "docs", i,
+                        i / 10)
+
+        packed = pickle.loads(pickle.dumps(sampler.packed_samples))
+        # sample type and total ops
+        self.assertEqual(1, len(packed.columns[2]))
+        self.assertEqual(8, len(packed.columns[5]))
+        self.assertEqual(1, len(packed.meta_data_columns["success-count"]))
+        samples = packed.unpack(op)
+        self.assertEqual(10, len(samples))
+        for i, sample in enumerate(samples):
+            self.assertEqual(i, sample.latency_ms)
+            self.assertEqual(metrics.SampleType.Normal, sample.sample_type)
+            self.assertEqual(5000, sample.total_ops)
+            self.assertEqual("docs", sample.total_ops_unit)
+            self.assertEqual({"success": True, "success-count": 5000, "error-count": 0}, sample.request_meta_data)
+
+    def test_packed_samples_are_smaller_than_raw_samples(self):
+        op = track.Operation("index", track.OperationType.Index, params={"bulk-size": 5000, "body": ["doc"] * 100},
+                             param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        for i in range(1000):
+            sampler.add(metrics.SampleType.Normal, {"success": True, "success-count": 5000, "error-count": 0}, i, i, 5000, "docs", i,
+                        i / 1000)
+        packed = sampler.packed_samples
+
+        self.assertLess(len(pickle.dumps(packed)) * 2, len(pickle.dumps(packed.unpack(op))))
+
+
+class AggregatingSamplerTests(TestCase):
+    def test_aggregates_samples_per_second(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.AggregatingSampler(client_id=1, operation=op, start_timestamp=0)
+        for i in range(10):
+            sampler.add(metrics.SampleType.Normal, {"success": i % 5 != 0}, 2 * i, i, 1000, "docs", i, i / 10)
+
+        summaries = sampler.samples
+        self.assertEqual(10, sum([s.count for s in summaries]))
+        self.assertEqual(10000, sum([s.total_ops for s in summaries]))
+        self.assertEqual(2, sum([s.error_count for s in summaries]))
+        self.assertEqual(18, max([s.latency_ms_max for s in summaries]))
+        last = summaries[-1]
+        self.assertEqual(1, last.client_id)
+        self.assertEqual(op, last.operation)
+        self.assertEqual("docs", last.total_ops_unit)
+        self.assertEqual(9, last.time_period)
+        self.assertEqual(0.9, last.percent_completed)
+        # histograms are recorded as usual
+        self.assertEqual(10, sampler.histograms[("index", "latency", metrics.SampleType.Normal)].total_count)
+        self.assertEqual([], sampler.samples)
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_counts_transport_errors(self, es):
+        def failing_runner(es, params):
+            raise elasticsearch.TransportError(500, "Internal Server Error")
+
+        op = track.Operation("search", track.OperationType.Search, param_source="driver-test-param-source")
+        sampler = driver.AggregatingSampler(client_id=0, operation=op, start_timestamp=0)
+        total_ops, total_ops_unit, request_meta_data = driver.execute_single(runner.DelegatingRunner(failing_runner), es, {})
+        sampler.add(metrics.SampleType.Normal, request_meta_data, 10, 5, total_ops, total_ops_unit, 1, 0.5)
+        sampler.add(metrics.SampleType.Normal, None, 10, 5, 1, "ops", 2, 1.0)
+
+        summaries = sampler.samples
+        self.assertEqual(2, sum([s.count for s in summaries]))
+        self.assertEqual(1, sum([s.error_count for s in summaries]))
+
+
+class ClientPackingTests(TestCase):
+    def test_packs_clients_round_robin(self):
+        self.assertEqual([[0, 3, 6], [1, 4], [2, 5]], driver.pack_clients(num_clients=7, num_workers=3))
+
+    def test_never_creates_idle_workers(self):
+        self.assertEqual([[0], [1]], driver.pack_clients(num_clients=2, num_workers=8))
+
+
+class LoadDriverHostsTests(TestCase):
+    def test_coordinator_only(self):
+        self.assertEqual([None], driver.load_driver_requirements(["localhost"]))
+
+    def test_remote_hosts(self):
+        self.assertEqual([None, {"ip": "192.168.14.3"}, {"ip": "127.0.0.1", "Admin Port": 1901}],
+                         driver.load_driver_requirements(["localhost", "192.168.14.3", "127.0.0.1:1901"]))
+
+    def test_invalid_port(self):
+        with self.assertRaises(exceptions.SystemSetupError):
+            driver.load_driver_requirements(["192.168.14.3:abc"])
+
+    def test_requires_at_least_one_host(self):
+        with self.assertRaises(exceptions.SystemSetupError):
+            driver.load_driver_requirements([])
+
+    def test_capabilities_match(self):
+        capabilities = {"coordinator": False, "ip": "127.0.0.1", "Admin Port": 1901}
+        self.assertTrue(driver.capabilities_match(capabilities, None))
+        self.assertTrue(driver.capabilities_match(capabilities, {}))
+        self.assertTrue(driver.capabilities_match(capabilities, {"ip": "127.0.0.1"}))
+        self.assertTrue(driver.capabilities_match(capabilities, {"ip": "127.0.0.1", "Admin Port": 1901}))
+        self.assertFalse(driver.capabilities_match(capabilities, {"ip": "127.0.0.1", "Admin Port": 1902}))
+        self.assertFalse(driver.capabilities_match({"coordinator": True}, {"ip": "127.0.0.1"}))
+
+
+class LoadDriverDistributionTests(TestCase):
+    def create_driver(self, hosts):
+        cfg = config.Config()
+        cfg.add(config.Scope.application, "driver", "engine", "actor")
+        cfg.add(config.Scope.application, "driver", "load.driver.hosts", hosts)
+        d = driver.Driver()
+        d.config = cfg
+        d.track = "test-track"
+        d.number_of_clients = 3
+        d.allocations = [["task-0"], ["task-1"], ["task-2"]]
+        d.load_driver_requirements = driver.load_driver_requirements(hosts)
+        d.quiet = True
+        d.createActor = mock.Mock(side_effect=lambda actor_class, targetActorRequirements=None: "%s@%s" %
+                                  (actor_class.__name__, targetActorRequirements["ip"] if targetActorRequirements else "coordinator"))
+        d.send = mock.Mock()
+        d.wakeupAfter = mock.Mock()
+        return d
+
+    def test_spreads_clients_round_robin_across_hosts(self):
+        d = self.create_driver(["localhost", "192.168.14.3"])
+
+        d.start_load_generators()
+
+        self.assertEqual(["LoadGenerator@coordinator", "LoadGenerator@192.168.14.3", "LoadGenerator@coordinator"], d.drivers)
+        start_messages = [c[0][1] for c in d.send.call_args_list if isinstance(c[0][1], driver.StartLoadGenerator)]
+        # client ids are global across all hosts so each client still reads its own partition of the data set
+        self.assertEqual([0, 1, 2], [m.client_id for m in start_messages])
+        self.assertEqual(["task-0", "task-1", "task-2"], [m.tasks[0] for m in start_messages])
+        # clocks are synchronized right away
+        self.assertEqual([0, 1, 2], [c[0][1].worker_id for c in d.send.call_args_list if isinstance(c[0][1], driver.SynchronizeClock)])
+
+    def test_starts_load_generators_after_track_is_prepared_on_all_remote_hosts(self):
+        d = self.create_driver(["192.168.14.3", "192.168.14.4:1901", "192.168.14.4:1902"])
+        d.pending_track_preparations = 2
+
+        d.receiveMessage(driver.TrackPrepared("host-a"), "preparator-a")
+        # one host is still preparing the track
+        self.assertEqual([], d.drivers)
+        d.receiveMessage(driver.TrackPrepared("host-b"), "preparator-b")
+
+        self.assertEqual(["LoadGenerator@192.168.14.3", "LoadGenerator@192.168.14.4", "LoadGenerator@192.168.14.4"], d.drivers)
+        # preparation actors are terminated as soon as they are done (ActorExitRequest does not compare equal to mock.ANY)
+        exit_requests = [c[0][0] for c in d.send.call_args_list if isinstance(c[0][1], thespian.actors.ActorExitRequest)]
+        self.assertEqual(["preparator-a", "preparator-b"], exit_requests)
+
+
+class SampleBufferHighWaterMarkTests(TestCase):
+    def test_master_stores_maximum_high_water_mark_per_operation(self):
+        op = track.Operation("index", track.OperationType.Index.name, param_source="driver-test-param-source")
+        d = driver.Driver()
+        d.number_of_clients = 3
+        d.operations = {"index": op}
+        d.sample_log = mock.Mock()
+        d.metrics_store = mock.Mock()
+
+        d.receiveMessage(driver.JoinPointReached(0, driver.JoinPoint(0), {"index": 10}), "client-0")
+        d.receiveMessage(driver.JoinPointReached(1, driver.JoinPoint(0), {"index": 25}), "client-1")
+        self.assertEqual({"index": 25}, d.sample_buffer_high_water_marks)
+
+        d.post_process_samples()
+        d.metrics_store.put_count_cluster_level.assert_called_once_with("sample_buffer_high_water_mark", 25, "samples",
+                                                                         operation="index", operation_type=track.OperationType.Index.name)
+
+    def test_no_high_water_mark_without_sampler(self):
+        self.assertIsNone(driver.sample_buffer_high_water_marks(None))
+
+
+class JoinPointTests(TestCase):
+    def create_driver(self, task_pause=5, client_workers=None):
+        d = driver.Driver()
+        d.send = mock.Mock()
+        d.quiet = True
+        d.metrics_store = mock.Mock()
+        d.number_of_clients = 2
+        d.number_of_steps = 2
+        d.drivers = ["client-0", "client-1"]
+        d.workers = list(d.drivers)
+        d.client_workers = client_workers or [0, 1]
+        d.task_pause = task_pause
+        return d
+
+    def sent_messages(self, d, message_type):
+        return [c[0][1] for c in d.send.call_args_list if isinstance(c[0][1], message_type)]
+
+    def reach_join_point(self, d, clock_offsets=None):
+        clock_offsets = clock_offsets or {}
+        d.receiveMessage(driver.JoinPointReached(0, driver.JoinPoint(0)), "client-0")
+        d.receiveMessage(driver.JoinPointReached(1, driver.JoinPoint(0)), "client-1")
+        # answer all clock synchronization requests like load generators with the given offsets would do
+        answered = 0
+        while len(self.sent_messages(d, driver.SynchronizeClock)) > answered:
+            m = self.sent_messages(d, driver.SynchronizeClock)[answered]
+            answered += 1
+            reading = driver.ClockReading(m.worker_id, m.master_timestamp, time.perf_counter() + clock_offsets.get(m.worker_id, 0))
+            reading.sent_timestamp = reading.received_timestamp
+            d.receiveMessage(reading, d.workers[m.worker_id])
+        return self.sent_messages(d, driver.Drive)
+
+    def test_starts_next_task_after_pause(self):
+        d = self.create_driver(task_pause=60)
+        now = time.perf_counter()
+        drive_messages = self.reach_join_point(d)
+        self.assertEqual(2, len(drive_messages))
+        for m in drive_messages:
+            self.assertGreater(m.client_start_timestamp, now + 59)
+
+    def test_starts_next_task_immediately_without_pause(self):
+        d = self.create_driver(task_pause=0)
+        drive_messages = self.reach_join_point(d)
+        self.assertEqual([0, 1], [m.client_id for m in drive_messages])
+        for m in drive_messages:
+            self.assertLessEqual(m.client_start_timestamp, time.perf_counter())
+
+    def test_waits_for_clock_synchronization(self):
+        d = self.create_driver()
+        d.receiveMessage(driver.JoinPointReached(0, driver.JoinPoint(0)), "client-0")
+        d.receiveMessage(driver.JoinPointReached(1, driver.JoinPoint(0)), "client-1")
+
+        self.assertEqual([0, 1], [m.worker_id for m in self.sent_messages(d, driver.SynchronizeClock)])
+        self.assertEqual([], self.sent_messages(d, driver.Drive))
+
+    def test_converts_start_timestamp_to_clock_of_each_load_generator(self):
+        d = self.create_driver(task_pause=0)
+        now = time.perf_counter()
+        drive_messages = self.reach_join_point(d, clock_offsets={0: 1000, 1: -1000})
+
+        client_0, client_1 = drive_messages
+        self.assertAlmostEqual(now + 1000, client_0.client_start_timestamp, delta=1)
+        self.assertAlmostEqual(now - 1000, client_1.client_start_timestamp, delta=1)
+        self.assertAlmostEqual(1000, d.clock_offsets[0].offset, delta=0.1)
+        # one metrics record for offset and uncertainty of each load generator
+        self.assertEqual(4, d.metrics_store.put_value_cluster_level.call_count)
+        d.metrics_store.put_value_cluster_level.assert_any_call("clock_offset", mock.ANY, "ms", meta_data={"load_generator": 1})
+
+    def test_clients_on_same_worker_share_clock_offset(self):
+        d = self.create_driver(task_pause=0, client_workers=[0, 0])
+        d.workers = ["worker-0"]
+        d.drivers = ["worker-0", "worker-0"]
+        now = time.perf_counter()
+        drive_messages = self.reach_join_point(d, clock_offsets={0: 1000})
+
+        for m in drive_messages:
+            self.assertAlmostEqual(now + 1000, m.client_start_timestamp, delta=1)
+
+
+class ClockOffsetEstimatorTests(TestCase):
+    def test_estimates_offset_of_symmetric_round_trip(self):
+        e = driver.ClockOffsetEstimator(round_trips=1)
+        # load generator clock is ahead by 100 seconds, each direction takes 2 seconds and processing takes 1 second
+        e.add(master_sent=10, generator_received=112, generator_sent=113, master_received=15)
+        self.assertTrue(e.done)
+        self.assertEqual(100, e.offset)
+        self.assertEqual(2, e.uncertainty)
+
+    def test_chooses_round_trip_with_shortest_delay(self):
+        e = driver.ClockOffsetEstimator(round_trips=3)
+        # the request has been queued for 8 seconds
+        e.add(master_sent=10, generator_received=120, generator_sent=121, master_received=23)
+        self.assertFalse(e.done)
+        e.add(master_sent=30, generator_received=130.5, generator_sent=131, master_received=31.5)
+        e.add(master_sent=40, generator_received=143, generator_sent=144, master_received=47)
+        self.assertTrue(e.done)
+        self.assertEqual(100, e.offset)
+        self.assertEqual(0.5, e.uncertainty)
+
+
+class LoadGeneratorTests(TestCase):
+    def setUp(self):
+        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
+        self.test_track = track.Track(name="unittest", short_description="unittest track", description="unittest track",
+                                      source_root_url="http://example.org",
+                                      indices=None,
+                                      challenges=None)
+        self.cfg = config.Config()
+        self.cfg.add(config.Scope.application, "client", "hosts", [{"host": "localhost", "port": 9200}])
+        self.cfg.add(config.Scope.application, "client", "options", {})
+        self.task = track.Task(track.Operation("time-based", track.OperationType.Index.name, params={
+            "body": ["action_metadata_line", "index_line"],
+            "action_metadata_present": True,
+            "size": 5
+        },
+                                               param_source="driver-test-param-source"),
+                               warmup_time_period=0, clients=1, target_throughput=None)
+        self.generator = driver.LoadGenerator()
+        self.generator.send = mock.Mock()
+        self.generator.wakeupAfter = mock.Mock()
+
+    def tearDown(self):
+        self.generator.receiveMessage(thespian.actors.ActorExitRequest(), "master")
+        self.generator.pool.shutdown()
+
+    def sent_messages(self, message_type):
+        return [c[0][1] for c in self.generator.send.call_args_list if isinstance(c[0][1], message_type)]
+
+    def wait_for_notification(self, watch):
+        self.assertIsInstance(watch, thespian.actors.ThespianWatch)
+        readable, _, _ = select.select(watch.filenos, [], [], 10)
+        self.assertEqual(watch.filenos, readable)
+        return thespian.actors.WatchMessage(readable)
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_continues_as_soon_as_task_is_finished(self, client_factory, load_track_plugins):
+        es = client_factory.return_value.create.return_value
+        es.bulk.return_value = {
+            "errors": False
+        }
+        tasks = [self.task, driver.JoinPoint(0)]
+
+        watch = self.generator.receiveMessage(driver.StartLoadGenerator(0, self.cfg, self.test_track, tasks), "master")
+        self.generator.receiveMessage(self.wait_for_notification(watch), None)
+
+        self.assertEqual([], self.sent_messages(driver.BenchmarkFailure))
+        join_points = self.sent_messages(driver.JoinPointReached)
+        self.assertEqual([driver.JoinPoint(0)], [m.task for m in join_points])
+        self.assertEqual(5, sum(len(m.samples) for m in self.sent_messages(driver.UpdateSamples)))
+        # only one periodic wakeup for sending samples
+        self.generator.wakeupAfter.assert_called_once_with(datetime.timedelta(seconds=driver.LoadGenerator.WAKEUP_INTERVAL_SECONDS))
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_replies_to_clock_synchronization(self, client_factory, load_track_plugins):
+        self.generator.receiveMessage(driver.StartLoadGenerator(0, self.cfg, self.test_track, [driver.JoinPoint(0)]), "master")
+        before = time.perf_counter()
+        self.generator.receiveMessage(driver.SynchronizeClock(3, 42.0), "master")
+
+        reading, = self.sent_messages(driver.ClockReading)
+        self.generator.send.assert_called_with("master", reading)
+        self.assertEqual(3, reading.worker_id)
+        self.assertEqual(42.0, reading.master_timestamp)
+        self.assertLessEqual(before, reading.received_timestamp)
+        self.assertLessEqual(reading.received_timestamp, reading.sent_timestamp)
+
+    @mock.patch("esrally.track.load_track_plugins")
+    @mock.patch("esrally.client.EsClientFactory")
+    def test_starts_task_at_client_start_timestamp(self, client_factory, load_track_plugins):
+        es = client_factory.return_value.create.return_value
+        es.bulk.return_value = {
+            "errors": False
+        }
+        tasks = [driver.JoinPoint(0), self.task, driver.JoinPoint(1)]
+        self.generator.receiveMessage(driver.StartLoadGenerator(0, self.cfg, self.test_track, tasks), "master")
+
+        start = time.perf_counter() + 0.05
+        watch = self.generator.receiveMessage(driver.Drive(0, start), "master")
+        self.generator.receiveMessage(self.wait_for_notification(watch), None)
+
+        samples = self.sent_messages(driver.UpdateSamples)[0].samples.unpack(self.task.operation)
+        self.assertGreaterEqual(samples[0].relative_time + self.generator.start_timestamp, start)
+        self.assertEqual([driver.JoinPoint(0), driver.JoinPoint(1)], [m.task for m in self.sent_messages(driver.JoinPointReached)])
+
+
+class HostLocatingActor(thespian.actors.Actor):
+    @staticmethod
+    def actorSystemCapabilityCheck(capabilities, requirements):
+        return driver.capabilities_match(capabilities, requirements)
+
+    def receiveMessage(self, msg, sender):
+        if msg == "where":
+            self.send(sender, os.getpid())
+
+
+class MultipleActorSystemsTests(TestCase):
+    COORDINATOR_PORT = 19170
+    LOAD_DRIVER_PORT = 19171
+
+    def test_creates_actors_on_load_driver_host_on_same_machine(self):
+        try:
+            coordinator = thespian.actors.ActorSystem("multiprocTCPBase",
+                                                      capabilities={"coordinator": True,
+                                                                    "Admin Port": MultipleActorSystemsTests.COORDINATOR_PORT},
+                                                      transientUnique=True)
+        except Exception as e:
+            self.skipTest("Cannot start actor system: %s" % e)
+        load_driver = thespian.actors.ActorSystem("multiprocTCPBase",
+                                                  capabilities={"coordinator": False, "ip": "127.0.0.1",
+                                                                "Admin Port": MultipleActorSystemsTests.LOAD_DRIVER_PORT,
+                                                                "Convention Address.IPv4": "127.0.0.1:%d" %
+                                                                                           MultipleActorSystemsTests.COORDINATOR_PORT},
+                                                  transientUnique=True)
+        try:
+            local_actor = coordinator.createActor(HostLocatingActor)
+            requirements, = driver.load_driver_requirements(["127.0.0.1:%d" % MultipleActorSystemsTests.LOAD_DRIVER_PORT])
+            # the load driver host needs a moment to join the convention of the coordinator
+            remote_actor = None
+            deadline = time.time() + 20
+            while remote_actor is None and time.time() < deadline:
+                try:
+                    remote_actor = coordinator.createActor(HostLocatingActor, targetActorRequirements=requirements)
+                except thespian.actors.NoCompatibleSystemForActor:
+                    time.sleep(0.5)
+            self.assertIsNotNone(remote_actor, "load driver host has not joined the coordinator")
+            self.assertNotEqual(coordinator.ask(local_actor, "where", 10), coordinator.ask(remote_actor, "where", 10))
+        finally:
+            load_driver.shutdown()
+            coordinator.shutdown()
+
+
 class IndexManagementTests(TestCase):
     @mock.patch("elasticsearch.Elasticsearch")
     def test_setup_auto_managed_index(self, es):
@@ -202,39 +745,129 @@ class IndexManagementTests(TestCase):
         es.assert_not_called()
 
 
-class MetricsAggregationTests(TestCase):
-    def setUp(self):
-        params.register_param_source_for_name("driver-test-param-source", DriverTestParamSource)
-
-    def test_single_metrics_aggregation(self):
-        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
-
+class ThroughputCalculatorTests(TestCase):
+    SAMPLES = [
+        # absolute time, relative time, sample type, total ops, time period
+        (1000.5, 0.5, metrics.SampleType.Warmup, 1000, 0.5),
+        (1000.9, 0.9, metrics.SampleType.Warmup, 1000, 0.9),
+        (1001.2, 1.2, metrics.SampleType.Normal, 1000, 1.2),
+        # no request has finished between 1002 and 1003
+        (1003.1, 3.1, metrics.SampleType.Normal, 1000, 3.1),
+        (1003.6, 3.6, metrics.SampleType.Normal, 1000, 3.6),
+        (1004.0, 4.0, metrics.SampleType.Normal, 1000, 4.0)
+    ]
+
+    def calculator(self, samples):
+        calculator = driver.ThroughputCalculator()
+        for absolute_time, relative_time, sample_type, total_ops, time_period in samples:
+            calculator.add(absolute_time, relative_time, sample_type, total_ops, "docs", time_period)
+        return calculator
+
+    def test_calculates_windowed_throughput(self):
+        throughput = self.calculator(ThroughputCalculatorTests.SAMPLES).windowed_throughput()
+
+        # the request that finishes exactly at the end of the task is counted in the last bucket
+        self.assertEqual([
+            (1001, 1, metrics.SampleType.Warmup, 2000, "docs/s"),
+            (1002, 2, metrics.SampleType.Normal, 1000, "docs/s"),
+            (1003, 3, metrics.SampleType.Normal, 0, "docs/s"),
+            (1004, 4, metrics.SampleType.Normal, 3000, "docs/s")
+        ], throughput)
+
+    def test_calculates_cumulative_throughput(self):
+        throughput = self.calculator(ThroughputCalculatorTests.SAMPLES).cumulative_throughput()
+
+        self.assertEqual([
+            (1001, 1, metrics.SampleType.Warmup, 2000, "docs/s"),
+            (1002, 2, metrics.SampleType.Normal, 1500, "docs/s"),
+            (1003, 3, metrics.SampleType.Normal, 1000, "docs/s"),
+            (1004, 4, metrics.SampleType.Normal, 1500, "docs/s")
+        ], throughput)
+
+    def test_incomplete_last_bucket(self):
+        calculator = self.calculator(ThroughputCalculatorTests.SAMPLES + [(1004.5, 4.5, metrics.SampleType.Normal, 1000, 4.5)])
+
+        # the incomplete last bucket is omitted...
+        self.assertEqual((1004, 4, metrics.SampleType.Normal, 3000, "docs/s"), calculator.windowed_throughput()[-1])
+        # ... but the average throughput across the whole task is retained
+        cumulative = calculator.cumulative_throughput()
+        self.assertEqual([(1004, 4, metrics.SampleType.Normal, 1500, "docs/s"), (1004.5, 4.5, metrics.SampleType.Normal, 1555.5555555555557,
+                                                                                   "docs/s")], cumulative[-2:])
+        timestamps = [t[0] for t in cumulative]
+        self.assertEqual(sorted(set(timestamps)), timestamps)
+
+    def test_cumulative_throughput_is_equivalent_to_sample_based_calculation(self):
+        # previously, cumulative throughput was calculated at the point in time of each sample (at most once per second). For samples
+        # that finish at the end of a bucket, both calculations need to produce identical results.
         samples = [
-            driver.Sample(0, 1470838595, 21, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 1, 1 / 9),
-            driver.Sample(0, 1470838596, 22, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 2, 2 / 9),
-            driver.Sample(0, 1470838597, 23, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 3, 3 / 9),
-            driver.Sample(0, 1470838598, 24, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 4, 4 / 9),
-            driver.Sample(0, 1470838599, 25, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 5, 5 / 9),
-            driver.Sample(0, 1470838600, 26, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 6, 6 / 9),
-            driver.Sample(1, 1470838598.5, 24.5, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 4.5, 7 / 9),
-            driver.Sample(1, 1470838599.5, 25.5, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 5.5, 8 / 9),
-            driver.Sample(1, 1470838600.5, 26.5, op, metrics.SampleType.Normal, None, -1, -1, 5000, "docs", 6.5, 9 / 9)
+            (1470838595, 21, metrics.SampleType.Normal, 5000, 1),
+            (1470838596, 22, metrics.SampleType.Normal, 5000, 2),
+            (1470838597, 23, metrics.SampleType.Normal, 5000, 3),
+            (1470838598, 24, metrics.SampleType.Normal, 5000, 4),
+            (1470838599, 25, metrics.SampleType.Normal, 5000, 5),
+            (1470838600, 26, metrics.SampleType.Normal, 5000, 6),
+            (1470838598.5, 24.5, metrics.SampleType.Normal, 5000, 4.5),
+            (1470838599.5, 25.5, metrics.SampleType.Normal, 5000, 5.5),
+            (1470838600.5, 26.5, metrics.SampleType.Normal, 5000, 6.5)
         ]
+        throughput = self.calculator(samples).cumulative_throughput()
+
+        self.assertEqual([
+            (1470838595, 21, metrics.SampleType.Normal, 5000, "docs/s"),
+            (1470838596, 22, metrics.SampleType.Normal, 5000, "docs/s"),
+            (1470838597, 23, metrics.SampleType.Normal, 5000, "docs/s"),
+            (1470838598, 24, metrics.SampleType.Normal, 5000, "docs/s"),
+            (1470838599, 25, metrics.SampleType.Normal, 6000, "docs/s"),
+            (1470838600, 26, metrics.SampleType.Normal, 6666.666666666667, "docs/s"),
+            # the last (incomplete) bucket was not considered previously
+            (1470838600.5, 26.5, metrics.SampleType.Normal, 45000 / 6.5, "docs/s")
+        ], throughput)
+
+    def test_cumulative_throughput_of_summaries(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        calculator = driver.ThroughputCalculator()
+        for absolute_time, relative_time, time_period, ops in [(1470838595, 21, 1, 5000), (1470838596, 22, 2, 10000),
+                                                               (1470838597, 23, 3, 15000)]:
+            summary = driver.SampleSummary(0, op, metrics.SampleType.Normal, "docs")
+            summary.add(absolute_time, relative_time, None, 10, 10, ops, time_period, time_period / 3)
+            calculator.add(summary.absolute_time, summary.relative_time, summary.sample_type, summary.total_ops, summary.total_ops_unit,
+                           summary.time_period)
+
+        self.assertEqual([
+            (1470838595, 21, metrics.SampleType.Normal, 5000, "docs/s"),
+            (1470838596, 22, metrics.SampleType.Normal, 7500, "docs/s"),
+            (1470838597, 23, metrics.SampleType.Normal, 10000, "docs/s")
+        ], calculator.cumulative_throughput())
+
+    def test_order_of_samples_does_not_matter(self):
+        expected = self.calculator(ThroughputCalculatorTests.SAMPLES)
+        actual = self.calculator(reversed(ThroughputCalculatorTests.SAMPLES))
+
+        self.assertEqual(expected.windowed_throughput(), actual.windowed_throughput())
+        self.assertEqual(expected.cumulative_throughput(), actual.cumulative_throughput())
+
+    def test_single_incomplete_bucket(self):
+        calculator = driver.ThroughputCalculator()
+        calculator.add(1000.5, 0.5, metrics.SampleType.Normal, 100, "ops", 0.5)
+
+        self.assertEqual([(1000.5, 0.5, metrics.SampleType.Normal, 200, "ops/s")], calculator.windowed_throughput())
+        self.assertEqual([(1000.5, 0.5, metrics.SampleType.Normal, 200, "ops/s")], calculator.cumulative_throughput())
+
+    def test_add_packed_samples(self):
+        op = track.Operation("index", track.OperationType.Index, param_source="driver-test-param-source")
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+        for absolute_time, relative_time, sample_type, total_ops, time_period in ThroughputCalculatorTests.SAMPLES:
+            sampler.add(sample_type, None, 10, 10, total_ops, "docs", time_period, time_period / 4)
+        packed = sampler.packed_samples
+        calculator = driver.ThroughputCalculator()
+        for sample in packed.unpack(op):
+            calculator.add(sample.absolute_time, sample.relative_time, sample.sample_type, sample.total_ops, sample.total_ops_unit,
+                           sample.time_period)
+        packed_calculator = driver.ThroughputCalculator()
+        packed_calculator.add_packed(packed)
 
-        aggregated = driver.calculate_global_throughput(samples)
-
-        self.assertIn(op, aggregated)
-        self.assertEqual(1, len(aggregated))
-
-        throughput = aggregated[op]
-        self.assertEqual(6, len(throughput))
-        self.assertEqual((1470838595, 21, metrics.SampleType.Normal, 5000, "docs/s"), throughput[0])
-        self.assertEqual((1470838596, 22, metrics.SampleType.Normal, 5000, "docs/s"), throughput[1])
-        self.assertEqual((1470838597, 23, metrics.SampleType.Normal, 5000, "docs/s"), throughput[2])
-        self.assertEqual((1470838598, 24, metrics.SampleType.Normal, 5000, "docs/s"), throughput[3])
-        self.assertEqual((1470838599, 25, metrics.SampleType.Normal, 6000, "docs/s"), throughput[4])
-        self.assertEqual((1470838600, 26, metrics.SampleType.Normal, 6666.666666666667, "docs/s"), throughput[5])
-        # self.assertEqual((1470838600.5, 26.5, metrics.SampleType.Normal, 10000), throughput[6])
+        self.assertEqual(calculator.windowed_throughput(), packed_calculator.windowed_throughput())
+        self.assertEqual(calculator.cumulative_throughput(), packed_calculator.cumulative_throughput())
 
 
 class SchedulerTests(ScheduleTestCase):
@@ -262,6 +895,18 @@ class SchedulerTests(ScheduleTestCase):
         ]
         self.assert_schedule(expected_schedule, schedule)
 
+    def test_search_task_with_prefetched_params(self):
+        task = track.Task(track.Operation("search", track.OperationType.Search.name, param_source="driver-test-param-source"),
+                          warmup_iterations=1, iterations=2, clients=1, target_throughput=10)
+        schedule = driver.schedule_for(self.test_track, task, 0, prefetch_depth=2)
+
+        expected_schedule = [
+            (0, metrics.SampleType.Warmup, 1 / 3, {}),
+            (0.1, metrics.SampleType.Normal, 2 / 3, {}),
+            (0.2, metrics.SampleType.Normal, 3 / 3, {}),
+        ]
+        self.assert_schedule(expected_schedule, schedule)
+
     def test_search_task_two_clients(self):
         task = track.Task(track.Operation("search", track.OperationType.Search.name, param_source="driver-test-param-source"),
                           warmup_iterations=2, iterations=10, clients=2, target_throughput=10)
@@ -277,6 +922,30 @@ class SchedulerTests(ScheduleTestCase):
         ]
         self.assert_schedule(expected_schedule, schedule)
 
+    def test_search_task_two_clients_staggered(self):
+        task = track.Task(track.Operation("search", track.OperationType.Search.name, param_source="driver-test-param-source"),
+                          warmup_iterations=0, iterations=6, clients=2, target_throughput=10, schedule="staggered")
+        schedule = driver.schedule_for(self.test_track, task, 1)
+
+        expected_schedule = [
+            (0.1, metrics.SampleType.Normal, 1 / 3, {}),
+            (0.3, metrics.SampleType.Normal, 2 / 3, {}),
+            (0.5, metrics.SampleType.Normal, 3 / 3, {}),
+        ]
+        self.assert_schedule(expected_schedule, schedule)
+
+    def test_search_task_poisson_schedule_is_monotonic(self):
+        task = track.Task(track.Operation("search", track.OperationType.Search.name, param_source="driver-test-param-source"),
+                          warmup_iterations=0, iterations=100, clients=1, target_throughput=10, schedule="poisson")
+        schedule = driver.schedule_for(self.test_track, task, 0)
+
+        previous_invocation_time = -1
+        for invocation_time, throttled, sample_type, progress_percent, runner, params in schedule:
+            # also the first request at time zero is throttled
+            self.assertTrue(throttled)
+            self.assertTrue(previous_invocation_time <= invocation_time)
+            previous_invocation_time = invocation_time
+
     def test_schedule_for_warmup_time_based(self):
         task = track.Task(track.Operation("time-based", track.OperationType.Index.name, params={"body": ["a"], "size": 11},
                                           param_source="driver-test-param-source"),
@@ -308,8 +977,9 @@ class SchedulerTests(ScheduleTestCase):
 
         last_progress = -1
 
-        for invocation_time, sample_type, progress_percent, runner, params in invocations:
+        for invocation_time, throttled, sample_type, progress_percent, runner, params in invocations:
             # we're not throughput throttled
+            self.assertFalse(throttled)
             self.assertEqual(0, invocation_time)
             if progress_percent <= 0.5:
                 self.assertEqual(metrics.SampleType.Warmup, sample_type)
@@ -367,3 +1037,52 @@ class ExecutorTests(TestCase):
             self.assertEqual(1, sample.total_ops)
             self.assertEqual("docs", sample.total_ops_unit)
             self.assertEqual(1, sample.request_meta_data["bulk-size"])
+
+    def test_execute_schedule_records_schedule_lag_of_throttled_requests(self):
+        op = track.Operation("index", track.OperationType.Index.name, param_source="driver-test-param-source")
+        # any context manager that returns neither a tuple nor a dict counts as one operation
+        r = mock.MagicMock()
+        schedule = [(i * 0.01, True, metrics.SampleType.Normal, (i + 1) / 5, r, {}) for i in range(5)]
+        sampler = driver.Sampler(client_id=0, operation=op, start_timestamp=0)
+
+        driver.execute_schedule(schedule, None, sampler)
+
+        samples = sampler.samples
+        self.assertEqual(5, len(samples))
+        for sample in samples:
+            # requests are never issued before their scheduled time
+            self.assertGreaterEqual(sample.schedule_lag_ms, 0)
+            self.assertGreaterEqual(sample.latency_ms, sample.service_time_ms)
+        self.assertEqual(5, sampler.histograms[("index", "schedule_lag", metrics.SampleType.Normal)].total_count)
+
+
+class WaitUntilTests(TestCase):
+    def test_does_not_return_before_deadline(self):
+        for rest in [0, 0.0005, 0.005]:
+            deadline = time.perf_counter() + rest
+            driver.wait_until(deadline)
+            self.assertGreaterEqual(time.perf_counter(), deadline)
+
+    @mock.patch("time.sleep")
+    def test_only_spins_close_to_the_deadline(self, sleep):
+        deadline = time.perf_counter() + 0.05
+        driver.wait_until(deadline, spin_threshold=0.01)
+        self.assertEqual(1, sleep.call_count)
+        # we sleep until at most 10 ms before the deadline
+        self.assertLessEqual(sleep.call_args[0][0], 0.04)
+        self.assertGreaterEqual(time.perf_counter(), deadline)
+
+
+class TaskCompletionNotifierTests(TestCase):
+    def test_notifies_once_future_is_done(self):
+        notifier = driver.TaskCompletionNotifier()
+        future = concurrent.futures.Future()
+        notifier.notify_when_done(future)
+        fds = notifier.watch().filenos
+        self.assertEqual([], select.select(fds, [], [], 0)[0])
+
+        future.set_exception(ValueError("failed"))
+        self.assertEqual(fds, select.select(fds, [], [], 0)[0])
+        notifier.clear()
+        self.assertEqual([], select.select(fds, [], [], 0)[0])
+        notifier.close()
@@ -0,0 +1,111 @@
+import threading
+import time
+from unittest import TestCase
+
+from esrally import client
+from esrally.driver import prefetch
+
+
+class CountingParamSource:
+    def __init__(self, size=None, delay=0):
+        self._size = size
+        self.delay = delay
+        self.calls = 0
+        self.released = threading.Event()
+        self.released.set()
+
+    def size(self):
+        return self._size
+
+    def params(self):
+        self.released.wait()
+        if self.delay:
+            time.sleep(self.delay)
+        if self._size is not None and self.calls >= self._size:
+            raise StopIteration()
+        self.calls += 1
+        return {"call": self.calls}
+
+
+def wait_until(condition, timeout=5):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.001)
+    return condition()
+
+
+class PrefetchingParamSourceTests(TestCase):
+    def test_prefetches_up_to_depth(self):
+        source = CountingParamSource()
+        p = prefetch.PrefetchingParamSource(source, depth=3, name="search")
+
+        # the producer blocks as soon as three parameter sets are ready (one more is in flight)
+        self.assertTrue(wait_until(lambda: source.calls == 4))
+        time.sleep(0.01)
+        self.assertEqual(4, source.calls)
+        self.assertEqual({"call": 1}, p.params())
+        self.assertEqual([0, 0, 0, 1], p.queue_depths)
+        self.assertEqual({"call": 2}, p.params())
+        p.close()
+
+    def test_stops_at_limit(self):
+        source = CountingParamSource(size=10)
+        p = prefetch.PrefetchingParamSource(source, depth=8, limit=5)
+
+        self.assertEqual(10, p.size())
+        self.assertEqual([1, 2, 3, 4, 5], [p.params()["call"] for _ in range(5)])
+        p._producer.join(timeout=5)
+        self.assertFalse(p._producer.is_alive())
+        self.assertEqual(5, source.calls)
+        p.close()
+
+    def test_raises_errors_of_param_source(self):
+        source = CountingParamSource(size=2)
+        p = prefetch.PrefetchingParamSource(source, depth=4)
+
+        p.params()
+        p.params()
+        with self.assertRaises(StopIteration):
+            p.params()
+        p.close()
+
+    def test_records_waits_for_parameters(self):
+        source = CountingParamSource()
+        source.released.clear()
+        p = prefetch.PrefetchingParamSource(source, depth=2)
+        threading.Timer(0.05, source.released.set).start()
+
+        self.assertEqual({"call": 1}, p.params())
+        self.assertEqual(1, p.queue_depths[0])
+        self.assertGreater(p.wait_time, 0)
+        p.close()
+
+    def test_close_stops_producer(self):
+        source = CountingParamSource()
+        p = prefetch.PrefetchingParamSource(source, depth=2)
+        self.assertTrue(wait_until(lambda: source.calls == 3))
+
+        p.close()
+        p._producer.join(timeout=5)
+        self.assertFalse(p._producer.is_alive())
+
+    def test_compresses_serialized_bodies(self):
+        class BodyParamSource:
+            def params(self):
+                return {"body": b"index_line\n"}
+
+        p = prefetch.PrefetchingParamSource(BodyParamSource(), depth=1, limit=1, compressor=client.BodyCompressor())
+
+        body = p.params()["body"]
+        self.assertIsInstance(body, client.CompressedBody)
+        self.assertEqual(len(b"index_line\n"), body.uncompressed_size)
+        p.close()
+
+    def test_closing_closes_resource_when_schedule_is_exhausted(self):
+        source = CountingParamSource()
+        p = prefetch.PrefetchingParamSource(source, depth=1)
+
+        schedule = prefetch.closing(iter([1, 2]), p)
+        self.assertEqual([1, 2], list(schedule))
+        p._producer.join(timeout=5)
+        self.assertFalse(p._producer.is_alive())
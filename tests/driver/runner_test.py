@@ -1,6 +1,8 @@
+import json
 import unittest.mock as mock
 from unittest import TestCase
 
+from esrally import client
 from esrally.driver import runner
 
 
@@ -62,6 +64,49 @@ class BulkIndexRunnerTests(TestCase):
 
         es.bulk.assert_called_with(body=bulk_params["body"], index="test-index", type="test-type", params={})
 
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_serialized_body(self, es):
+        es.transport.perform_request.return_value = 200, {
+            "errors": False
+        }
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": b"action_meta_data\nindex_line\naction_meta_data\nindex_line\n",
+            "bulk-size": 2,
+            "action_metadata_present": True,
+            "pipeline": "test-pipeline"
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(2, result["weight"])
+        self.assertEqual(2, result["bulk-size"])
+        self.assertEqual(True, result["success"])
+
+        es.bulk.assert_not_called()
+        es.transport.perform_request.assert_called_with("POST", "/_bulk", params={"pipeline": "test-pipeline"}, body=bulk_params["body"])
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_serialized_body_without_metadata(self, es):
+        es.transport.perform_request.return_value = 200, {
+            "errors": False
+        }
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": b"index_line\nindex_line\nindex_line\n",
+            "bulk-size": 3,
+            "action_metadata_present": False,
+            "index": "test-index",
+            "type": "test-type"
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(3, result["weight"])
+        es.transport.perform_request.assert_called_with("POST", "/test-index/test-type/_bulk", params={}, body=bulk_params["body"])
+
     @mock.patch("elasticsearch.Elasticsearch")
     def test_bulk_index_error(self, es):
         es.bulk.return_value = {
@@ -107,3 +152,115 @@ class BulkIndexRunnerTests(TestCase):
         self.assertEqual(2, result["error-count"])
 
         es.bulk.assert_called_with(body=bulk_params["body"], params={})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_filtered_response(self, es):
+        es.bulk.return_value = {
+            "errors": False
+        }
+        bulk = runner.BulkIndex()
+
+        bulk_params = {
+            "body": [
+                "action_meta_data",
+                "index_line"
+            ],
+            "action_metadata_present": True,
+            "filter_response": True
+        }
+
+        result = bulk(es, bulk_params)
+
+        self.assertEqual(0, result["error-count"])
+        es.bulk.assert_called_with(body=bulk_params["body"], params={"filter_path": "errors,items.*.status"})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_does_not_decode_successful_lazy_response(self, es):
+        def loads(s):
+            raise AssertionError("response should not be decoded")
+
+        es.bulk.return_value = client.LazyJSONResponse('{"took":3,"errors":false,"items":[{"index":{"status":201}}]}', loads)
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {"body": ["action_meta_data", "index_line"], "action_metadata_present": True, "filter_response": True})
+
+        self.assertEqual(True, result["success"])
+        self.assertEqual(0, result["error-count"])
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_decodes_unfiltered_lazy_response(self, es):
+        raw = '{"took":3,"errors":true,"items":[{"index":{"_index":"test","status":201}},{"index":{"_index":"test","status":409}}]}'
+        es.bulk.return_value = client.LazyJSONResponse(raw, json.loads)
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {"body": ["action_meta_data", "index_line", "action_meta_data", "index_line"], "action_metadata_present": True})
+
+        self.assertTrue(es.bulk.return_value.decoded)
+        self.assertEqual(1, result["error-count"])
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_bulk_index_counts_errors_in_lazy_response(self, es):
+        def loads(s):
+            raise AssertionError("response should not be decoded")
+
+        es.bulk.return_value = client.LazyJSONResponse(
+            '{"errors":true,"items":[{"index":{"status":201}},'
+            '{"index":{"status":429,"error":{"type":"rejected","reason":"rejected \\"status\\":500"}}},'
+            '{"index":{"status":500}}]}', loads)
+        bulk = runner.BulkIndex()
+
+        result = bulk(es, {
+            "body": ["action_meta_data", "index_line", "action_meta_data", "index_line", "action_meta_data", "index_line"],
+            "action_metadata_present": True,
+            "filter_response": True
+        })
+
+        self.assertEqual(False, result["success"])
+        self.assertEqual(1, result["success-count"])
+        self.assertEqual(2, result["error-count"])
+
+
+class QueryRunnerTests(TestCase):
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_query_with_filtered_response(self, es):
+        query = runner.Query()
+
+        result = query(es, {
+            "index": "test-index",
+            "type": "test-type",
+            "use_request_cache": False,
+            "body": {"query": {"match_all": {}}},
+            "filter_response": True
+        })
+
+        self.assertEqual((1, "ops"), result)
+        es.search.assert_called_with(index="test-index", doc_type="test-type", request_cache=False, body={"query": {"match_all": {}}},
+                                     params={"filter_path": "took"})
+
+    @mock.patch("elasticsearch.Elasticsearch")
+    def test_scroll_query_ends_when_filtered_response_has_no_hits(self, es):
+        es.search.return_value = {
+            "_scroll_id": "some-scroll-id",
+            "hits": {
+                "hits": [{"_id": "1"}]
+            }
+        }
+        # a filtered response does not contain hits if there are none
+        es.scroll.return_value = {
+            "_scroll_id": "some-scroll-id"
+        }
+        query = runner.Query()
+
+        result = query(es, {
+            "index": "test-index",
+            "type": "test-type",
+            "use_request_cache": False,
+            "body": {"query": {"match_all": {}}},
+            "pages": 5,
+            "items_per_page": 100,
+            "filter_response": True
+        })
+
+        self.assertEqual((2, "ops"), result)
+        es.scroll.assert_called_with(scroll_id="some-scroll-id", scroll="10s", params={"filter_path": "_scroll_id,hits.hits._id"})
+        es.clear_scroll.assert_called_with(scroll_id="some-scroll-id")
@@ -0,0 +1,129 @@
+import math
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from esrally import metrics, track
+from esrally.driver import driver, samplelog
+
+
+class SampleLogTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "samples.bin")
+        self.index = track.Operation("index", track.OperationType.Index.name)
+        self.search = track.Operation("search", track.OperationType.Search.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append_and_read_in_chunks(self):
+        # use a small capacity so the log needs to grow
+        log = samplelog.SampleLog(self.path, capacity=2)
+        for i in range(5):
+            log.append(self.index, metrics.SampleType.Warmup if i < 2 else metrics.SampleType.Normal, 1000 + i, i, 10 + i, 5 + i, 5000,
+                       "docs", i + 0.5, {"success": True, "bulk-size": 5000} if i % 2 == 0 else None)
+        log.append(self.search, metrics.SampleType.Normal, 1010, 10, 2.5, 2, 1, "ops", 10, None)
+        log.close()
+
+        self.assertEqual(6, len(log))
+        all_chunks = list(log.chunks(chunk_size=4))
+        self.assertEqual(2, len(all_chunks))
+
+        first, = all_chunks[0]
+        self.assertEqual("index", first.operation_name)
+        self.assertEqual("Index", first.operation_type)
+        self.assertEqual([1000, 1001, 1002, 1003], list(first.absolute_time))
+        self.assertEqual([10, 11, 12, 13], list(first.latency_ms))
+        self.assertEqual([5, 6, 7, 8], list(first.service_time_ms))
+        self.assertEqual([0, 0, 1, 1], list(first.sample_type))
+        self.assertEqual(["docs"] * 4, first.units)
+        self.assertEqual([{"success": True, "bulk-size": 5000}, None, {"success": True, "bulk-size": 5000}, None], first.meta_data)
+
+        index, search = all_chunks[1]
+        self.assertEqual([1004], list(index.absolute_time))
+        self.assertEqual("search", search.operation_name)
+        self.assertEqual([2.5], list(search.latency_ms))
+        self.assertEqual(["ops"], search.units)
+        self.assertEqual([None], search.meta_data)
+
+    def test_append_packed_samples(self):
+        sampler = driver.Sampler(client_id=0, operation=self.index, start_timestamp=0)
+        sampler.add(metrics.SampleType.Normal, {"success": False}, 8, 4, 2.5, "MB", 2.5, 0.5)
+        sampler.add(metrics.SampleType.Normal, None, 9, 5, 5000, "docs", 3.5, 1.0)
+        log = samplelog.SampleLog(self.path)
+        log.append_packed(self.index, sampler.packed_samples)
+        log.close()
+
+        chunk, = next(log.chunks())
+        self.assertEqual([8, 9], list(chunk.latency_ms))
+        self.assertEqual([2.5, 5000], list(chunk.total_ops))
+        self.assertEqual(["MB", "docs"], chunk.units)
+        self.assertEqual([{"success": False}, None], chunk.meta_data)
+
+    def test_schedule_lag_of_unthrottled_samples_is_nan(self):
+        sampler = driver.Sampler(client_id=0, operation=self.index, start_timestamp=0)
+        sampler.add(metrics.SampleType.Normal, None, 8, 4, 1, "docs", 1, 0.5, schedule_lag_ms=0.5)
+        sampler.add(metrics.SampleType.Normal, None, 8, 4, 1, "docs", 2, 1.0)
+        log = samplelog.SampleLog(self.path)
+        log.append_packed(self.index, sampler.packed_samples)
+        log.append(self.index, metrics.SampleType.Normal, 1000, 3, 8, 4, 1, "docs", 3, None, schedule_lag_ms=0.75)
+        log.append(self.index, metrics.SampleType.Normal, 1001, 4, 8, 4, 1, "docs", 4, None)
+        log.close()
+
+        chunk, = next(log.chunks())
+        lags = list(chunk.schedule_lag_ms)
+        self.assertEqual([0.5, 0.75], [lags[0], lags[2]])
+        self.assertTrue(math.isnan(lags[1]))
+        self.assertTrue(math.isnan(lags[3]))
+
+    def test_append_many_packed_samples(self):
+        sampler = driver.Sampler(client_id=0, operation=self.index, start_timestamp=0)
+        for i in range(10):
+            meta_data = {"success": True, "success-count": 5000, "error-count": 0} if i % 2 == 0 else {"success": False, "error": "x"}
+            sampler.add(metrics.SampleType.Warmup if i < 3 else metrics.SampleType.Normal, meta_data, i, i / 2, 5000, "docs", i, i / 10)
+        # use a small capacity so the log needs to grow more than once for a single batch
+        log = samplelog.SampleLog(self.path, capacity=2)
+        log.append_packed(self.index, sampler.packed_samples)
+        log.close()
+
+        self.assertEqual(10, len(log))
+        # meta data keys are interned
+        self.assertEqual([("success", "success-count", "error-count"), ("success", "error")], log.meta_data_keys)
+        chunk, = next(log.chunks())
+        self.assertEqual(list(range(10)), list(chunk.latency_ms))
+        self.assertEqual([0] * 3 + [1] * 7, list(chunk.sample_type))
+        self.assertEqual({"success": True, "success-count": 5000, "error-count": 0}, chunk.meta_data[8])
+        self.assertEqual({"success": False, "error": "x"}, chunk.meta_data[9])
+
+        chunk, = next(log.chunks(include_meta_data=False))
+        self.assertEqual([None] * 10, chunk.meta_data)
+
+    def test_can_be_read_after_serialization(self):
+        log = samplelog.SampleLog(self.path)
+        log.append(self.index, metrics.SampleType.Normal, 1000, 0, 10, 5, 5000, "docs", 1, None)
+        log.close()
+
+        chunk, = next(pickle.loads(pickle.dumps(log)).chunks())
+        self.assertEqual([10], list(chunk.latency_ms))
+
+    def test_empty_log(self):
+        log = samplelog.SampleLog(self.path)
+        log.close()
+
+        self.assertEqual([], list(log.chunks()))
+
+    def test_cannot_read_open_log(self):
+        log = samplelog.SampleLog(self.path)
+        with self.assertRaises(RuntimeError):
+            next(log.chunks())
+        log.close()
+
+    def test_delete(self):
+        log = samplelog.SampleLog(self.path)
+        log.append(self.index, metrics.SampleType.Normal, 1000, 0, 10, 5, 5000, "docs", 1, {"success": True})
+        log.delete()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(log.meta_data_path))
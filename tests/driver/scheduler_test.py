@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from esrally import exceptions
+from esrally.driver import scheduler
+
+
+class SchedulerTests(TestCase):
+    def test_deterministic_scheduler(self):
+        s = scheduler.scheduler_for("deterministic", 0.5, {})
+        self.assertEqual(0, s.first(client_index=3, num_clients=4))
+        self.assertEqual(0.5, s.next(0))
+        self.assertEqual(1.5, s.next(1.0))
+
+    def test_staggered_scheduler_spreads_client_start(self):
+        s = scheduler.scheduler_for("staggered", 1.0, {})
+        self.assertEqual([0, 0.25, 0.5, 0.75], [s.first(client_index=i, num_clients=4) for i in range(4)])
+        self.assertEqual(1.25, s.next(0.25))
+
+    def test_uniform_scheduler_stays_within_jitter(self):
+        s = scheduler.scheduler_for("uniform", 1.0, {"jitter": 0.2})
+        for _ in range(1000):
+            interval = s.next(10) - 10
+            self.assertTrue(0.8 <= interval <= 1.2, "interval [%f] is out of bounds" % interval)
+
+    def test_uniform_scheduler_rejects_invalid_jitter(self):
+        with self.assertRaises(exceptions.SystemSetupError) as ctx:
+            scheduler.scheduler_for("uniform", 1.0, {"jitter": 1.5})
+        self.assertEqual("Jitter must be in the range [0, 1] but was [1.5]", ctx.exception.args[0])
+
+    def test_poisson_scheduler_matches_target_interval_on_average(self):
+        s = scheduler.scheduler_for("poisson", 0.1, {})
+        current = 0
+        for _ in range(10000):
+            next_scheduled = s.next(current)
+            self.assertTrue(next_scheduled >= current)
+            current = next_scheduled
+        self.assertAlmostEqual(1000, current, delta=50)
+
+    def test_unknown_scheduler(self):
+        with self.assertRaises(exceptions.RallyError) as ctx:
+            scheduler.scheduler_for("bursty", 1.0, {})
+        self.assertEqual("No scheduler available for name [bursty]", ctx.exception.args[0])
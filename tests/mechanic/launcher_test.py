@@ -92,3 +92,22 @@ class ExternalLauncherTests(TestCase):
         m.start()
         # did not change user defined value
         self.assertEqual(cfg.opts("source", "distribution.version"), "2.3.3")
+
+
+class MockLauncherTests(TestCase):
+    def test_starts_and_stops_mock_elasticsearch(self):
+        cfg = config.Config()
+        cfg.add(config.Scope.application, "telemetry", "devices", [])
+        cfg.add(config.Scope.application, "launcher", "client.options", [])
+        cfg.add(config.Scope.application, "mock", "latency", "fixed:1")
+
+        m = launcher.MockLauncher(cfg, MockMetricsStore(), client_factory_class=MockClientFactory)
+        c = m.start()
+
+        hosts = cfg.opts("client", "hosts")
+        self.assertEqual([{"host": m.server.host, "port": m.server.port}], hosts)
+        self.assertEqual(1, m.server.latency.sample())
+        self.assertEqual("5.0.0", cfg.opts("source", "distribution.version"))
+
+        m.stop(c)
+        self.assertIsNone(m.server)
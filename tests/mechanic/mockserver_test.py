@@ -0,0 +1,117 @@
+import gzip
+import json
+import random
+import urllib.error
+import urllib.request
+from unittest import TestCase
+
+from esrally import exceptions
+from esrally.mechanic import mockserver
+
+
+class LatencyDistributionTests(TestCase):
+    def test_fixed_latency(self):
+        self.assertEqual(5, mockserver.latency_distribution("fixed:5").sample())
+
+    def test_uniform_latency(self):
+        latency = mockserver.latency_distribution("uniform:2:4", rand=random.Random(42))
+        for _ in range(100):
+            self.assertTrue(2 <= latency.sample() <= 4)
+
+    def test_exponential_latency(self):
+        latency = mockserver.latency_distribution("exponential:10", rand=random.Random(42))
+        mean = sum([latency.sample() for _ in range(10000)]) / 10000
+        self.assertAlmostEqual(10, mean, delta=1)
+
+    def test_invalid_latency(self):
+        for spec in ["fixed", "fixed:a", "uniform:5:2", "exponential:-1", "normal:5"]:
+            with self.assertRaises(exceptions.SystemSetupError):
+                mockserver.latency_distribution(spec)
+
+
+class MockElasticsearchTests(TestCase):
+    def setUp(self):
+        self.server = mockserver.MockElasticsearch(hits=25).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def request(self, method, path, body=None, headers=None):
+        url = "http://%s:%d%s" % (self.server.host, self.server.port, path)
+        req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(req) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        return status, json.loads(payload.decode("utf-8")) if payload else None
+
+    def test_info(self):
+        status, info = self.request("GET", "/")
+        self.assertEqual(200, status)
+        self.assertEqual(mockserver.MOCK_VERSION, info["version"]["number"])
+
+    def test_index_management(self):
+        self.assertEqual(404, self.request("HEAD", "/geonames")[0])
+        self.assertEqual(200, self.request("PUT", "/geonames", b"{}")[0])
+        self.assertEqual(200, self.request("HEAD", "/geonames")[0])
+        self.assertEqual(200, self.request("PUT", "/geonames/_mapping/type", b"{}")[0])
+        self.assertEqual("green", self.request("GET", "/_cluster/health?wait_for_status=green")[1]["status"])
+        self.assertEqual(200, self.request("DELETE", "/geonames")[0])
+        self.assertEqual(404, self.request("HEAD", "/geonames")[0])
+
+    def test_bulk(self):
+        body = b'{"index": {"_index": "test", "_type": "type"}}\n{"a": 1}\n{"index": {"_index": "test", "_type": "type"}}\n{"a": 2}\n'
+        status, response = self.request("POST", "/_bulk", gzip.compress(body), headers={"Content-Encoding": "gzip"})
+
+        self.assertEqual(200, status)
+        self.assertFalse(response["errors"])
+        self.assertEqual([201, 201], [item["index"]["status"] for item in response["items"]])
+        self.assertEqual(2, self.server.indexed_docs)
+        self.assertEqual(2, self.request("GET", "/_all/_stats")[1]["_all"]["primaries"]["docs"]["count"])
+
+    def test_bulk_without_action_and_meta_data(self):
+        status, response = self.request("POST", "/test/type/_bulk", b'{"a": 1}\n{"a": 2}\n{"a": 3}\n')
+
+        self.assertEqual(3, len(response["items"]))
+
+    def test_scroll(self):
+        status, response = self.request("POST", "/test/_search?scroll=10s&size=10", b'{"query": {"match_all": {}}}')
+        self.assertEqual(10, len(response["hits"]["hits"]))
+        scroll_id = response["_scroll_id"]
+
+        # elasticsearch-py 2.x sends the scroll id as a plain body
+        self.assertEqual(10, len(self.request("GET", "/_search/scroll?scroll=10s", scroll_id.encode("utf-8"))[1]["hits"]["hits"]))
+        self.assertEqual(5, len(self.request("GET", "/_search/scroll", json.dumps({"scroll_id": scroll_id}).encode("utf-8"))[1]
+                                ["hits"]["hits"]))
+        self.assertEqual(0, len(self.request("GET", "/_search/scroll?scroll_id=%s" % scroll_id)[1]["hits"]["hits"]))
+
+        self.assertEqual(200, self.request("DELETE", "/_search/scroll/%s" % scroll_id)[0])
+        self.assertEqual(404, self.request("GET", "/_search/scroll", scroll_id.encode("utf-8"))[0])
+
+    def test_nodes(self):
+        stats = self.request("GET", "/_nodes/stats")[1]
+        node = next(iter(stats["nodes"].values()))
+        self.assertEqual(0, node["jvm"]["gc"]["collectors"]["old"]["collection_time_in_millis"])
+
+        info = self.request("GET", "/_nodes/_all")[1]
+        self.assertEqual(mockserver.MOCK_NODE_NAME, next(iter(info["nodes"].values()))["name"])
+
+    def test_unsupported_api(self):
+        self.assertEqual(400, self.request("GET", "/_snapshot/repo")[0])
+
+
+class MockElasticsearchErrorTests(TestCase):
+    def test_injects_errors(self):
+        server = mockserver.MockElasticsearch(error_rate=1.0)
+        self.assertEqual(503, server.handle("POST", ["test", "_search"], {}, b"{}")[0])
+
+        status, response = server.handle("POST", ["_bulk"], {}, b'{"index": {}}\n{"a": 1}\n')
+        self.assertEqual(200, status)
+        self.assertTrue(response["errors"])
+        self.assertEqual(429, response["items"][0]["index"]["status"])
+        server.stop()
+
+    def test_rejects_invalid_error_rate(self):
+        with self.assertRaises(exceptions.SystemSetupError):
+            mockserver.MockElasticsearch(error_rate=1.5)
@@ -1,8 +1,12 @@
 import datetime
+import os
+import tempfile
 import unittest.mock as mock
 from unittest import TestCase
 
 from esrally import config, metrics, track
+from esrally.driver import samplelog
+from esrally.utils import histogram
 
 
 class MockClientFactory:
@@ -47,6 +51,15 @@ class StaticStopWatch:
         return 0
 
 
+def create_sample_log(directory, samples_per_lap=1000):
+    log = samplelog.SampleLog(os.path.join(directory, "samples.bin"), capacity=16)
+    op = track.Operation("index", track.OperationType.Index.name)
+    for i in range(1, samples_per_lap + 1):
+        log.append(op, metrics.SampleType.Normal, 1000 + i, i, float(i), float(i) / 2, 5000, "docs", i, {"success": True})
+    log.close()
+    return log
+
+
 class EsMetricsTests(TestCase):
     TRIAL_TIMESTAMP = datetime.datetime(2016, 1, 31)
 
@@ -155,6 +168,108 @@ class EsMetricsTests(TestCase):
         self.es_mock.create_index.assert_called_with(index="rally-2016")
         self.es_mock.bulk_index.assert_called_with(index="rally-2016", doc_type="metrics", items=[expected_doc])
 
+    def test_bulk_put_values(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        self.metrics_store.add_meta_info(metrics.MetaInfoScope.cluster, None, "source_revision", "abc123")
+
+        self.metrics_store.bulk_put_value_cluster_level("latency", [10.5, 20], "ms", operation="index", operation_type="Index",
+                                                        sample_types=[metrics.SampleType.Warmup.value, metrics.SampleType.Normal],
+                                                        absolute_times=[0, 1.5], relative_times=[10, 11.5],
+                                                        meta_data=[None, {"success": True}])
+        # meta info that is added afterwards must not leak into records that have already been stored
+        self.metrics_store.add_meta_info(metrics.MetaInfoScope.cluster, None, "distribution_version", "5.0.0")
+        expected_doc = {
+            "@timestamp": 0,
+            "trial-timestamp": "20160131T000000Z",
+            "relative-time": 10000000,
+            "environment": "unittest",
+            "sample-type": "warmup",
+            "track": "test",
+            "lap": 1,
+            "challenge": "append-no-conflicts",
+            "car": "defaults",
+            "name": "latency",
+            "value": 10.5,
+            "unit": "ms",
+            "operation": "index",
+            "operation-type": "Index",
+            "meta": {
+                "source_revision": "abc123"
+            }
+        }
+        expected_doc_with_meta_data = {
+            "@timestamp": 1500,
+            "trial-timestamp": "20160131T000000Z",
+            "relative-time": 11500000,
+            "environment": "unittest",
+            "sample-type": "normal",
+            "track": "test",
+            "lap": 1,
+            "challenge": "append-no-conflicts",
+            "car": "defaults",
+            "name": "latency",
+            "value": 20,
+            "unit": "ms",
+            "operation": "index",
+            "operation-type": "Index",
+            "meta": {
+                "source_revision": "abc123",
+                "operation": {
+                    "success": True
+                }
+            }
+        }
+        self.metrics_store.close()
+        self.es_mock.bulk_index.assert_called_with(index="rally-2016", doc_type="metrics",
+                                                   items=[expected_doc, expected_doc_with_meta_data])
+
+    def test_add_sample_log_in_chunks(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.metrics_store.add_sample_log(create_sample_log(tmp_dir, samples_per_lap=5), chunk_size=2)
+
+        # each chunk is flushed immediately
+        self.assertEqual(3, self.es_mock.bulk_index.call_count)
+        last_chunk = self.es_mock.bulk_index.call_args[1]["items"]
+        self.assertEqual(["latency", "service_time"], [doc["name"] for doc in last_chunk])
+        self.assertEqual([5.0, 2.5], [doc["value"] for doc in last_chunk])
+        self.assertEqual({"success": True}, last_chunk[0]["meta"]["operation"])
+        self.assertEqual("index", last_chunk[0]["operation"])
+        self.assertEqual("Index", last_chunk[0]["operation-type"])
+
+    def test_add_sample_log_stores_schedule_lag_of_throttled_samples(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log = samplelog.SampleLog(os.path.join(tmp_dir, "samples.bin"))
+            op = track.Operation("index", track.OperationType.Index.name)
+            log.append(op, metrics.SampleType.Normal, 1000, 1, 10.0, 9.0, 1, "docs", 1, None, schedule_lag_ms=0.5)
+            log.append(op, metrics.SampleType.Normal, 1001, 2, 10.0, 10.0, 1, "docs", 2, None)
+            log.close()
+            self.metrics_store.add_sample_log(log)
+
+        items = self.es_mock.bulk_index.call_args[1]["items"]
+        self.assertEqual(["latency", "latency", "service_time", "service_time", "schedule_lag"], [doc["name"] for doc in items])
+        self.assertEqual(0.5, items[-1]["value"])
+        self.assertEqual(1000000, items[-1]["relative-time"])
+        self.assertEqual("ms", items[-1]["unit"])
+
+    @mock.patch("esrally.utils.console.progress")
+    def test_add_sample_log_reports_progress_per_chunk(self, progress):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.metrics_store.add_sample_log(create_sample_log(tmp_dir, samples_per_lap=5), chunk_size=2)
+
+        progress.return_value.print.assert_has_calls([
+            mock.call("Storing samples", "[ 40% done]"),
+            mock.call("Storing samples", "[ 80% done]"),
+            mock.call("Storing samples", "[100% done]")
+        ])
+        progress.return_value.finish.assert_called_once_with()
+
     def test_get_value(self):
         throughput = 5000
         search_result = {
@@ -406,6 +521,48 @@ class InMemoryMetricsStoreTests(TestCase):
 
         self.assert_equal_percentiles("query_latency", [99, 99.9, 100], {99: 990.0, 99.9: 999.0, 100: 1000.0})
 
+    def test_get_percentile_from_sample_log(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.metrics_store.lap = 1
+            self.metrics_store.add_sample_log(create_sample_log(tmp_dir), chunk_size=100)
+
+            self.assertEqual(0, len(self.metrics_store.docs))
+            self.assertEqual(1000, self.metrics_store.get_count("latency", operation="index", lap=1))
+            self.assertEqual(0, self.metrics_store.get_count("latency", operation="index", lap=2))
+            self.assertEqual(1000, self.metrics_store.get_count("latency", operation_type=track.OperationType.Index,
+                                                                sample_type=metrics.SampleType.Normal))
+            self.assertEqual(0, self.metrics_store.get_count("latency", sample_type=metrics.SampleType.Warmup))
+            self.assertEqual(0, self.metrics_store.get_count("latency", operation="search"))
+            self.assertEqual("ms", self.metrics_store.get_unit("service_time", operation="index"))
+            self.assert_equal_percentiles("latency", [99, 99.9, 100], {99: 990.0, 99.9: 999.0, 100: 1000.0})
+            self.assert_equal_percentiles("service_time", [100], {100: 500.0})
+            # no sample has been throttled
+            self.assertEqual(0, self.metrics_store.get_count("schedule_lag", operation="index"))
+
+    def test_reads_sample_log_only_once(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.metrics_store.lap = 1
+            log = create_sample_log(tmp_dir, samples_per_lap=10)
+            with mock.patch.object(log, "chunks", wraps=log.chunks) as chunks:
+                self.metrics_store.add_sample_log(log, chunk_size=3)
+                for name in ["latency", "service_time", "schedule_lag"]:
+                    self.metrics_store.get_count(name, operation="index")
+                    self.metrics_store.get_percentiles(name, operation="index")
+                    self.metrics_store.get_stats(name, operation="index")
+                self.assertEqual(1, chunks.call_count)
+
+                self.assertEqual(10, self.metrics_store.get_count("latency", lap=1, sample_type=metrics.SampleType.Normal))
+                self.assertEqual(55, self.metrics_store.get_stats("latency", operation="index")["sum"])
+
+                # a new sample log invalidates the cached values
+                self.metrics_store.lap = 2
+                self.metrics_store.add_sample_log(log, chunk_size=3)
+                self.assertEqual(20, self.metrics_store.get_count("latency", operation="index"))
+                self.assertEqual(10, self.metrics_store.get_count("latency", operation="index", lap=2))
+                self.assertEqual(3, chunks.call_count)
+
     def test_get_median(self):
         self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
         self.metrics_store.lap = 1
@@ -442,3 +599,37 @@ class InMemoryMetricsStoreTests(TestCase):
         self.metrics_store.bulk_add(memento)
         self.assertEqual(1, len(self.metrics_store.docs))
         self.assertEqual(1000, self.metrics_store.get_one("final_index_size"))
+
+    def test_merges_histograms_across_laps(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        for lap in [1, 2]:
+            self.metrics_store.lap = lap
+            for client in range(2):
+                h = histogram.Histogram()
+                for i in range(1, 101):
+                    h.record(lap * 100 + i)
+                self.metrics_store.put_histogram("latency", h, operation="index")
+
+        self.assertIsNone(self.metrics_store.get_histogram("latency", operation="search"))
+        self.assertIsNone(self.metrics_store.get_histogram("latency", sample_type=metrics.SampleType.Warmup))
+        self.assertEqual(200, self.metrics_store.get_histogram("latency", operation="index", lap=1).total_count)
+        merged = self.metrics_store.get_histogram("latency", operation="index")
+        self.assertEqual(400, merged.total_count)
+        self.assertEqual(101, merged.min)
+        self.assertEqual(300, merged.max)
+
+    def test_externalize_and_bulk_add_histograms(self):
+        self.metrics_store.open(EsMetricsTests.TRIAL_TIMESTAMP, "test", "append-no-conflicts", "defaults", create=True)
+        self.metrics_store.lap = 1
+        h = histogram.Histogram()
+        h.record(10)
+        self.metrics_store.put_histogram("latency", h, operation="index")
+
+        memento = self.metrics_store.to_externalizable()
+
+        self.metrics_store.close()
+        del self.metrics_store
+
+        self.metrics_store = metrics.InMemoryMetricsStore(self.cfg, clock=StaticClock)
+        self.metrics_store.bulk_add(memento)
+        self.assertEqual(1, self.metrics_store.get_histogram("latency", operation="index").total_count)
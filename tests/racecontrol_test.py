@@ -10,7 +10,8 @@ class RaceControlTests(TestCase):
             ["from-sources-complete", "Builds and provisions Elasticsearch, runs a benchmark and reports results."],
             ["from-sources-skip-build", "Provisions Elasticsearch (skips the build), runs a benchmark and reports results."],
             ["from-distribution", "Downloads an Elasticsearch distribution, provisions it, runs a benchmark and reports results."],
-            ["benchmark-only", "Assumes an already running Elasticsearch instance, runs a benchmark and reports results"]
+            ["benchmark-only", "Assumes an already running Elasticsearch instance, runs a benchmark and reports results"],
+            ["benchmark-mock", "Starts a local mock Elasticsearch, runs a benchmark against it and reports results (to try out tracks)"]
         ]
         self.assertEqual(expected, racecontrol.available_pipelines())
 
@@ -3,6 +3,7 @@ import datetime
 from unittest import TestCase
 
 from esrally import reporter, metrics, config, track
+from esrally.utils import histogram
 
 
 class ReporterTests(TestCase):
@@ -40,3 +41,40 @@ class ReporterTests(TestCase):
         self.assertEqual((500, 1000, 2000, "docs/s"), stats.op_metrics["index"]["throughput"])
         self.assertEqual(collections.OrderedDict([(50.0, 220), (100, 225)]), stats.op_metrics["index"]["latency"])
         self.assertEqual(collections.OrderedDict([(50.0, 200), (100, 215)]), stats.op_metrics["index"]["service_time"])
+
+    def test_calculate_latency_percentiles_from_histograms(self):
+        cfg = config.Config()
+        cfg.add(config.Scope.application, "system", "env.name", "unittest")
+
+        store = metrics.InMemoryMetricsStore(config=cfg)
+        store.open(datetime.datetime.now(), "test", "unittest", "unittest_car")
+        store.lap = 1
+
+        for name in ["latency", "service_time"]:
+            h = histogram.Histogram()
+            for v in range(1, 11):
+                h.record(v)
+            store.put_histogram(name, h, operation="index")
+
+        index = track.Task(operation=track.Operation(name="index", operation_type=track.OperationType.Index, params=None))
+        challenge = track.Challenge(name="unittest", description="", index_settings=None, schedule=[index])
+
+        stats = reporter.Stats(store, challenge)
+
+        del store
+
+        # the operation has not been throttled
+        self.assertEqual({}, stats.op_metrics["index"]["schedule_lag"])
+        # request bodies have not been compressed ahead of time
+        self.assertEqual({}, stats.op_metrics["index"]["compression_time"])
+        self.assertEqual({}, stats.op_metrics["index"]["compression_ratio"])
+        # request bodies have not been serialized ahead of time
+        self.assertEqual({}, stats.op_metrics["index"]["serialized_size"])
+        self.assertEqual({}, stats.op_metrics["index"]["serialization_throughput"])
+        for name in ["latency", "service_time"]:
+            percentiles = stats.op_metrics["index"][name]
+            self.assertEqual([50.0, 90.0, 100], list(percentiles.keys()))
+            # histograms report the highest value that is equivalent to the recorded one (within their precision)
+            self.assertAlmostEqual(5, percentiles[50.0], delta=0.005)
+            self.assertAlmostEqual(9, percentiles[90.0], delta=0.009)
+            self.assertEqual(10, percentiles[100])
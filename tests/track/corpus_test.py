@@ -0,0 +1,153 @@
+import bz2
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from esrally.track import corpus
+from esrally.utils import io
+
+
+class CorpusMetadataTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.tmp_dir.name, "documents.json")
+        self.lines = ['{"id": %d, "text": "%s"}' % (i, "a" * (i % 17)) for i in range(1000)]
+        with open(self.data_file_path, mode="wt") as f:
+            for line in self.lines:
+                print(line, file=f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_computes_and_stores_metadata(self):
+        metadata = corpus.prepare(self.data_file_path, granularity=256)
+
+        self.assertEqual(1000, metadata.number_of_lines)
+        self.assertEqual(os.path.getsize(self.data_file_path), metadata.size)
+        self.assertAlmostEqual(sum(len(line) for line in self.lines) / len(self.lines), metadata.average_document_size)
+        self.assertEqual(max(len(line) for line in self.lines), metadata.document_size_percentiles[100])
+        self.assertEqual(io.OFFSET_INDEX_VERSION, metadata.offset_index_version)
+        with io.OffsetIndex(io.offset_index_path(self.data_file_path)).open() as index:
+            self.assertEqual(1000, index.number_of_lines)
+
+        stored = corpus.load(self.data_file_path)
+        self.assertEqual(metadata.as_dict(), stored.as_dict())
+
+    def test_reuses_metadata_of_touched_file(self):
+        with mock.patch("esrally.utils.io.offset_index_entries", wraps=io.offset_index_entries) as offset_index_entries:
+            corpus.prepare(self.data_file_path, granularity=256)
+            # simulates a copy or a move that changes the modification time but not the contents
+            os.utime(self.data_file_path, (0, 0))
+
+            metadata = corpus.prepare(self.data_file_path, granularity=256)
+
+        self.assertEqual(1, offset_index_entries.call_count)
+        self.assertEqual(1000, metadata.number_of_lines)
+
+    def test_rebuilds_if_contents_change(self):
+        corpus.prepare(self.data_file_path, granularity=256)
+        with open(self.data_file_path, mode="at") as f:
+            print('{"id": 1000}', file=f)
+
+        metadata = corpus.prepare(self.data_file_path, granularity=256)
+
+        self.assertEqual(1001, metadata.number_of_lines)
+        with io.OffsetIndex(io.offset_index_path(self.data_file_path)).open() as index:
+            self.assertEqual(1001, index.number_of_lines)
+
+    def test_rebuilds_if_granularity_changes(self):
+        corpus.prepare(self.data_file_path, granularity=256)
+
+        metadata = corpus.prepare(self.data_file_path, granularity=128)
+
+        self.assertEqual(128, metadata.offset_index_granularity)
+        with io.OffsetIndex(io.offset_index_path(self.data_file_path)).open() as index:
+            self.assertEqual(128, index.granularity)
+
+    def test_rebuilds_legacy_offset_table(self):
+        offset_file_path = io.offset_index_path(self.data_file_path)
+        corpus.prepare(self.data_file_path, granularity=256)
+        # an offset table in the text format of earlier versions of Rally
+        with open(offset_file_path, mode="wt") as f:
+            print("50000;123456", file=f)
+
+        corpus.prepare(self.data_file_path, granularity=256)
+
+        with io.OffsetIndex(offset_file_path).open() as index:
+            self.assertEqual(1000, index.number_of_lines)
+
+    def test_ignores_corrupt_metadata(self):
+        with open(corpus.metadata_path(self.data_file_path), mode="wt") as f:
+            f.write("{not json")
+
+        self.assertIsNone(corpus.load(self.data_file_path))
+        self.assertEqual(1000, corpus.prepare(self.data_file_path, granularity=256).number_of_lines)
+
+
+class ArchiveCheckpointsTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive_path = os.path.join(self.tmp_dir.name, "documents.json.bz2")
+        with open(self.archive_path, mode="wb") as f:
+            for i in range(10):
+                f.write(bz2.compress("".join('{"id": %d}\n' % (i * 10 + j) for j in range(10)).encode("utf-8")))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_computes_and_reuses_checkpoints(self):
+        with mock.patch("esrally.utils.io.archive_checkpoints", wraps=io.archive_checkpoints) as archive_checkpoints:
+            checkpoints = corpus.prepare_archive(self.archive_path, granularity=200)
+            os.utime(self.archive_path, (0, 0))
+            self.assertEqual(checkpoints.as_dict(), corpus.prepare_archive(self.archive_path, granularity=200).as_dict())
+            # a different granularity requires new checkpoints
+            corpus.prepare_archive(self.archive_path, granularity=100)
+
+        self.assertEqual(2, archive_checkpoints.call_count)
+        self.assertEqual(100, checkpoints.number_of_lines)
+        # each stream contains 10 lines and 10 streams cover at least 200 bytes
+        self.assertEqual([0, 20, 40, 60, 80], [first_line for _, first_line, _ in checkpoints.checkpoints])
+
+    def test_detects_single_stream(self):
+        self.assertFalse(corpus.prepare_archive(self.archive_path, granularity=200).single_stream)
+
+        with open(self.archive_path, mode="wb") as f:
+            f.write(bz2.compress("".join('{"id": %d}\n' % i for i in range(100)).encode("utf-8")))
+
+        self.assertTrue(corpus.prepare_archive(self.archive_path, granularity=200).single_stream)
+        # the whole archive fits into one checkpoint interval
+        self.assertFalse(corpus.prepare_archive(self.archive_path, granularity=10000).single_stream)
+
+    def test_lookup(self):
+        checkpoints = corpus.ArchiveCheckpoints(size=0, fingerprint="", number_of_lines=100, uncompressed_size=1000, granularity=1,
+                                                checkpoints=[(0, 0, False), (30, 10, True), (70, 25, False)])
+
+        self.assertEqual((0, 0, False), checkpoints.lookup(9))
+        self.assertEqual((30, 10, True), checkpoints.lookup(10))
+        self.assertEqual((30, 10, True), checkpoints.lookup(24))
+        self.assertEqual((70, 25, False), checkpoints.lookup(99))
+
+
+class FingerprintTests(TestCase):
+    def test_fingerprint_samples_large_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data")
+            with open(path, mode="wb") as f:
+                f.write(b"a" * 1000)
+            original = corpus.fingerprint(path, blocks=4, block_size=10)
+
+            # change a byte between two sampled blocks
+            with open(path, mode="r+b") as f:
+                f.seek(500)
+                f.write(b"b")
+            self.assertEqual(original, corpus.fingerprint(path, blocks=4, block_size=10))
+
+            # change a byte in the last block
+            with open(path, mode="r+b") as f:
+                f.seek(995)
+                f.write(b"b")
+            self.assertNotEqual(original, corpus.fingerprint(path, blocks=4, block_size=10))
+
+    def test_percentiles(self):
+        self.assertEqual({50: 5, 100: 10}, corpus.percentiles(list(range(1, 11)), [50, 100]))
+        self.assertEqual({}, corpus.percentiles([], [50]))
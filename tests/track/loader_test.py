@@ -1,8 +1,12 @@
+import bz2
+import os
+import tempfile
 from unittest import TestCase
 
 import jinja2
 
-from esrally.track import loader
+from esrally import config, exceptions
+from esrally.track import loader, track
 
 
 class StaticClock:
@@ -155,6 +159,99 @@ class TrackSpecificationReaderTests(TestCase):
         self.assertEqual("Track 'unittest' is invalid. Operation 'index-append' in challenge 'default-challenge' mixes warmup time period "
                          "with iterations. Please do not mix time periods and iterations.", ctx.exception.args[0])
 
+    def test_parse_with_schedule_but_without_target_throughput(self):
+        track_specification = {
+            "meta": {
+                "short-description": "short description for unit test",
+                "description": "longer description of this track for unit test",
+                "data-url": "https://localhost/data"
+            },
+            "indices": [
+                {
+                    "name": "test-index",
+                    "types": [
+                        {
+                            "name": "main",
+                            "documents": "documents-main.json.bz2",
+                            "document-count": 10,
+                            "compressed-bytes": 100,
+                            "uncompressed-bytes": 10000,
+                            "mapping": "main-type-mappings.json"
+                        }
+                    ]
+                }
+            ],
+            "operations": [
+                {
+                    "name": "search",
+                    "operation-type": "search",
+                    "index": "test-index"
+                }
+            ],
+            "challenges": [
+                {
+                    "name": "default-challenge",
+                    "description": "Default challenge",
+                    "schedule": [
+                        {
+                            "clients": 8,
+                            "operation": "search",
+                            "iterations": 1000,
+                            "schedule": "poisson"
+                        }
+                    ]
+                }
+
+            ]
+        }
+
+        reader = loader.TrackSpecificationReader()
+        with self.assertRaises(loader.TrackSyntaxError) as ctx:
+            reader("unittest", track_specification, "/mappings", "/data")
+        self.assertEqual("Track 'unittest' is invalid. Operation 'search' in challenge 'default-challenge' defines the schedule 'poisson' "
+                         "but no target throughput. Please define a target throughput.", ctx.exception.args[0])
+
+    def test_parse_scheduler_options(self):
+        track_specification = {
+            "meta": {
+                "short-description": "short description for unit test",
+                "description": "longer description of this track for unit test",
+                "data-url": "https://localhost/data"
+            },
+            "indices": [],
+            "operations": [
+                {
+                    "name": "search",
+                    "operation-type": "search",
+                    "index": "test-index"
+                }
+            ],
+            "challenges": [
+                {
+                    "name": "default-challenge",
+                    "description": "Default challenge",
+                    "schedule": [
+                        {
+                            "clients": 8,
+                            "operation": "search",
+                            "iterations": 1000,
+                            "target-throughput": 100,
+                            "schedule": "uniform",
+                            "jitter": 0.2
+                        }
+                    ]
+                }
+
+            ]
+        }
+
+        reader = loader.TrackSpecificationReader()
+        resulting_track = reader("unittest", track_specification, "/mappings", "/data")
+        task = resulting_track.challenges[0].schedule[0]
+        self.assertEqual("uniform", task.schedule)
+        # only the scheduler-specific options are retained
+        self.assertEqual({"jitter": 0.2}, task.params)
+
     def test_parse_valid_track_specification(self):
         track_specification = {
             "meta": {
@@ -232,3 +329,90 @@ class TrackSpecificationReaderTests(TestCase):
         self.assertEqual("secondary", resulting_track.indices[0].types[1].name)
         self.assertEqual(1, len(resulting_track.challenges))
         self.assertEqual("default-challenge", resulting_track.challenges[0].name)
+
+
+class StreamFromArchiveTests(TestCase):
+    @staticmethod
+    def track_with(*operations):
+        schedule = [track.Parallel([track.Task(operations[0])])] + [track.Task(op) for op in operations[1:]]
+        return track.Track(name="unittest", short_description="", description="", source_root_url=None,
+                           challenges=[track.Challenge(name="default", description="", index_settings=None, schedule=schedule)])
+
+    def test_streams_if_all_index_operations_use_archive_reader(self):
+        t = self.track_with(track.Operation("index-1", track.OperationType.Index.name, params={"corpus-reader": "archive"}),
+                            track.Operation("index-2", track.OperationType.Index.name, params={"corpus-reader": "archive"}),
+                            track.Operation("search", track.OperationType.Search.name))
+        self.assertTrue(loader.streams_from_archive(t))
+
+    def test_decompresses_if_any_index_operation_reads_data_file(self):
+        t = self.track_with(track.Operation("index-1", track.OperationType.Index.name, params={"corpus-reader": "archive"}),
+                            track.Operation("index-2", track.OperationType.Index.name, params={"corpus-reader": "mmap"}))
+        self.assertFalse(loader.streams_from_archive(t))
+
+    def test_decompresses_without_index_operations(self):
+        self.assertFalse(loader.streams_from_archive(self.track_with(track.Operation("search", track.OperationType.Search.name))))
+
+
+class DocumentCountTests(TestCase):
+    @staticmethod
+    def type_with(number_of_documents):
+        return track.Type(name="docs", mapping_file=None, document_file="docs.json", number_of_documents=number_of_documents)
+
+    def test_sets_missing_document_count_from_data_file(self):
+        t = self.type_with(number_of_documents=0)
+        loader.check_document_count(t, "docs.json", number_of_lines=1000)
+        self.assertEqual(1000, t.number_of_documents)
+
+    def test_keeps_document_count_if_data_file_is_large_enough(self):
+        t = self.type_with(number_of_documents=400)
+        loader.check_document_count(t, "docs.json", number_of_lines=1000, lines_per_document=2)
+        self.assertEqual(400, t.number_of_documents)
+
+    def test_rejects_data_file_with_too_few_documents(self):
+        t = self.type_with(number_of_documents=600)
+        with self.assertRaisesRegex(exceptions.DataError, r"contains only \[500\] documents but \[600\] documents are expected"):
+            loader.check_document_count(t, "docs.json", number_of_lines=1000, lines_per_document=2)
+
+    def test_source_lines_per_document(self):
+        generated = track.Operation("index-1", track.OperationType.Index.name, params={"action-and-meta-data": "generate"})
+        from_file = track.Operation("index-2", track.OperationType.Index.name, params={"action-and-meta-data": "sourcefile"})
+        self.assertEqual(1, loader.source_lines_per_document(StreamFromArchiveTests.track_with(generated)))
+        self.assertEqual(2, loader.source_lines_per_document(StreamFromArchiveTests.track_with(generated, from_file)))
+
+
+class PrepareArchiveTrackTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cfg = config.Config()
+        self.cfg.add(config.Scope.application, "system", "offline.mode", True)
+        self.cfg.add(config.Scope.application, "benchmarks", "archive.checkpoint.granularity", 100)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def track_with_archive(self, streams):
+        archive_path = os.path.join(self.tmp_dir.name, "documents.json.bz2")
+        with open(archive_path, mode="wb") as f:
+            for stream in streams:
+                f.write(bz2.compress("".join('{"id": %d}\n' % i for i in stream).encode("utf-8")))
+        documents = track.Type(name="docs", mapping_file=None, document_file=os.path.join(self.tmp_dir.name, "documents.json"),
+                               document_archive=archive_path, number_of_documents=100, compressed_size_in_bytes=None,
+                               uncompressed_size_in_bytes=None)
+        t = StreamFromArchiveTests.track_with(track.Operation("index", track.OperationType.Index.name, params={"corpus-reader": "archive"}))
+        t.indices = [track.Index(name="test", auto_managed=True, types=[documents])]
+        return t
+
+    def test_streams_archive_with_several_streams(self):
+        t = self.track_with_archive([range(i * 10, i * 10 + 10) for i in range(10)])
+
+        loader.prepare_track(t, self.cfg)
+
+        self.assertGreater(t.indices[0].types[0].average_document_size_in_bytes, 0)
+        # documents are not decompressed to disk
+        self.assertFalse(os.path.exists(t.indices[0].types[0].document_file))
+
+    def test_rejects_single_stream_archive(self):
+        t = self.track_with_archive([range(100)])
+
+        with self.assertRaisesRegex(exceptions.SystemSetupError, r"consists of a single compressed stream"):
+            loader.prepare_track(t, self.cfg)
@@ -1,8 +1,11 @@
+import gzip
+import os
+import tempfile
 from unittest import TestCase
 
 from esrally import exceptions
 from esrally.utils import io
-from esrally.track import params
+from esrally.track import corpus, params
 
 
 class SliceTests(TestCase):
@@ -290,6 +293,116 @@ class IndexDataReaderTests(TestCase):
                     bulk_index += 1
 
 
+class MmapIndexDataReaderTests(TestCase):
+    class TestType:
+        def __init__(self, document_file):
+            self.name = "test_type"
+            self.document_file = document_file
+            self.average_document_size_in_bytes = None
+
+        def __str__(self):
+            return self.name
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.tmp_dir.name, "documents.json")
+        # the last line has no line ending
+        with open(self.data_file_path, mode="wt") as f:
+            f.write("\n".join('{"key": "value%d"}' % i for i in range(11)))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self, create_reader, action_metadata, offset, num_lines, num_docs):
+        type = MmapIndexDataReaderTests.TestType(self.data_file_path)
+        bulks = []
+        with create_reader("test_index", type, offset, num_lines, num_docs, action_metadata, batch_size=6, bulk_size=3,
+                           id_conflicts=params.IndexIdConflict.NoConflicts) as reader:
+            for _, _, batch in reader:
+                for bulk in batch:
+                    bulks.append(bulk if isinstance(bulk, bytes) else params.serialize_bulk(bulk))
+        return bulks
+
+    def assert_same_bulks(self, action_metadata, offset, num_lines, num_docs):
+        expected = self.read(params.create_default_reader, action_metadata, offset, num_lines, num_docs)
+        actual = self.read(params.create_mmap_reader, action_metadata, offset, num_lines, num_docs)
+        self.assertTrue(all(isinstance(bulk, bytes) for bulk in actual))
+        self.assertEqual(expected, actual)
+
+    def test_read_bulks_with_generated_metadata(self):
+        self.assert_same_bulks(params.ActionMetaData.Generate, offset=2, num_lines=9, num_docs=9)
+
+    def test_read_bulks_without_metadata(self):
+        self.assert_same_bulks(params.ActionMetaData.NoMetaData, offset=1, num_lines=7, num_docs=7)
+
+    def test_read_bulks_with_metadata_in_source_file(self):
+        self.assert_same_bulks(params.ActionMetaData.SourceFile, offset=0, num_lines=10, num_docs=5)
+
+    def test_read_bulks_until_end_of_file(self):
+        bulks = self.read(params.create_mmap_reader, params.ActionMetaData.NoMetaData, offset=9, num_lines=5, num_docs=5)
+
+        self.assertEqual([b'{"key": "value9"}\n{"key": "value10"}\n'], bulks)
+
+
+class ArchiveIndexDataReaderTests(TestCase):
+    class TestType:
+        def __init__(self, document_file, document_archive):
+            self.name = "test_type"
+            self.document_file = document_file
+            self.document_archive = document_archive
+            self.average_document_size_in_bytes = None
+
+        def __str__(self):
+            return self.name
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.tmp_dir.name, "documents.json")
+        self.archive_path = "%s.gz" % self.data_file_path
+        # the last line has no line ending
+        data = "\n".join('{"key": "value%d"}' % i for i in range(11)).encode("utf-8")
+        with open(self.data_file_path, mode="wb") as f:
+            f.write(data)
+        # several gzip members that start in the middle of a line
+        with open(self.archive_path, mode="wb") as f:
+            for start in range(0, len(data), 25):
+                f.write(gzip.compress(data[start:start + 25]))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self, create_reader, action_metadata, offset, num_lines, num_docs):
+        type = ArchiveIndexDataReaderTests.TestType(self.data_file_path, self.archive_path)
+        bulks = []
+        with create_reader("test_index", type, offset, num_lines, num_docs, action_metadata, batch_size=6, bulk_size=3,
+                           id_conflicts=params.IndexIdConflict.NoConflicts) as reader:
+            for _, _, batch in reader:
+                for bulk in batch:
+                    bulks.append(bulk if isinstance(bulk, bytes) else params.serialize_bulk(bulk))
+        return bulks
+
+    def assert_same_bulks(self, action_metadata, offset, num_lines, num_docs):
+        expected = self.read(params.create_default_reader, action_metadata, offset, num_lines, num_docs)
+        actual = self.read(params.create_archive_reader, action_metadata, offset, num_lines, num_docs)
+        self.assertEqual(expected, actual)
+
+    def test_read_bulks_without_checkpoints(self):
+        self.assert_same_bulks(params.ActionMetaData.Generate, offset=4, num_lines=7, num_docs=7)
+
+    def test_read_bulks_from_checkpoints(self):
+        checkpoints = corpus.prepare_archive(self.archive_path, granularity=1)
+        self.assertGreater(len(checkpoints.checkpoints), 1)
+
+        for offset in range(11):
+            self.assert_same_bulks(params.ActionMetaData.Generate, offset=offset, num_lines=11 - offset, num_docs=11 - offset)
+            self.assert_same_bulks(params.ActionMetaData.NoMetaData, offset=offset, num_lines=2, num_docs=2)
+
+    def test_read_bulks_with_metadata_in_source_file(self):
+        corpus.prepare_archive(self.archive_path, granularity=1)
+
+        self.assert_same_bulks(params.ActionMetaData.SourceFile, offset=2, num_lines=8, num_docs=4)
+
+
 class InvocationGeneratorTests(TestCase):
     class TestIndexReader:
         def __init__(self, data):
@@ -314,8 +427,9 @@ class InvocationGeneratorTests(TestCase):
             self.types = types
 
     class TestType:
-        def __init__(self, number_of_documents):
+        def __init__(self, number_of_documents, average_document_size_in_bytes=None):
             self.number_of_documents = number_of_documents
+            self.average_document_size_in_bytes = average_document_size_in_bytes
 
     def idx(self, *args, **kwargs):
         return InvocationGeneratorTests.TestIndex(*args, **kwargs)
@@ -323,6 +437,21 @@ class InvocationGeneratorTests(TestCase):
     def t(self, *args, **kwargs):
         return InvocationGeneratorTests.TestType(*args, **kwargs)
 
+    def test_read_buffer_size_fits_bulk(self):
+        self.assertEqual(-1, params.read_buffer_size(self.t(1000), 5000))
+        self.assertEqual(5000 * 400, params.read_buffer_size(self.t(1000, average_document_size_in_bytes=400), 5000))
+        self.assertEqual(params.MIN_READ_BUFFER_SIZE, params.read_buffer_size(self.t(1000, average_document_size_in_bytes=400), 10))
+        self.assertEqual(params.MAX_READ_BUFFER_SIZE, params.read_buffer_size(self.t(1000, average_document_size_in_bytes=4000), 10000))
+
+    def test_default_reader_buffers_a_bulk(self):
+        type = self.t(1000, average_document_size_in_bytes=400)
+        type.document_file = "docs.json"
+        reader = params.create_default_reader("test_index", type, offset=0, num_lines=2000, num_docs=1000,
+                                              action_metadata=params.ActionMetaData.SourceFile, batch_size=500, bulk_size=500,
+                                              id_conflicts=None)
+        # two lines per document
+        self.assertEqual(1000 * 400, reader.file_source.buffer_size)
+
     def test_iterator_chaining_respects_context_manager(self):
         i0 = InvocationGeneratorTests.TestIndexReader([1, 2, 3])
         i1 = InvocationGeneratorTests.TestIndexReader([4, 5, 6])
@@ -392,6 +521,60 @@ class InvocationGeneratorTests(TestCase):
         return params.PartitionBulkIndexParamSource(
             indices, partition_index, total_partitions, params.ActionMetaData.Generate, bulk_size, bulk_size).number_of_bulks()
 
+    def test_bulk_data_based_with_serialized_body(self):
+        def create_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
+            return InvocationGeneratorTests.TestIndexReader([
+                ("test_index", "test_type", [
+                    ['{"index": {}}', '{"key": "value1"}', '{"index": {}}', '{"key": "value2"}'],
+                    ['{"index": {}}', '{"key": "välue3"}']
+                ])
+            ])
+
+        bulks = list(params.bulk_data_based(num_clients=1, client_index=0, indices=[self.idx("test_index", [self.t(3)])],
+                                            action_metadata=params.ActionMetaData.Generate, batch_size=4, bulk_size=2,
+                                            id_conflicts=None, pipeline=None, serialize_body=True, create_reader=create_reader))
+
+        self.assertEqual(2, len(bulks))
+        self.assertEqual(b'{"index": {}}\n{"key": "value1"}\n{"index": {}}\n{"key": "value2"}\n', bulks[0]["body"])
+        self.assertEqual(2, bulks[0]["bulk-size"])
+        self.assertEqual('{"index": {}}\n{"key": "välue3"}\n'.encode("utf-8"), bulks[1]["body"])
+        self.assertEqual(1, bulks[1]["bulk-size"])
+        self.assertEqual("0-2", bulks[1]["bulk-id"])
+        self.assertGreaterEqual(bulks[0]["serialization-time"], 0)
+
+    def test_bulk_data_based_with_bodies_serialized_by_reader(self):
+        def create_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
+            return InvocationGeneratorTests.TestIndexReader([
+                ("test_index", "test_type", [
+                    b'{"index": {}}\n{"key": "value1"}\n{"index": {}}\n{"key": "value2"}\n',
+                    b'{"index": {}}\n{"key": "value3"}\n'
+                ])
+            ])
+
+        bulks = list(params.bulk_data_based(num_clients=1, client_index=0, indices=[self.idx("test_index", [self.t(3)])],
+                                            action_metadata=params.ActionMetaData.Generate, batch_size=4, bulk_size=2,
+                                            id_conflicts=None, pipeline=None, create_reader=create_reader))
+
+        self.assertEqual(2, len(bulks))
+        self.assertEqual(b'{"index": {}}\n{"key": "value1"}\n{"index": {}}\n{"key": "value2"}\n', bulks[0]["body"])
+        self.assertEqual(2, bulks[0]["bulk-size"])
+        self.assertEqual(1, bulks[1]["bulk-size"])
+        # the reader has serialized the bodies
+        self.assertNotIn("serialization-time", bulks[0])
+
+    def test_bulk_data_based_with_filtered_response(self):
+        def create_reader(index, type, offset, num_lines, num_docs, action_metadata, batch_size, bulk_size, id_conflicts):
+            return InvocationGeneratorTests.TestIndexReader([
+                ("test_index", "test_type", [['{"index": {}}', '{"key": "value1"}']])
+            ])
+
+        bulks = list(params.bulk_data_based(num_clients=1, client_index=0, indices=[self.idx("test_index", [self.t(1)])],
+                                            action_metadata=params.ActionMetaData.Generate, batch_size=1, bulk_size=1,
+                                            id_conflicts=None, pipeline=None, filter_response=True, create_reader=create_reader))
+
+        self.assertEqual(1, len(bulks))
+        self.assertTrue(bulks[0]["filter_response"])
+
     def test_build_conflicting_ids(self):
         self.assertIsNone(params.build_conflicting_ids(params.IndexIdConflict.NoConflicts, 3, 0))
         self.assertEqual(["         0", "         1", "         2"],
@@ -467,6 +650,14 @@ class BulkIndexParamSourceTests(TestCase):
 
         self.assertEqual("Unknown 'action-and-meta-data' setting [guess]", ctx.exception.args[0])
 
+    def test_create_with_unknown_corpus_reader(self):
+        with self.assertRaises(exceptions.InvalidSyntax) as ctx:
+            params.BulkIndexParamSource(indices=[], params={
+                "corpus-reader": "telepathic",
+            })
+
+        self.assertEqual("Unknown 'corpus-reader' setting [telepathic]", ctx.exception.args[0])
+
     def test_create_valid_param_source(self):
         self.assertIsNotNone(params.BulkIndexParamSource(indices=[], params={
             "action-and-meta-data": "generate",
@@ -0,0 +1,105 @@
+import pickle
+from unittest import TestCase
+
+from esrally.utils import histogram
+
+
+class HistogramTests(TestCase):
+    def test_empty_histogram_has_no_percentiles(self):
+        h = histogram.Histogram()
+        self.assertEqual(0, h.total_count)
+        self.assertEqual({}, h.percentiles([50, 100]))
+
+    def test_percentiles_are_within_precision(self):
+        h = histogram.Histogram(significant_digits=3)
+        for i in range(1, 10001):
+            h.record(i / 10)
+
+        p = h.percentiles([0, 50, 90, 99, 99.9, 100])
+        self.assertEqual(0.1, p[0])
+        self.assertAlmostEqual(500.0, p[50], delta=500.0 * 0.001)
+        self.assertAlmostEqual(900.0, p[90], delta=900.0 * 0.001)
+        self.assertAlmostEqual(990.0, p[99], delta=990.0 * 0.001)
+        self.assertAlmostEqual(999.0, p[99.9], delta=999.0 * 0.001)
+        self.assertEqual(1000.0, p[100])
+
+    def test_percentiles_are_sorted_ascending(self):
+        h = histogram.Histogram()
+        for i in range(100):
+            h.record(i)
+        self.assertEqual([50, 99, 100], list(h.percentiles([100, 50, 99]).keys()))
+
+    def test_values_above_highest_trackable_value_are_counted(self):
+        h = histogram.Histogram(highest_trackable_value_ms=1000)
+        h.record(10)
+        h.record(5000)
+        self.assertEqual(2, h.total_count)
+        self.assertEqual(5000, h.percentiles([100])[100])
+
+    def test_rejects_negative_values(self):
+        h = histogram.Histogram()
+        with self.assertRaises(ValueError):
+            h.record(-1)
+
+    def test_merge_is_exact(self):
+        merged = histogram.Histogram()
+        single = histogram.Histogram()
+        for client in range(4):
+            h = histogram.Histogram()
+            for i in range(client, 1000, 4):
+                h.record(i)
+                single.record(i)
+            merged.merge(h)
+
+        self.assertEqual(1000, merged.total_count)
+        self.assertEqual(0, merged.min)
+        self.assertEqual(999, merged.max)
+        percentiles = [50, 90, 99, 99.9, 100]
+        self.assertEqual(single.percentiles(percentiles), merged.percentiles(percentiles))
+
+    def test_cannot_merge_histograms_with_different_precision(self):
+        with self.assertRaises(ValueError):
+            histogram.Histogram(significant_digits=2).merge(histogram.Histogram(significant_digits=3))
+
+    def test_serialization_roundtrip(self):
+        h = histogram.Histogram()
+        for i in range(1, 1001):
+            h.record(i)
+
+        serialized = pickle.dumps(h)
+        restored = pickle.loads(serialized)
+
+        self.assertEqual(h.total_count, restored.total_count)
+        self.assertEqual(h.percentiles([50, 99, 100]), restored.percentiles([50, 99, 100]))
+        # buckets are sparsely populated and compress well
+        self.assertLess(len(serialized), len(h._counts) * h._counts.itemsize // 10)
+
+    def test_only_populated_buckets_are_visited(self):
+        h = histogram.Histogram()
+        for v in [0.5, 3, 3, 250, 70000]:
+            h.record(v)
+        populated = [idx for idx, count in enumerate(h._counts) if count > 0]
+
+        self.assertEqual(populated, list(h._populated_indices()))
+        restored = pickle.loads(pickle.dumps(h))
+        self.assertEqual(populated, list(restored._populated_indices()))
+        self.assertEqual(list(h._counts), list(restored._counts))
+        self.assertEqual([], list(histogram.Histogram()._populated_indices()))
+
+    def test_merge_restored_histograms(self):
+        merged = histogram.Histogram()
+        single = histogram.Histogram()
+        for client in range(4):
+            h = histogram.Histogram()
+            for i in range(client, 1000, 4):
+                h.record(i)
+                single.record(i)
+            restored = pickle.loads(pickle.dumps(h))
+            # populated buckets are determined again after new values have been recorded
+            restored.record(2000 + client)
+            single.record(2000 + client)
+            merged.merge(restored)
+
+        self.assertEqual(single.total_count, merged.total_count)
+        self.assertEqual(list(single._counts), list(merged._counts))
+        self.assertEqual(single.percentiles([50, 99, 100]), pickle.loads(pickle.dumps(merged)).percentiles([50, 99, 100]))
@@ -1,4 +1,7 @@
+import bz2
+import gzip
 import os
+import tempfile
 import unittest.mock as mock
 from unittest import TestCase
 
@@ -56,3 +59,154 @@ class IoTests(TestCase):
         self.assertEqual("/already/a/normalized/path", io.normalize_path("/already/a/normalized/path"))
         self.assertEqual("/not/normalized", io.normalize_path("/not/normalized/path/../"))
         self.assertEqual(os.path.expanduser("~"), io.normalize_path("~/Documents/.."))
+
+
+class OffsetIndexTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_file_path = os.path.join(self.tmp_dir.name, "documents.json")
+        # lines have different lengths so offsets cannot be guessed
+        self.lines = ['{"id": %d, "text": "%s"}' % (i, "a" * (i % 17)) for i in range(1000)]
+        with open(self.data_file_path, mode="wt") as f:
+            for line in self.lines:
+                print(line, file=f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_offset_index(self, granularity):
+        entries, number_of_lines = io.offset_index_entries(self.data_file_path, granularity)
+        io.write_offset_index(io.offset_index_path(self.data_file_path), entries, number_of_lines, granularity)
+
+    def test_skip_lines_with_offset_index(self):
+        self.write_offset_index(granularity=256)
+
+        with io.OffsetIndex(io.offset_index_path(self.data_file_path)).open() as index:
+            self.assertEqual(256, index.granularity)
+            self.assertEqual(1000, index.number_of_lines)
+            self.assertGreater(len(index), 0)
+
+        for line_number in [0, 1, 7, 500, 999]:
+            with open(self.data_file_path, mode="rt") as data_file:
+                io.skip_lines(self.data_file_path, data_file, line_number)
+                self.assertEqual(self.lines[line_number], data_file.readline().strip())
+
+    def test_skip_lines_without_offset_index(self):
+        with open(self.data_file_path, mode="rt") as data_file:
+            io.skip_lines(self.data_file_path, data_file, 42)
+            self.assertEqual(self.lines[42], data_file.readline().strip())
+
+    def test_lookup_finds_closest_preceding_entry(self):
+        self.write_offset_index(granularity=256)
+
+        with io.OffsetIndex(io.offset_index_path(self.data_file_path)).open() as index:
+            self.assertEqual((0, 0), index.lookup(0))
+            first_line, first_offset = index[0]
+            self.assertEqual((first_line, first_offset), index.lookup(first_line))
+            self.assertEqual((0, 0), index.lookup(first_line - 1))
+            self.assertEqual(index[len(index) - 1], index.lookup(999))
+
+    @mock.patch("esrally.utils.io.MIN_OFFSET_INDEX_CHUNK_SIZE", 512)
+    def test_parallel_indexing_matches_single_process(self):
+        single_entries, single_lines = io.offset_index_entries(self.data_file_path, granularity=128, processes=1)
+        parallel_entries, parallel_lines = io.offset_index_entries(self.data_file_path, granularity=128, processes=4)
+
+        self.assertEqual(1000, single_lines)
+        self.assertEqual(single_lines, parallel_lines)
+        self.assertEqual(single_entries, parallel_entries)
+        with open(self.data_file_path, mode="rb") as f:
+            data = f.read()
+        for line_number, offset in parallel_entries:
+            self.assertEqual(line_number, data[:offset].count(b"\n"))
+
+    def test_counts_last_line_without_newline(self):
+        with open(self.data_file_path, mode="wt") as f:
+            f.write("a\nb\nc")
+
+        self.assertEqual(([(0, 0)], 3), io.offset_index_entries(self.data_file_path, granularity=128))
+
+    def test_ignores_legacy_offset_table(self):
+        offset_file_path = io.offset_index_path(self.data_file_path)
+        with open(offset_file_path, mode="wt") as f:
+            print("50000;123456", file=f)
+
+        self.assertIsNone(io.OffsetIndex(offset_file_path).open())
+        with open(self.data_file_path, mode="rt") as data_file:
+            io.skip_lines(self.data_file_path, data_file, 42)
+            self.assertEqual(self.lines[42], data_file.readline().strip())
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # the second member starts in the middle of a line
+        self.members = [b'{"id": 0}\n{"id": 1}\n{"id"', b': 2}\n{"id": 3}\n', b'{"id": 4}\n{"id": 5}']
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_archive(self, extension):
+        path = os.path.join(self.tmp_dir.name, "documents.json%s" % extension)
+        with open(path, mode="wb") as f:
+            for member in self.members:
+                f.write(bz2.compress(member) if extension == ".bz2" else gzip.compress(member))
+        return path
+
+    def test_is_streamable_archive(self):
+        self.assertTrue(io.is_streamable_archive("documents.json.bz2"))
+        self.assertTrue(io.is_streamable_archive("documents.json.gz"))
+        self.assertFalse(io.is_streamable_archive("documents.tar.gz"))
+        self.assertFalse(io.is_streamable_archive("documents.zip"))
+        self.assertFalse(io.is_streamable_archive(None))
+
+    def test_decompress_multiple_members(self):
+        for extension in [".bz2", ".gz"]:
+            path = self.write_archive(extension)
+            members = list(io.decompressed_members(path, read_size=7))
+            self.assertEqual(b"".join(self.members), b"".join(data for _, data in members))
+
+            offsets = sorted(set(offset for offset, _ in members))
+            self.assertEqual(3, len(offsets))
+            # decompression can start at each member
+            self.assertEqual(self.members[2], b"".join(data for _, data in io.decompressed_members(path, offsets[2])))
+
+    def test_archive_checkpoints(self):
+        for extension in [".bz2", ".gz"]:
+            path = self.write_archive(extension)
+            offsets = sorted(set(offset for offset, _ in io.decompressed_members(path)))
+
+            checkpoints, number_of_lines, size = io.archive_checkpoints(path, granularity=1)
+
+            self.assertEqual([(0, 0, False), (offsets[1], 3, True), (offsets[2], 4, False)], checkpoints)
+            self.assertEqual(6, number_of_lines)
+            self.assertEqual(len(b"".join(self.members)), size)
+            # the first member is too small to justify a checkpoint after it
+            self.assertEqual([(0, 0, False), (offsets[2], 4, False)], io.archive_checkpoints(path, granularity=26)[0])
+
+    def test_ignores_zero_padding_after_last_member(self):
+        for extension in [".bz2", ".gz"]:
+            path = self.write_archive(extension)
+            with open(path, mode="ab") as f:
+                f.write(b"\x00" * 512)
+
+            members = list(io.decompressed_members(path, read_size=7))
+            self.assertEqual(b"".join(self.members), b"".join(data for _, data in members))
+            self.assertEqual(3, len(set(offset for offset, _ in members)))
+
+            checkpoints, number_of_lines, size = io.archive_checkpoints(path, granularity=1)
+            self.assertEqual(3, len(checkpoints))
+            self.assertEqual(6, number_of_lines)
+            self.assertEqual(len(b"".join(self.members)), size)
+
+    def test_stream_decompresses_in_background(self):
+        path = self.write_archive(".gz")
+        data = []
+        with io.ArchiveStream(path, queue_size=1) as stream:
+            for chunk in iter(stream.read, b""):
+                data.append(chunk)
+        self.assertEqual(b"".join(self.members), b"".join(data))
+
+    def test_stream_can_be_closed_early(self):
+        path = self.write_archive(".bz2")
+        with io.ArchiveStream(path, queue_size=1) as stream:
+            self.assertTrue(len(stream.read()) > 0)
@@ -112,3 +112,17 @@ class ProcessTests(TestCase):
         self.assertTrue(rally_process_mac.killed)
         self.assertFalse(own_rally_process.killed)
         self.assertFalse(night_rally_process.killed)
+
+    @mock.patch("psutil.process_iter")
+    def test_does_not_kill_load_driver_hosts(self, process_iter):
+        rally_process = ProcessTests.Process(105, "python3", ["/usr/bin/python3", "~/.local/bin/esrally"])
+        rallyd_process_p = ProcessTests.Process(106, "python3", ["/usr/bin/python3", "~/.local/bin/esrallyd", "start"])
+        rallyd_process_e = ProcessTests.Process(107, "esrallyd", ["/usr/bin/python3", "~/.local/bin/esrallyd", "start"])
+
+        process_iter.return_value = [rally_process, rallyd_process_p, rallyd_process_e]
+
+        process.kill_running_rally_instances()
+
+        self.assertTrue(rally_process.killed)
+        self.assertFalse(rallyd_process_p.killed)
+        self.assertFalse(rallyd_process_e.killed)